@@ -5,6 +5,10 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
+
+The event streams in api/streams.py are async views: serve them from this
+application with an ASGI server (e.g. `uvicorn Backend.asgi:application`)
+so each open stream waits on the event loop instead of a worker thread.
 """
 
 import os
@@ -60,24 +60,97 @@ AUTHENTICATION_BACKENDS = (
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'api.authentication.StatelessJWTAuthentication',
     ], 
     'DEFAULT_FILTER_BACKENDS': [  # Corrected from 'DJANGO_FILTER_BACKENDS'
         'django_filters.rest_framework.DjangoFilterBackend',
     ],
+    # orjson-backed JSON; both fall back to the stdlib when orjson is not installed
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'api.renderers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
 }
 
 SIMPLE_JWT = {
-    'ACCESS_TOKEN_LIFETIME': timedelta(days=1),
+    # Requests trust the token's claims without loading the user, so a role
+    # change or deactivation only takes hold at the next refresh, which
+    # reloads the user (ClaimsTokenRefreshSerializer): keep this short
+    'ACCESS_TOKEN_LIFETIME': timedelta(minutes=5),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=7),
     'ROTATE_REFRESH_TOKENS': True,
     'BLACKLIST_AFTER_ROTATION': True,
+    # Embed user_type/verification_status so requests skip the user lookup
+    'TOKEN_OBTAIN_SERIALIZER': 'api.authentication.ClaimsTokenObtainPairSerializer',
+    'TOKEN_REFRESH_SERIALIZER': 'api.authentication.ClaimsTokenRefreshSerializer',
+    'TOKEN_USER_CLASS': 'api.authentication.ClaimsUser',
 }
 
 AUTH_USER_MODEL = 'api.User'
 
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Item list pages for customers/admins. LocMemCache evicts least recently
+    # used entries past MAX_ENTRIES but is per process; pages never go stale
+    # in other workers, since the version in their keys is read from the
+    # database (api.models.CatalogVersion). To also share the pages between
+    # workers, switch to the file backend (it culls a share of entries past
+    # MAX_ENTRIES instead of strict LRU):
+    #   'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+    #   'LOCATION': os.path.join(BASE_DIR, 'cache', 'catalog'),
+    'catalog': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'catalog',
+        'TIMEOUT': 600,
+        'OPTIONS': {'MAX_ENTRIES': 2000},
+    },
+    # Discount lookups by code (api/discounts.py). Per process; the short
+    # timeout bounds how long other workers see a stale code after an edit.
+    'discounts': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'discounts',
+        'TIMEOUT': 30,
+        'OPTIONS': {'MAX_ENTRIES': 1000},
+    },
+}
+CATALOG_CACHE_ALIAS = 'catalog'
+DISCOUNT_CACHE_ALIAS = 'discounts'
+
+# List endpoints render from .values() rows instead of model instances, see api/fastpath.py
+FAST_LIST_ENDPOINTS = True
+
+# How long a cart line holds its stock; `manage.py release_reservations` returns expired holds
+STOCK_RESERVATION_TTL = timedelta(minutes=15)
+
+# Resized WebP/JPEG copies of uploaded images, written next to them by a process pool,
+# see api/renditions.py. Name -> longest side in pixels.
+IMAGE_RENDITIONS = {'thumb': 128, 'card': 480}
+IMAGE_RENDITION_WORKERS = 2
+
+# Topic pub/sub behind the event streams in api/streams.py. InProcessHub only reaches
+# watchers in the publishing process: one ASGI worker, or a shared backend.
+PUBSUB = {
+    'BACKEND': 'api.pubsub.InProcessHub',
+    'OPTIONS': {'queue_size': 100},
+}
+
+REQUEST_METRICS = {
+    'SAMPLE_RATE': 1.0,  # lower in production, e.g. 0.05
+    'SLOW_REQUEST_MS': 500,
+    'SERVER_TIMING_HEADER': True,
+}
+
 
 MIDDLEWARE = [
+    # Per-request query count and timings, see REQUEST_METRICS
+    'api.instrumentation.RequestMetricsMiddleware',
     # CORS
     'corsheaders.middleware.CorsMiddleware',
     # Default
@@ -128,6 +201,28 @@ DATABASES = {
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Uploads are stored once per distinct content, named by digest; see api/storage.py
+#
+# Django only serves MEDIA_URL with DEBUG on (api.media.serve_media). In
+# production the front server or CDN serves MEDIA_ROOT and must send the
+# matching Cache-Control: a file named by its digest never changes, so it can
+# be cached for a year as immutable. Only names matching
+# api.storage.CONTENT_ADDRESSED_NAME qualify; anything else may be rewritten
+# in place and must be revalidated. With nginx:
+#
+#   location ~ "^/media/(?:.*/)?([0-9a-f]{2})/\1[0-9a-f]{62}[^/]*$" {
+#       root /path/to/BASE_DIR;
+#       add_header Cache-Control "public, max-age=31536000, immutable";
+#   }
+#   location /media/ {
+#       root /path/to/BASE_DIR;
+#       add_header Cache-Control "no-cache";
+#   }
+STORAGES = {
+    'default': {'BACKEND': 'api.storage.ContentAddressedStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -19,11 +19,14 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 
+from api.media import serve_media
+
 urlpatterns = [
        path('admin/', admin.site.urls),
        path('api/', include('api.urls')),
 ]
 
 
+# Development only; in production the front server serves MEDIA_ROOT, see STORAGES in settings
 if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+    urlpatterns += static(settings.MEDIA_URL, view=serve_media)
\ No newline at end of file
@@ -0,0 +1,117 @@
+# api/authentication.py
+
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.utils.functional import cached_property
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication, JWTStatelessUserAuthentication
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+
+
+# User fields copied into every token; permissions and queryset scoping only need these
+USER_CLAIMS = ('user_type', 'verification_status')
+
+
+def stamp_claims(token, user):
+    for claim in USER_CLAIMS:
+        token[claim] = getattr(user, claim)
+    return token
+
+
+class ClaimsTokenObtainPairSerializer(TokenObtainPairSerializer):
+    @classmethod
+    def get_token(cls, user):
+        return stamp_claims(super().get_token(user), user)
+
+
+class ClaimsTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    Refresh that reloads the user: inactive or deleted users get no new
+    access token, and the claims are stamped afresh, so a role change
+    reaches requests within one ACCESS_TOKEN_LIFETIME.
+    """
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        user = get_user_model().objects.filter(
+            **{api_settings.USER_ID_FIELD: refresh.payload.get(api_settings.USER_ID_CLAIM)}
+        ).first()
+        if user is None or not api_settings.USER_AUTHENTICATION_RULE(user):
+            raise AuthenticationFailed(self.error_messages['no_active_account'], 'no_active_account')
+
+        # Copied from the refresh token into its access token, and into the rotated refresh token
+        stamp_claims(refresh, user)
+        data = {'access': str(refresh.access_token)}
+
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            # Tracking issued refresh tokens needs the blacklist app's tables
+            tracked = apps.is_installed('rest_framework_simplejwt.token_blacklist')
+            if tracked and api_settings.BLACKLIST_AFTER_ROTATION:
+                refresh.blacklist()
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+            if tracked:
+                refresh.outstand()
+            data['refresh'] = str(refresh)
+        return data
+
+
+def tokens_for_user(user):
+    refresh = ClaimsTokenObtainPairSerializer.get_token(user)
+    return {'access': str(refresh.access_token), 'refresh': str(refresh)}
+
+
+class ClaimsUser(TokenUser):
+    """
+    Request user built from the access token's claims.
+
+    `id`, `user_type` and `verification_status` come straight from the token.
+    Anything else is read from the `User` row, fetched on first use.
+    """
+
+    @cached_property
+    def user_type(self):
+        return self.token['user_type']
+
+    @cached_property
+    def verification_status(self):
+        return self.token['verification_status']
+
+    @cached_property
+    def instance(self):
+        try:
+            return get_user_model().objects.get(pk=self.id)
+        except get_user_model().DoesNotExist:
+            raise AuthenticationFailed('User not found', code='user_not_found')
+
+    def __getattr__(self, attr):
+        if attr.startswith('_'):
+            raise AttributeError(attr)
+        if attr in self.token:
+            return self.token[attr]
+        return getattr(self.instance, attr)
+
+
+def get_user_instance(user):
+    """The `User` model instance behind `request.user`, fetching it if needed."""
+    if isinstance(user, ClaimsUser):
+        return user.instance
+    return user
+
+
+class StatelessJWTAuthentication(JWTStatelessUserAuthentication):
+    """
+    JWT authentication without the per-request `api_user` lookup.
+
+    Tokens issued before the claims were added fall back to the database
+    lookup until they expire.
+    """
+
+    def get_user(self, validated_token):
+        if any(claim not in validated_token for claim in USER_CLAIMS):
+            return JWTAuthentication.get_user(self, validated_token)
+        # Builds SIMPLE_JWT['TOKEN_USER_CLASS'], i.e. ClaimsUser
+        return super().get_user(validated_token)
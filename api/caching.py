@@ -0,0 +1,103 @@
+# api/caching.py
+
+import decimal
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.response import Response
+
+from api.models import CatalogVersion, new_catalog_version
+
+
+CATALOG_VERSION_PK = 1
+
+
+def get_catalog_cache():
+    return caches[getattr(settings, 'CATALOG_CACHE_ALIAS', 'catalog')]
+
+
+def catalog_version():
+    """
+    The token in every cached catalog page's key, read from the database
+    rather than the cache: every worker sees a bump, whichever process made
+    it, even with the pages themselves in a per-process cache.
+    """
+    versions = CatalogVersion.objects.filter(pk=CATALOG_VERSION_PK).values_list('version', flat=True)
+    version = versions.first()
+    if version is None:
+        # Created by migration; only missing after a flush
+        CatalogVersion.objects.bulk_create([CatalogVersion(pk=CATALOG_VERSION_PK)], ignore_conflicts=True)
+        version = versions.first()
+    return version
+
+
+def bump_catalog_version():
+    """
+    Orphan every cached catalog page with a single UPDATE.
+
+    The UPDATE belongs to the caller's transaction: reads later in it miss
+    right away, and other requests keep their pages until it commits,
+    since until then they read the rows the pages were built from. Versions
+    are random tokens rather than a counter, so pages cached under a bump
+    that was rolled back are never reached by a later one.
+    """
+    CatalogVersion.objects.filter(pk=CATALOG_VERSION_PK).update(version=new_catalog_version())
+
+
+class CatalogCacheMixin:
+    """
+    Read-through cache for `list()` responses that are the same for every
+    user of `catalog_cache_roles`.
+
+    The key covers the filterset's cleaned values (so `?min_price=10` and
+    `?min_price=10.0` share an entry), the pagination params, the scheme and
+    host that absolute URLs are built from, and the catalog version. Requests
+    carrying any other query param bypass the cache.
+    """
+    catalog_cache_roles = ('customer', 'admin')
+    catalog_cache_params = ('format', 'fields', 'expand')
+
+    def list(self, request, *args, **kwargs):
+        cache = get_catalog_cache()
+        key = self.get_catalog_cache_key(request)
+        if key is None:
+            return super().list(request, *args, **kwargs)
+
+        data = cache.get(key)
+        if data is not None:
+            return Response(data)
+        response = super().list(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, response.data)
+        return response
+
+    def get_catalog_cache_key(self, request):
+        if getattr(request.user, 'user_type', None) not in self.catalog_cache_roles:
+            return None
+
+        form = self.filterset_class(data=request.query_params).form
+        paginator = self.paginator
+        extra_params = {paginator.cursor_query_param, paginator.page_size_query_param, *self.catalog_cache_params}
+        if not set(request.query_params) <= set(form.fields) | extra_params:
+            return None
+        # Invalid filters fall through to the view, which answers 400
+        if not form.is_valid():
+            return None
+
+        filters = {
+            name: format(value.normalize(), 'f') if isinstance(value, decimal.Decimal) else str(value)
+            for name, value in form.cleaned_data.items() if value not in (None, '')
+        }
+        if 'category' in filters:
+            filters['category'] = filters['category'].lower()
+        raw = json.dumps([
+            request.build_absolute_uri('/'),
+            sorted(filters.items()),
+            request.query_params.get(paginator.cursor_query_param),
+            paginator.get_page_size(request),
+            [request.query_params.get(param) for param in self.catalog_cache_params],
+        ])
+        digest = hashlib.sha256(raw.encode('utf-8')).hexdigest()
+        return f'catalog:{catalog_version()}:{self.basename}:{digest}'
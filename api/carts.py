@@ -0,0 +1,53 @@
+# api/carts.py
+
+from django.db import transaction
+
+from rest_framework.exceptions import ValidationError
+
+from api.discounts import redeemable_discount
+from api.etags import bump_resource_versions
+from api.models import Cart
+from api.reservations import delete_lines, reserve_many
+
+
+@transaction.atomic
+def set_cart_lines(user_id, lines):
+    """
+    Apply `CartBulkSerializer` lines to the user's cart and return the Cart
+    rows written. Lines with a quantity are upserted in one statement on
+    the (user, item) constraint, those with `item_quantity: 0` removed, and
+    stock is reserved for all of them together.
+    """
+    removed = [line['item'] for line in lines if line['item_quantity'] == 0]
+    written = [
+        Cart(user_id=user_id, item_id=line['item'], item_quantity=line['item_quantity'], discount_id=line.get('discount'))
+        for line in lines if line['item_quantity']
+    ]
+    if removed:
+        delete_lines(Cart.objects.filter(user_id=user_id, item_id__in=removed).values('pk'))
+    if written:
+        Cart.objects.bulk_create(
+            written,
+            update_conflicts=True,
+            unique_fields=['user', 'item'],
+            update_fields=['item_quantity', 'discount'],
+        )
+        reserve_many(written)
+    # bulk_create and bulk deletes skip the per-row Cart signals
+    bump_resource_versions([user_id], 'cart')
+    return written
+
+
+def apply_discount_code(user_id, code):
+    """
+    Attach the discount with `code` to the user's cart lines of its vendor
+    and return it with the number of lines. Nothing is redeemed here:
+    checkout redeems each discount in the cart once.
+    """
+    discount = redeemable_discount(code)
+    lines = Cart.objects.filter(user_id=user_id, item__vendor_id=discount.vendor_id).update(discount_id=discount.id)
+    if not lines:
+        raise ValidationError({'code': [f'{code} does not apply to anything in your cart.']})
+    # update() skips the Cart signals
+    bump_resource_versions([user_id], 'cart')
+    return discount, lines
@@ -0,0 +1,118 @@
+# api/checkout.py
+
+from collections import Counter
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import BooleanField, Case, F, Value, When
+from django.db.models.lookups import GreaterThan, GreaterThanOrEqual
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+
+from api.caching import bump_catalog_version
+from api.discounts import redeem
+from api.etags import bump_resource_versions
+from api.models import Cart, Inventory, Order, OrderItem, StockReservation
+from api.reservations import AVAILABLE, bulk_cart_deletes, quantity_case, update_all_or_none
+
+
+PRICE_QUANTUM = Decimal('0.0001')
+
+
+class CheckoutConflict(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'The cart could not be checked out.'
+    default_code = 'checkout_conflict'
+
+
+def discounted_price(price, discount):
+    if discount is None:
+        return price
+    return (price * (100 - discount.percentage) / 100).quantize(PRICE_QUANTUM)
+
+
+@transaction.atomic
+def checkout(user_id):
+    """
+    Turn the user's cart into a pending order.
+
+    Stock for every line is decremented by one conditional UPDATE, which
+    converts the lines' reservations and only matches inventories with
+    enough unreserved stock for the rest. The discounts in use are redeemed
+    together by `api.discounts.redeem`, so concurrent checkouts cannot
+    oversell either. Any shortfall rolls the
+    whole checkout back. The query count does not depend on the cart's size.
+    """
+    lines = list(
+        Cart.objects.select_for_update()
+        .filter(user_id=user_id)
+        .select_related('item', 'discount')
+        .order_by('id')
+    )
+    if not lines:
+        raise ValidationError({'cart': 'The cart is empty.'})
+
+    today = timezone.now().date()
+    discounts = {}
+    for line in lines:
+        discount = line.discount
+        if discount is None:
+            continue
+        if discount.vendor_id != line.item.vendor_id:
+            raise ValidationError({'discount': f'{discount.code} does not apply to {line.item.name}.'})
+        if discount.expires_at < today:
+            raise ValidationError({'discount': f'{discount.code} has expired.'})
+        discounts[discount.id] = discount
+
+    # Reserved units are already set aside; only the rest must be available
+    reservations = list(StockReservation.objects.select_for_update().filter(cart__in=lines))
+    quantities, held = Counter(), Counter()
+    for line in lines:
+        quantities[line.item_id] += line.item_quantity
+    for reservation in reservations:
+        held[reservation.item_id] += reservation.quantity
+    unreserved = Counter(quantities)
+    unreserved.subtract(held)
+    needed = quantity_case(unreserved)
+    # SET expressions read the pre-update row, so in_stock compares against the old quantity
+    decremented = update_all_or_none(
+        Inventory.objects.filter(GreaterThanOrEqual(AVAILABLE, needed), item_id__in=quantities),
+        len(quantities),
+        item_quantity=F('item_quantity') - quantity_case(quantities),
+        reserved_quantity=F('reserved_quantity') - quantity_case(held),
+        in_stock=Case(When(GreaterThan(F('item_quantity'), quantity_case(quantities)), then=Value(True)), default=Value(False), output_field=BooleanField()),
+    )
+    if not decremented:
+        available = dict(Inventory.objects.filter(item_id__in=quantities).values_list('item_id', AVAILABLE))
+        short = [
+            {'item': item_id, 'requested': quantity, 'available': available.get(item_id, 0) + held[item_id]}
+            for item_id, quantity in quantities.items() if available.get(item_id, 0) < unreserved[item_id]
+        ]
+        raise CheckoutConflict({'detail': 'Not enough stock.', 'items': short})
+
+    order = Order.objects.create(user_id=user_id)
+    OrderItem.objects.bulk_create([
+        OrderItem(
+            order=order,
+            item_id=line.item_id,
+            quantity=line.item_quantity,
+            price_at_purchase=discounted_price(line.item.price, line.discount),
+        )
+        for line in lines
+    ])
+    # bulk_create skips the post_save signals that keep the totals in step
+    Order.refresh_totals({order.id})
+
+    # Last write, so a flash-sale code's row stays locked for as little as possible
+    if redeem(discounts) != len(discounts):
+        raise CheckoutConflict({'detail': 'A discount in the cart has no redemptions left.'})
+
+    # Queryset updates and bulk deletes skip signals too: invalidate the catalog
+    # and the cart ETags of everyone holding these items, this user included.
+    bump_catalog_version()
+    bump_resource_versions(Cart.objects.filter(item_id__in=quantities).values('user_id'), 'cart')
+    with bulk_cart_deletes():
+        # Cascades to the reservations, converted above rather than released
+        Cart.objects.filter(pk__in=[line.pk for line in lines]).delete()
+    return order
@@ -0,0 +1,88 @@
+# api/discounts.py
+
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import F, Q
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from api.models import Discount
+
+
+# What code lookups need; redemptions are never cached, the UPDATE checks them
+ActiveDiscount = namedtuple(
+    'ActiveDiscount',
+    ['id', 'code', 'name', 'percentage', 'expires_at', 'vendor_id', 'exhausted'],
+    defaults=[False],
+)
+
+
+class DiscountUnavailable(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'This discount cannot be redeemed.'
+    default_code = 'discount_unavailable'
+
+
+def get_discount_cache():
+    return caches[getattr(settings, 'DISCOUNT_CACHE_ALIAS', 'discounts')]
+
+
+def _cache_key(code):
+    return f'discount:{code}'
+
+
+def active_discount(code):
+    """The unexpired discount with this `code`, or None; served from the in-process cache."""
+    cache = get_discount_cache()
+    discount = cache.get(_cache_key(code))
+    if discount is None:
+        row = Discount.objects.filter(code=code).values_list(*ActiveDiscount._fields[:-1]).first()
+        if row is None:
+            return None
+        discount = ActiveDiscount(*row)
+        cache.set(_cache_key(code), discount)
+    if discount.expires_at < timezone.now().date():
+        return None
+    return discount
+
+
+def forget_discount(code):
+    get_discount_cache().delete(_cache_key(code))
+
+
+def redeem(discount_ids):
+    """
+    Redeem each discount once with a single conditional UPDATE and return
+    how many were redeemed.
+
+    The UPDATE only matches unexpired discounts below `max_redemptions`, so
+    concurrent redeemers never push a code past its limit, and they contend
+    on the discount's row alone rather than a table lock.
+    """
+    if not discount_ids:
+        return 0
+    return Discount.objects.filter(
+        Q(redemptions__isnull=True) | Q(redemptions__lt=F('max_redemptions')),
+        pk__in=discount_ids, expires_at__gte=timezone.now().date(),
+    ).update(redemptions=Coalesce(F('redemptions'), 0) + 1)
+
+
+def redeemable_discount(code):
+    """
+    The discount with `code` if it can still be redeemed, or raise
+    DiscountUnavailable. Only checks: redemptions are counted at checkout.
+    """
+    discount = active_discount(code)
+    if discount is None:
+        raise DiscountUnavailable('Unknown or expired discount code.')
+    if discount.exhausted or not Discount.objects.filter(
+        Q(redemptions__isnull=True) | Q(redemptions__lt=F('max_redemptions')), pk=discount.id,
+    ).exists():
+        # Spare the database the lookups of everyone else still trying a sold-out code
+        get_discount_cache().set(_cache_key(code), discount._replace(exhausted=True))
+        raise DiscountUnavailable('This discount has no redemptions left.')
+    return discount
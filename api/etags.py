@@ -0,0 +1,104 @@
+# api/etags.py
+
+import functools
+import hashlib
+
+from django.db.models import F, QuerySet
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.response import Response
+
+from api.models import ResourceVersion
+
+
+def bump_resource_versions(user_ids, scope):
+    """
+    Invalidate the ETags of `scope` for these users with a single UPDATE.
+
+    `user_ids` may be a `.values('user_id')` queryset, run as a subquery. Users
+    without a row have never been handed an ETag for the scope, so there is
+    nothing to invalidate.
+    """
+    if not isinstance(user_ids, QuerySet):
+        user_ids = [user_id for user_id in user_ids if user_id is not None]
+        if not user_ids:
+            return
+    ResourceVersion.objects.filter(user_id__in=user_ids, scope=scope).update(version=F('version') + 1)
+
+
+def current_version(user_id, scope):
+    version = ResourceVersion.objects.filter(user_id=user_id, scope=scope).values_list('version', flat=True).first()
+    if version is not None:
+        return version
+    # The row must exist before an ETag goes out, or a later bump would have
+    # nothing to update. If a concurrent request created and bumped it first,
+    # version 0 merely yields an ETag that never matches again.
+    ResourceVersion.objects.bulk_create([ResourceVersion(user_id=user_id, scope=scope)], ignore_conflicts=True)
+    return 0
+
+
+def resource_etag(request, scope):
+    """
+    ETag for `request` on a per-user `scope`, or None when it does not apply.
+
+    Admins read across users, so their responses are not covered by one
+    user's counter.
+    """
+    user = request.user
+    if request.method not in SAFE_METHODS or not user.is_authenticated or user.user_type == 'admin':
+        return None
+    version = current_version(user.id, scope)
+    raw = '|'.join([
+        scope, str(user.id), str(version),
+        request.build_absolute_uri(),
+        getattr(request, 'accepted_media_type', '') or '',
+    ])
+    return '"%s"' % hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def not_modified(request, etag):
+    if etag is None:
+        return None
+    if etag in parse_etags(request.headers.get('If-None-Match', '')):
+        response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        response['ETag'] = etag
+        patch_vary_headers(response, ['Authorization'])
+        return response
+    return None
+
+
+def tag_response(response, etag):
+    if etag is not None and response.status_code == status.HTTP_200_OK:
+        response['ETag'] = etag
+        patch_vary_headers(response, ['Authorization'])
+    return response
+
+
+def conditional_get(scope):
+    """Decorator for function views: answer If-None-Match from `scope`'s counter."""
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapped(request, *args, **kwargs):
+            etag = resource_etag(request, scope)
+            return not_modified(request, etag) or tag_response(view(request, *args, **kwargs), etag)
+        return wrapped
+    return decorator
+
+
+class ConditionalGetMixin:
+    """
+    ETag / If-None-Match for `list` and `retrieve`, checked before the
+    queryset is evaluated or serialized. `etag_scope` names the counter in
+    `ResourceVersion` that signals bump when the underlying rows change.
+    """
+    etag_scope = None
+
+    def list(self, request, *args, **kwargs):
+        etag = resource_etag(request, self.etag_scope)
+        return not_modified(request, etag) or tag_response(super().list(request, *args, **kwargs), etag)
+
+    def retrieve(self, request, *args, **kwargs):
+        etag = resource_etag(request, self.etag_scope)
+        return not_modified(request, etag) or tag_response(super().retrieve(request, *args, **kwargs), etag)
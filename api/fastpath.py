@@ -0,0 +1,197 @@
+# api/fastpath.py
+
+from django.conf import settings
+from django.db.models import FileField as ModelFileField
+from rest_framework import fields as drf_fields
+from rest_framework.relations import PrimaryKeyRelatedField
+from rest_framework.serializers import BaseSerializer, ListSerializer
+
+from api.fieldsets import EXPAND_PARAM, FIELDS_PARAM
+from api.renditions import RenditionsField, rendition_urls
+
+
+class FallbackToSerializer(Exception):
+    """Raised when a page holds data the compiled path cannot render like the serializer."""
+
+
+# Fields whose to_representation is the identity for values the database returns
+IDENTITY_FIELDS = (
+    drf_fields.IntegerField,
+    drf_fields.CharField,
+    drf_fields.ChoiceField,
+    drf_fields.BooleanField,
+    drf_fields.ReadOnlyField,
+    PrimaryKeyRelatedField,
+)
+
+
+def _datetime_converter(field):
+    if getattr(field, 'format', drf_fields.api_settings.DATETIME_FORMAT) != drf_fields.ISO_8601:
+        return field.to_representation
+    field_timezone = field.timezone if hasattr(field, 'timezone') else field.default_timezone()
+    if field_timezone is None:
+        return field.to_representation
+
+    def convert(value):
+        value = value.astimezone(field_timezone).isoformat()
+        if value.endswith('+00:00'):
+            value = value[:-6] + 'Z'
+        return value
+    return convert
+
+
+def _file_converter(model_field):
+    storage = model_field.storage
+
+    def convert(value, request):
+        url = storage.url(value)
+        return request.build_absolute_uri(url) if request is not None else url
+    return convert
+
+
+class CompiledSerializer:
+    """
+    A read serializer flattened into `.values()` paths and per-field getters.
+
+    Forward foreign keys and reverse one-to-ones rendered by nested
+    serializers become joins in the same row; top-level nested lists become
+    one extra query grouped by the foreign key. `SerializerMethodField`s are
+    compiled from the serializer's `fast_method_fields`:
+    `{name: ((value paths...), function(*values))}`. Anything else raises
+    TypeError at compile time, leaving that endpoint on the serializer.
+    """
+
+    def __init__(self, serializer_class):
+        serializer = serializer_class()
+        self.model = serializer.Meta.model
+        self.paths = []
+        self.children = []
+        self.build_row = self._compile(serializer, self.model, '', top_level=True)
+
+    def _path(self, path):
+        if path not in self.paths:
+            self.paths.append(path)
+        return path
+
+    def _compile(self, serializer, model, prefix, top_level=False):
+        getters = []
+        method_fields = getattr(serializer, 'fast_method_fields', {})
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            if isinstance(field, drf_fields.SerializerMethodField):
+                if name not in method_fields:
+                    raise TypeError(f'{type(serializer).__name__}.{name} has no fast_method_fields entry')
+                paths, function = method_fields[name]
+                keys = [self._path(prefix + path) for path in paths]
+                getters.append((name, lambda row, request, keys=keys, function=function: function(*[row[key] for key in keys])))
+                continue
+            if field.source == '*' or '.' in field.source:
+                raise TypeError(f'{type(serializer).__name__}.{name} has an unsupported source')
+
+            model_field = model._meta.get_field(field.source)
+            if isinstance(field, ListSerializer):
+                if not top_level or not model_field.one_to_many:
+                    raise TypeError(f'{type(serializer).__name__}.{name}: only top-level reverse foreign keys are supported')
+                child = CompiledSerializer(type(field.child))
+                self.children.append((name, child, model_field.field.attname))
+                getters.append((name, None))
+                continue
+            if isinstance(field, BaseSerializer):
+                key = self._path(prefix + field.source + '__pk')
+                nested = self._compile(field, model_field.related_model, prefix + field.source + '__')
+
+                def get_nested(row, request, key=key, nested=nested):
+                    if row[key] is None:
+                        # The serializer fails on a missing related row; let it produce that response
+                        raise FallbackToSerializer()
+                    return nested(row, request)
+                getters.append((name, get_nested))
+                continue
+
+            key = self._path(prefix + field.source)
+            if isinstance(field, RenditionsField):
+                storage = model_field.storage
+                getters.append((name, lambda row, request, key=key, storage=storage: rendition_urls(storage, row[key], request)))
+                continue
+            if isinstance(model_field, ModelFileField) and isinstance(field, drf_fields.FileField):
+                convert = _file_converter(model_field)
+                getters.append((name, lambda row, request, key=key, convert=convert: convert(row[key], request) if row[key] else None))
+                continue
+            if isinstance(field, IDENTITY_FIELDS):
+                convert = None
+            elif isinstance(field, drf_fields.DateTimeField):
+                convert = _datetime_converter(field)
+            else:
+                convert = field.to_representation
+            if convert is None:
+                getters.append((name, lambda row, request, key=key: row[key]))
+            else:
+                getters.append((name, lambda row, request, key=key, convert=convert: None if row[key] is None else convert(row[key])))
+
+        def build_row(row, request, children=None):
+            output = {}
+            for name, getter in getters:
+                output[name] = children[name][row['pk']] if getter is None else getter(row, request)
+            return output
+        return build_row
+
+    def values(self, queryset, extra=()):
+        if self.children:
+            self._path('pk')
+        return queryset.values(*self.paths, *[path for path in extra if path not in self.paths])
+
+    def build(self, rows, request):
+        children = {}
+        if self.children:
+            parent_ids = [row['pk'] for row in rows]
+            for name, child, fk in self.children:
+                grouped = {parent_id: [] for parent_id in parent_ids}
+                child_rows = child.values(
+                    child.model._default_manager.filter(**{f'{fk}__in': parent_ids}).order_by('pk'),
+                    extra=(fk,),
+                )
+                for child_row in child_rows:
+                    grouped[child_row[fk]].append(child.build_row(child_row, request))
+                children[name] = grouped
+        return [self.build_row(row, request, children) for row in rows]
+
+
+_compiled = {}
+
+
+def compile_serializer(serializer_class):
+    """Compile once per class; None if the serializer uses something the fast path cannot mirror."""
+    if serializer_class not in _compiled:
+        try:
+            _compiled[serializer_class] = CompiledSerializer(serializer_class)
+        except TypeError:
+            _compiled[serializer_class] = None
+    return _compiled[serializer_class]
+
+
+class FastListMixin:
+    """
+    Serves `list` from `.values()` rows through a CompiledSerializer, with
+    output identical to the serializer's. Requests using `?fields=` /
+    `?expand=`, and pages the compiled path cannot mirror, go through the
+    serializer. FAST_LIST_ENDPOINTS = False turns the path off.
+    """
+
+    def list(self, request, *args, **kwargs):
+        compiled = None
+        if getattr(settings, 'FAST_LIST_ENDPOINTS', True) and not (
+            FIELDS_PARAM in request.query_params or EXPAND_PARAM in request.query_params
+        ):
+            compiled = compile_serializer(self.get_serializer_class())
+        if compiled is None:
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset()).prefetch_related(None)
+        ordering = [field.lstrip('-') for field in self.paginator.get_ordering(queryset)]
+        page = self.paginate_queryset(compiled.values(queryset, extra=ordering))
+        try:
+            data = compiled.build(page, request)
+        except FallbackToSerializer:
+            return super().list(request, *args, **kwargs)
+        return self.get_paginated_response(data)
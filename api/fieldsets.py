@@ -0,0 +1,90 @@
+# api/fieldsets.py
+
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.relations import PrimaryKeyRelatedField
+from rest_framework.serializers import BaseSerializer, ListSerializer
+
+
+FIELDS_PARAM = 'fields'
+EXPAND_PARAM = 'expand'
+
+
+def parse_paths(value):
+    """'id,item.name,item.price' -> {'id': {}, 'item': {'name': {}, 'price': {}}}"""
+    tree = {}
+    for path in value.split(','):
+        node = tree
+        for part in path.strip().split('.'):
+            if part:
+                node = node.setdefault(part, {})
+    return tree
+
+
+def _nested(field):
+    if isinstance(field, ListSerializer):
+        return field.child
+    if isinstance(field, BaseSerializer):
+        return field
+    return None
+
+
+def _collapsed(field):
+    kwargs = {'read_only': True, 'many': isinstance(field, ListSerializer)}
+    if field.source != field.field_name:
+        kwargs['source'] = field.source
+    return PrimaryKeyRelatedField(**kwargs)
+
+
+def prune_fields(serializer, fields=None, expand=None):
+    """
+    Drop fields not named in `fields` and collapse nested serializers not
+    named in `expand` to primary keys, recursing into what is left.
+
+    `None` means "no restriction" at that level: all fields, all expanded.
+    """
+    for name, field in list(serializer.fields.items()):
+        if fields is not None and name not in fields:
+            serializer.fields.pop(name)
+            continue
+        child = _nested(field)
+        if child is None:
+            continue
+        if expand is not None and name not in expand:
+            # Only model relations can be rendered as keys; computed nests stay as they are
+            if field.source != '*' and '.' not in field.source:
+                serializer.fields[name] = _collapsed(field)
+            continue
+        child_fields = None
+        if fields is not None and fields[name]:
+            child_fields = fields[name]
+        child_expand = None
+        if expand is not None:
+            child_expand = expand[name]
+        prune_fields(child, child_fields, child_expand)
+
+
+class SparseFieldsMixin:
+    """
+    Read serializers answer `?fields=` and `?expand=`.
+
+    `fields` lists the fields to keep, with dots for nested ones
+    (`fields=id,item.name`); naming a nested field alone keeps all of it.
+    Once `expand` is given, nested relations it does not name are rendered
+    as primary keys (`expand=item,item.inventory`). Without either param the
+    response is fully expanded, as before.
+
+    Views build their prefetch plan from the pruned serializer, so dropped
+    relations are not joined or prefetched either.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if request is None or request.method not in SAFE_METHODS:
+            return
+        params = request.query_params
+        if FIELDS_PARAM not in params and EXPAND_PARAM not in params:
+            return
+        fields = parse_paths(params[FIELDS_PARAM]) if FIELDS_PARAM in params else None
+        expand = parse_paths(params[EXPAND_PARAM]) if EXPAND_PARAM in params else None
+        prune_fields(self, fields or None, expand)
@@ -9,7 +9,8 @@ from api.models import (
     Notification, 
     UsedItem,
 )
-from django.db.models import Q, F, Sum
+from django.db.models import Q, F
+from api.search import filter_matching, search
 import datetime
 from django.utils import timezone
 
@@ -39,10 +40,12 @@ class OrderItemFilter(django_filters.FilterSet):
         label='User'
     )
     search = django_filters.CharFilter(
-        field_name='item__name',
-        lookup_expr='icontains',
+        method='filter_search',
         label='Item Search'
     )
+
+    def filter_search(self, queryset, name, value):
+        return queryset.filter(item__in=filter_matching(Item.objects.all(), value))
     
    
     class Meta:
@@ -53,8 +56,7 @@ class OrderItemFilter(django_filters.FilterSet):
 
 class NotificationFilter(django_filters.FilterSet):
     type = django_filters.CharFilter(
-        field_name='type',
-        lookup_expr='iexact',
+        method='filter_type',
         label='Type',
     )
     read = django_filters.BooleanFilter(
@@ -73,6 +75,9 @@ class NotificationFilter(django_filters.FilterSet):
         label='Notified Date'
     )
 
+    def filter_type(self, queryset, name, value):
+        return queryset.filter(type=value.lower())
+
     class Meta:
         model = Notification
         fields = ['type', 'read', 'search', 'date']
@@ -207,9 +212,18 @@ class ItemFilters(django_filters.FilterSet):
         label='Location',
     )
     category = django_filters.CharFilter(method='filter_search')
+    q = django_filters.CharFilter(
+        method='filter_full_text',
+        label='Keyword search',
+    )
     
     def filter_search(self, queryset, name, value):
-        return queryset.filter(category__iexact=value)
+        # Choice values are lowercase; an exact match keeps the composite index usable
+        return queryset.filter(category=value.lower())
+
+    def filter_full_text(self, queryset, name, value):
+        # Ranked by relevance; pagination keys its cursor on (search_rank, id)
+        return search(queryset, value)
     
     class Meta:
         model = Item
@@ -237,9 +251,17 @@ class UsedItemFilters(django_filters.FilterSet):
         label='Name',
     )
     category = django_filters.CharFilter(method='filter_search')
+    q = django_filters.CharFilter(
+        method='filter_full_text',
+        label='Keyword search',
+    )
     
     def filter_search(self, queryset, name, value):
-        return queryset.filter(category__iexact=value)
+        return queryset.filter(category=value.lower())
+
+    def filter_full_text(self, queryset, name, value):
+        # Ranked by relevance; pagination keys its cursor on (search_rank, id)
+        return search(queryset, value)
     
     class Meta:
         model = UsedItem
@@ -323,9 +345,9 @@ class OrderFilters(django_filters.FilterSet):
         label='Item Name',
     )
     
+    # iexact compiles to LIKE, which cannot use the (user, status, created_at) index
     status = django_filters.CharFilter(
-        field_name='status',
-        lookup_expr='iexact',
+        method='filter_status',
         label='Status',
     )
     
@@ -334,17 +356,16 @@ class OrderFilters(django_filters.FilterSet):
         label='Date Range',
     )
     
+    def filter_status(self, queryset, name, value):
+        return queryset.filter(status=value.lower())
+
     def filter_min_total(self, queryset, name, value):
-        # Annotate each order with its total, then filter
-        return queryset.annotate(
-            order_total=Sum(F('order_items__price_at_purchase') * F('order_items__quantity'))
-        ).filter(order_total__gte=value)
+        # Stored total, kept current by Order.refresh_totals()
+        return queryset.filter(total_amount__gte=value)
 
     def filter_max_total(self, queryset, name, value):
-        # Annotate each order with its total, then filter
-        return queryset.annotate(
-            order_total=Sum(F('order_items__price_at_purchase') * F('order_items__quantity'))
-        ).filter(order_total__lte=value)
+        # Stored total, kept current by Order.refresh_totals()
+        return queryset.filter(total_amount__lte=value)
 
     def filter_by_date(self, queryset, name, value):
         today = timezone.now().date()
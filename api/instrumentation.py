@@ -0,0 +1,191 @@
+# api/instrumentation.py
+
+import logging
+import random
+import time
+from contextlib import nullcontext
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connection
+
+
+logger = logging.getLogger('api.requests')
+
+DEFAULTS = {
+    # Fraction of requests that get the full breakdown (queries, SQL time, header)
+    'SAMPLE_RATE': 1.0,
+    # Requests slower than this are logged as warnings, sampled or not
+    'SLOW_REQUEST_MS': 500,
+    'SERVER_TIMING_HEADER': True,
+}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'REQUEST_METRICS', {})}
+
+
+class RequestMetrics:
+    """Per-request counters, attached to the request as `request.metrics`."""
+
+    def __init__(self, count_view_queries=False):
+        # Under ASGI the views' connections belong to other threads than the middleware's
+        self.count_view_queries = count_view_queries
+        self.queries = 0
+        self.sql_time = 0.0
+        self.view_time = None
+        self.serializer_time = None
+        self._serializer_started = None
+        self._sql_time_at_serializer = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        # connection.execute_wrapper hook
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_time += time.perf_counter() - start
+            self.queries += 1
+
+    def serializer_started(self):
+        self._serializer_started = time.perf_counter()
+        self._sql_time_at_serializer = self.sql_time
+
+    def serializer_finished(self):
+        if self._serializer_started is None:
+            return
+        # Lazy loads and saves run inside this window; they are already counted under db.
+        elapsed = time.perf_counter() - self._serializer_started
+        self.serializer_time = elapsed - (self.sql_time - self._sql_time_at_serializer)
+        self._serializer_started = None
+
+
+class RequestMetricsMiddleware:
+    """
+    Record query count, SQL time, view time and serializer time per request.
+
+    Sampled requests run with a `connection.execute_wrapper` and get a
+    `Server-Timing` header and an info log line. Unsampled requests only pay
+    for two clock reads, and are still logged when they cross the slow
+    threshold.
+
+    Under ASGI it runs on the event loop, so an async view that waits (a long
+    poll) does not hold a thread meanwhile. Queries are then counted by
+    InstrumentedViewMixin in the view's own thread, and not for async views.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+        config = get_config()
+        self.sample_rate = config['SAMPLE_RATE']
+        self.slow_request_ms = config['SLOW_REQUEST_MS']
+        self.server_timing = config['SERVER_TIMING_HEADER']
+
+    def sampled(self):
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        start = time.perf_counter()
+        if not self.sampled():
+            return self.finish(request, self.get_response(request), start, None)
+
+        metrics = request.metrics = RequestMetrics()
+        with connection.execute_wrapper(metrics):
+            response = self.get_response(request)
+        return self.finish(request, response, start, metrics)
+
+    async def __acall__(self, request):
+        start = time.perf_counter()
+        if not self.sampled():
+            return self.finish(request, await self.get_response(request), start, None)
+
+        metrics = request.metrics = RequestMetrics(count_view_queries=True)
+        response = await self.get_response(request)
+        return self.finish(request, response, start, metrics)
+
+    def finish(self, request, response, start, metrics):
+        total_ms = (time.perf_counter() - start) * 1000
+        if metrics is None:
+            if total_ms >= self.slow_request_ms:
+                self.log(request, response, total_ms, None)
+            return response
+
+        if self.server_timing:
+            response['Server-Timing'] = self.server_timing_header(metrics, total_ms)
+        self.log(request, response, total_ms, metrics)
+        return response
+
+    @staticmethod
+    def server_timing_header(metrics, total_ms):
+        entries = [f'db;dur={metrics.sql_time * 1000:.1f};desc="{metrics.queries} queries"']
+        if metrics.serializer_time is not None:
+            entries.append(f'serialize;dur={metrics.serializer_time * 1000:.1f}')
+        if metrics.view_time is not None:
+            entries.append(f'view;dur={metrics.view_time * 1000:.1f}')
+        entries.append(f'total;dur={total_ms:.1f}')
+        return ', '.join(entries)
+
+    def log(self, request, response, total_ms, metrics):
+        fields = {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'total_ms': round(total_ms, 1),
+        }
+        if metrics is not None:
+            fields['queries'] = metrics.queries
+            fields['db_ms'] = round(metrics.sql_time * 1000, 1)
+            if metrics.view_time is not None:
+                fields['view_ms'] = round(metrics.view_time * 1000, 1)
+            if metrics.serializer_time is not None:
+                fields['serializer_ms'] = round(metrics.serializer_time * 1000, 1)
+
+        slow = total_ms >= self.slow_request_ms
+        fields['slow'] = slow
+        logger.log(
+            logging.WARNING if slow else logging.INFO,
+            ' '.join(f'{key}={value}' for key, value in fields.items()),
+            extra={'request_metrics': fields},
+        )
+
+
+class InstrumentedViewMixin:
+    """
+    Feeds view and serializer timings into `request.metrics` when the request
+    is sampled.
+
+    Serializer time runs from the last `get_serializer()` call to
+    `finalize_response()`, i.e. validation, save and `.data`, less the SQL
+    executed in between.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        metrics = getattr(request, 'metrics', None)
+        if metrics is None:
+            return super().dispatch(request, *args, **kwargs)
+        start = time.perf_counter()
+        try:
+            with connection.execute_wrapper(metrics) if metrics.count_view_queries else nullcontext():
+                return super().dispatch(request, *args, **kwargs)
+        finally:
+            metrics.view_time = time.perf_counter() - start
+
+    def get_serializer(self, *args, **kwargs):
+        metrics = getattr(self.request, 'metrics', None)
+        if metrics is not None:
+            metrics.serializer_started()
+        return super().get_serializer(*args, **kwargs)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        metrics = getattr(request, 'metrics', None)
+        if metrics is not None:
+            metrics.serializer_finished()
+        return super().finalize_response(request, response, *args, **kwargs)
@@ -0,0 +1,66 @@
+import gc
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from rest_framework.test import APIClient
+
+from api.caching import get_catalog_cache
+from api.models import User
+
+
+# List endpoints served by FastListMixin
+ENDPOINTS = ['item', 'order', 'cart', 'notification']
+
+
+class Command(BaseCommand):
+    help = "Time list pages through the serializers and through the compiled .values() path"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--role', default='customer', choices=['customer', 'vendor', 'admin'])
+        parser.add_argument('--page-size', type=int, default=None, help='page_size param (default: the paginator\'s)')
+        parser.add_argument('--repeat', type=int, default=20, help='Timed requests per path and endpoint')
+        parser.add_argument('--endpoint', action='append', choices=ENDPOINTS, help='Limit to these endpoints')
+
+    def handle(self, *args, **options):
+        user = User.objects.filter(user_type=options['role']).order_by('id').first()
+        if user is None:
+            raise CommandError(f"No {options['role']} user, run populate first")
+
+        client = APIClient(SERVER_NAME='localhost')
+        client.force_authenticate(user)
+        query = f"?page_size={options['page_size']}" if options['page_size'] else ''
+
+        for endpoint in options['endpoint'] or ENDPOINTS:
+            url = f'/api/{endpoint}/{query}'
+            slow, slow_response = self.measure(client, url, False, options['repeat'])
+            fast, fast_response = self.measure(client, url, True, options['repeat'])
+            if slow_response.status_code != 200:
+                self.stdout.write(self.style.WARNING(f'{endpoint:<14} skipped, answered {slow_response.status_code}'))
+                continue
+            slow_body, fast_body = slow_response.content, fast_response.content
+            match = self.style.SUCCESS('identical') if slow_body == fast_body else self.style.ERROR('DIFFERENT')
+            self.stdout.write(
+                f'{endpoint:<14} serializer {slow:8.2f}ms  values {fast:8.2f}ms  '
+                f'x{slow / fast:5.2f}  {len(fast_body)} bytes {match}'
+            )
+
+    def measure(self, client, url, fast, repeat):
+        """Median milliseconds per request, and the last response."""
+        cache = get_catalog_cache()
+        timings = []
+        # Sampling off so metrics logging does not land in the timings
+        with override_settings(FAST_LIST_ENDPOINTS=fast, REQUEST_METRICS={'SAMPLE_RATE': 0}):
+            gc.disable()
+            try:
+                # First request is a warm-up
+                for _ in range(repeat + 1):
+                    # Item pages would otherwise come from the catalog cache
+                    cache.clear()
+                    start = time.perf_counter()
+                    response = client.get(url)
+                    timings.append((time.perf_counter() - start) * 1000)
+            finally:
+                gc.enable()
+        return statistics.median(timings[1:]), response
@@ -0,0 +1,25 @@
+from concurrent.futures import wait
+
+from django.apps import apps
+from django.core.management.base import BaseCommand
+
+from api.renditions import IMAGE_FIELDS, schedule
+
+
+class Command(BaseCommand):
+    help = "Render the missing WebP/JPEG renditions of every stored image, e.g. after populate"
+
+    def handle(self, *args, **options):
+        futures = []
+        for label, field in IMAGE_FIELDS.items():
+            model = apps.get_model(label)
+            storage = model._meta.get_field(field).storage
+            # Many rows share a file; each is rendered once
+            names = model.objects.exclude(**{field: ''}).exclude(**{f'{field}__isnull': True}).values_list(field, flat=True).distinct()
+            for name in names:
+                future = schedule(storage, name)
+                if future is not None:
+                    futures.append(future)
+        done, _ = wait(futures)
+        failed = sum(1 for future in done if future.exception() is not None)
+        self.stdout.write(f"Rendered {len(done) - failed} images, {failed} failed")
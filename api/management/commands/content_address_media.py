@@ -0,0 +1,43 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+
+from api.caching import bump_catalog_version
+from api.etags import bump_resource_versions
+from api.models import Cart
+from api.renditions import IMAGE_FIELDS, schedule
+from api.storage import ContentAddressedStorage, content_etag
+
+
+class Command(BaseCommand):
+    help = (
+        "Point image rows saved before ContentAddressedStorage (e.g. by populate) at "
+        "content-addressed copies, one per distinct content. The old files are left in place."
+    )
+
+    def handle(self, *args, **options):
+        renamed = {}
+        for label, field in IMAGE_FIELDS.items():
+            model = apps.get_model(label)
+            storage = model._meta.get_field(field).storage
+            if not isinstance(storage, ContentAddressedStorage):
+                continue
+            names = model.objects.exclude(**{field: ''}).exclude(**{f'{field}__isnull': True}).values_list(field, flat=True).distinct()
+            for name in names:
+                if content_etag(name) is not None:
+                    continue
+                if name not in renamed:
+                    if not storage.exists(name):
+                        self.stderr.write(f"Missing file: {name}")
+                        continue
+                    with storage.open(name) as content:
+                        renamed[name] = storage.save(name, content)
+                    schedule(storage, renamed[name])
+                rows = model.objects.filter(**{field: name})
+                # Queryset updates skip the signals that invalidate cached responses
+                if label == 'api.User':
+                    bump_resource_versions(rows.values('id'), 'user')
+                elif label == 'api.Item':
+                    bump_resource_versions(Cart.objects.filter(item__in=rows).values('user_id'), 'cart')
+                rows.update(**{field: renamed[name]})
+        bump_catalog_version()
+        self.stdout.write(f"Renamed {len(renamed)} files to {len(set(renamed.values()))} content-addressed files")
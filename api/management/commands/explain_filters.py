@@ -0,0 +1,135 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+import django_filters
+
+from api.filters import (
+    CartFilters,
+    ItemFilters,
+    RatingFilter,
+    OrderFilters,
+    DiscountFilter,
+    OrderItemFilter,
+    NotificationFilter,
+    UsedItemFilters,
+)
+from api.models import (
+    Cart, Item, Order, Rating, Discount, OrderItem, Notification, UsedItem,
+)
+from api.pagination import (
+    CartPagination, DiscountPagination, ItemPagination, NotificationPagination,
+    OrderItemPagination, OrderPagination, RatingPagination, UsedItemPagination,
+)
+
+
+# (label, filterset, scoped queryset as the viewset builds it, pagination ordering)
+FILTER_PATHS = [
+    ('order', OrderFilters, lambda: Order.objects.filter(user_id=1), OrderPagination),
+    ('cart', CartFilters, lambda: Cart.objects.filter(user_id=1), CartPagination),
+    ('notification', NotificationFilter, lambda: Notification.objects.filter(user_id=1), NotificationPagination),
+    ('discount', DiscountFilter, lambda: Discount.objects.filter(vendor_id=1), DiscountPagination),
+    ('rating', RatingFilter, lambda: Rating.objects.filter(item__vendor_id=1), RatingPagination),
+    ('item (customer)', ItemFilters, lambda: Item.objects.all(), ItemPagination),
+    ('item (vendor)', ItemFilters, lambda: Item.objects.filter(vendor_id=1), ItemPagination),
+    ('used-item', UsedItemFilters, lambda: UsedItem.objects.all(), UsedItemPagination),
+    ('order-item (vendor)', OrderItemFilter, lambda: OrderItem.objects.filter(item__vendor_id=1), OrderItemPagination),
+]
+
+# Values for filters whose method only accepts specific inputs
+SAMPLE_VALUES = {
+    'date': 'last3months',
+    'status': 'active',
+    'category': 'electronics',
+    'type': 'system',
+    'q': 'phone',
+}
+
+
+def sample_value(name, filter_):
+    if isinstance(filter_, django_filters.BooleanFilter):
+        return 'true'
+    if isinstance(filter_, django_filters.NumberFilter):
+        return '10'
+    if isinstance(filter_, django_filters.DateFilter):
+        return '2025-01-01'
+    return SAMPLE_VALUES.get(name, 'a')
+
+
+class Command(BaseCommand):
+    help = "Run EXPLAIN QUERY PLAN on every filterset path and flag full scans, filtered index walks and sorts"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--strict',
+            action='store_true',
+            help='Exit with an error if any path is flagged',
+        )
+        parser.add_argument(
+            '--verbose-plan',
+            action='store_true',
+            help='Print the full plan for every path, not only flagged ones',
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('explain_filters reads SQLite query plans; the default database is %s' % connection.vendor)
+
+        flagged = []
+        for label, filterset_class, base_queryset, pagination in FILTER_PATHS:
+            paths = [('(no filter)', {})]
+            for name, filter_ in filterset_class.base_filters.items():
+                paths.append((name, {name: sample_value(name, filter_)}))
+
+            for filter_name, params in paths:
+                filterset = filterset_class(data=params, queryset=base_queryset())
+                if not filterset.is_valid():
+                    self.stdout.write(self.style.WARNING(f'{label} ?{filter_name}: invalid sample {params}'))
+                    continue
+                queryset = filterset.qs
+                if not queryset.query.order_by:
+                    queryset = queryset.order_by(*pagination.ordering)
+
+                plan = self.explain(queryset[:pagination.page_size + 1])
+                steps = self.flagged_steps(plan, filtered=bool(params))
+                line = f'{label} ?{filter_name}'
+                if steps:
+                    flagged.append(line)
+                    self.stdout.write(self.style.WARNING(f'FLAGGED    {line}: ' + '; '.join(steps)))
+                else:
+                    self.stdout.write(self.style.SUCCESS(f'ok         {line}'))
+                if options['verbose_plan']:
+                    for detail in plan:
+                        self.stdout.write(f'               {detail}')
+
+        self.stdout.write(f'\n{len(flagged)} path(s) reading past the page')
+        if flagged and options['strict']:
+            raise CommandError('Paths reading past the page: ' + ', '.join(flagged))
+
+    def explain(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            return [row[-1] for row in cursor.fetchall()]
+
+    @staticmethod
+    def flagged_steps(plan, filtered):
+        """
+        Plan steps that read far more rows than a page holds.
+
+        "SCAN t" walks the whole table. "SCAN t USING INDEX i" reads the
+        index in keyset order and stops at the page LIMIT, but only while
+        every row it reads belongs on the page: a filter the index cannot
+        answer (e.g. item `?name=`, a LIKE, walking item_created_idx) is
+        checked row by row and can walk the whole index for a few matches.
+        "USE TEMP B-TREE" sorts every matching row before the LIMIT applies,
+        after a SEARCH as much as after a SCAN. Virtual-table (FTS5) scans
+        are lookups into the full-text index.
+        """
+        flagged = []
+        for detail in plan:
+            if 'USE TEMP B-TREE' in detail:
+                flagged.append(detail)
+            elif not detail.startswith('SCAN ') or 'VIRTUAL TABLE' in detail:
+                continue
+            elif 'INDEX' not in detail or filtered:
+                flagged.append(detail)
+        return flagged
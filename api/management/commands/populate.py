@@ -1,16 +1,24 @@
-from django.core.management.base import BaseCommand
-from django.utils.timezone import make_aware, now, timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.utils.timezone import now, timedelta
 from django.db.utils import IntegrityError
-from django.db import transaction
+from django.db import DEFAULT_DB_ALIAS, connection, connections, transaction
+from django.db.models import Max
+from django.contrib.admin.models import LogEntry
+from django.contrib.auth.hashers import make_password
+from api.caching import bump_catalog_version
 from api.models import (
     User, Address, Wallet, Item, Inventory, Order, 
     OrderItem, Transaction, Discount, Cart, Bid,
-    Notification, Rating, UsedItem
+    Notification, Rating, UsedItem, StockReservation, ResourceVersion
 )
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque
 from decimal import Decimal
+import django
 import random
+import time
 from faker import Faker
-import uuid
 from faker.providers import company, address, person, phone_number, lorem
 import re
 import os
@@ -109,6 +117,78 @@ VENDOR_BUSINESSES = [
     ("Gadgets & Gizmos", "electronics")
 ]
 
+
+LOCATIONS = [
+    'East Coast Warehouse',
+    'West Coast Distribution Center',
+    'Central Fulfillment Center',
+    'Main Retail Store',
+    'Supplier Direct',
+]
+
+STATES = ['CA', 'NY', 'TX', 'FL', 'IL', 'PA', 'OH', 'GA', 'NC', 'MI']
+
+CITIES = [
+    'Los Angeles', 'New York', 'Chicago', 'Houston', 'Phoenix',
+    'Philadelphia', 'San Antonio', 'San Diego', 'Dallas', 'Austin',
+]
+
+NOTIFICATION_TYPES = [
+    ('system', 'System maintenance scheduled for tomorrow at 2 AM'),
+    ('general', 'Welcome to our marketplace! Start shopping now'),
+    ('product', 'New items added to your favorite category'),
+    ('general', 'Your order has been shipped'),
+    ('product', 'Special discount on items you viewed'),
+    ('system', 'Your account has been verified'),
+]
+
+REVIEWS = [
+    "Great product, would buy again!",
+    "Exactly as described",
+    "Fast shipping, good quality",
+    "Met my expectations",
+    "Good value for the price",
+    "Highly recommend",
+    "Works perfectly",
+    "Better than expected",
+]
+
+# Children before parents, so plain DELETEs never trip a foreign key
+RESET_ORDER = [
+    StockReservation, ResourceVersion,
+    Rating, Notification, Bid, Cart, Discount,
+    Transaction, OrderItem, Order, Inventory,
+    UsedItem, Item, Wallet, Address,
+    LogEntry, User.groups.through, User.user_permissions.through, User,
+]
+
+
+# Insert order within a chunk: parents before the rows that reference them
+VENDOR_TABLES = [
+    ('users', User), ('addresses', Address), ('wallets', Wallet), ('items', Item),
+    ('inventory', Inventory), ('discounts', Discount), ('notifications', Notification),
+]
+CUSTOMER_TABLES = [
+    ('users', User), ('addresses', Address), ('wallets', Wallet), ('used_items', UsedItem),
+    ('bids', Bid), ('orders', Order), ('order_items', OrderItem), ('transactions', Transaction),
+    ('carts', Cart), ('notifications', Notification), ('ratings', Rating),
+]
+
+# Most rows one user can produce per id sequence. Every chunk gets its own id
+# block sized by these caps, so workers can assign ids without coordination;
+# unused slots at the end of a block are simply skipped.
+ID_MODELS = {'user': User, 'item': Item, 'discount': Discount, 'order': Order, 'used_item': UsedItem}
+VENDOR_ID_SLOTS = {'item': 10, 'discount': 4}
+USED_ITEMS_PER_CUSTOMER = 3
+
+
+def customer_id_slots(orders_per_customer):
+    return {
+        'order': orders_per_customer if orders_per_customer is not None else 4,
+        'used_item': USED_ITEMS_PER_CUSTOMER,
+    }
+
+
 def clean_email_domain(name):
     """Clean up a string to be a valid domain-like name"""
     # Remove apostrophes and non-word characters
@@ -116,6 +196,350 @@ def clean_email_domain(name):
     # Lowercase everything
     return name.lower()
 
+
+def chunk_rng(seed, kind, chunk_index):
+    """
+    Random source for one chunk of generated rows.
+
+    Each chunk is seeded from (seed, kind, chunk_index) alone, so a chunk's rows
+    do not depend on which chunks were generated before it.
+    """
+    rng = random.Random(f'{seed}:{kind}:{chunk_index}')
+    fake.seed_instance(rng.getrandbits(32))
+    return rng
+
+
+def money(rng, low, high):
+    return Decimal(rng.uniform(low, high)).quantize(Decimal('0.01'))
+
+
+def address_rows(rng, user_id):
+    return [
+        {
+            'street_address': f"{rng.randint(100, 9999)} {rng.choice(['Main', 'Park', 'Oak', 'Pine', 'Maple'])} {rng.choice(['St', 'Ave', 'Blvd', 'Rd', 'Ln'])}",
+            'city': rng.choice(CITIES),
+            'state': rng.choice(STATES),
+            'postal_code': f"{rng.randint(10000, 99999)}",
+            'country': 'USA',
+            'user_id': user_id,
+        }
+        for _ in ("Home", "Work")
+    ]
+
+
+def notification_rows(rng, user_id):
+    rows = []
+    # Each user gets 3-8 notifications, 70% of them read
+    for _ in range(rng.randint(3, 8)):
+        notification_type, text = rng.choice(NOTIFICATION_TYPES)
+        rows.append({
+            'user_id': user_id,
+            'type': notification_type,
+            'text': text,
+            'read': rng.random() < 0.7,
+        })
+    return rows
+
+
+def prepare_insert(model, rows):
+    """
+    Turn plain dict rows into an INSERT statement and its executemany params.
+
+    Runs in the generating process so the writer only executes SQL. Columns
+    missing from the rows take the value the field would get on a normal
+    save (defaults, auto_now_add), computed once per call. Value adaptation
+    goes through the connection's ops and never opens a connection.
+    """
+    first_row = rows[0]
+    fields = [
+        field for field in model._meta.concrete_fields
+        if not field.primary_key or field.attname in first_row
+    ]
+    prototype = model(**first_row)
+    defaults = {
+        field.attname: field.pre_save(prototype, add=True)
+        for field in fields if field.attname not in first_row
+    }
+
+    # The real wrapper, not the thread-local proxy: this runs once per value
+    db = connections[DEFAULT_DB_ALIAS]
+    qn = db.ops.quote_name
+    sql = 'INSERT INTO %s (%s) VALUES (%s)' % (
+        qn(model._meta.db_table),
+        ', '.join(qn(field.column) for field in fields),
+        ', '.join(['%s'] * len(fields)),
+    )
+    columns = [(field.attname, field.get_db_prep_save, defaults.get(field.attname)) for field in fields]
+    params = [
+        [prep(row.get(attname, default), db) for attname, prep, default in columns]
+        for row in rows
+    ]
+    return sql, params
+
+
+def prepare_inserts(rows, tables):
+    return [prepare_insert(model, rows[key]) for key, model in tables if rows[key]]
+
+
+def generate_vendor_chunk(seed, chunk_index, first_index, count, ids, password, profile_images, item_images, taken_emails):
+    """
+    Rows for vendors [first_index, first_index + count) and their catalog.
+
+    `ids` holds the first user, item and discount id reserved for this chunk
+    (see VENDOR_ID_SLOTS), so every foreign key is known without asking the
+    database. Returns the prepared INSERTs plus the catalog customers buy from.
+    """
+    rng = chunk_rng(seed, 'vendors', chunk_index)
+    rows = {key: [] for key in ('users', 'addresses', 'wallets', 'items', 'inventory', 'discounts', 'notifications')}
+
+    for offset in range(count):
+        index = first_index + offset
+        user_id = ids['user'] + offset
+        if index < len(VENDOR_BUSINESSES):
+            business_name, primary_category = VENDOR_BUSINESSES[index]
+        else:
+            business_name = fake.company()[:50]
+            primary_category = rng.choice(list(PRODUCTS))
+        clean_business = clean_email_domain(business_name)
+        email = f"contact@{clean_business}.com"
+        username = clean_business
+        if index >= len(VENDOR_BUSINESSES) or email in taken_emails:
+            email = f"contact{user_id}@{clean_business}.com"
+            username = f"{clean_business}{user_id}"
+
+        rows['users'].append({
+            'id': user_id,
+            'username': username[:150],
+            'email': email,
+            'phone': f"+1{rng.randint(2000000000, 9999999999)}",
+            'first_name': "",  # Business vendors don't need first/last name
+            'last_name': "",
+            'user_type': 'vendor',
+            'business_name': business_name,
+            'password': password,
+            'verification_status': 'verified',
+            'vendor_type': 'business',
+            'business_license': f"BL{rng.randint(100000, 999999)}",
+            'rating': Decimal(rng.uniform(4.0, 5.0)).quantize(Decimal('0.1')),
+            'profile_image': rng.choice(profile_images) if profile_images else None,
+        })
+        rows['addresses'].extend(address_rows(rng, user_id))
+        rows['wallets'].append({
+            'address': f"0x{rng.getrandbits(160):040x}",
+            'balance': money(rng, 5000, 50000),
+            'user_id': user_id,
+        })
+
+        # 5-8 items from the primary category plus 2 from another one for variety
+        category_products = PRODUCTS[primary_category]
+        selected = [
+            (primary_category, product)
+            for product in rng.sample(category_products, min(rng.randint(5, 8), len(category_products)))
+        ]
+        other_category = rng.choice([k for k in PRODUCTS if k != primary_category])
+        selected += [
+            (other_category, product)
+            for product in rng.sample(PRODUCTS[other_category], min(2, len(PRODUCTS[other_category])))
+        ]
+        for category, (name, description, price, _) in selected:
+            item_id = ids['item'] + len(rows['items'])
+            # Most items are in stock, with 5-100 units
+            in_stock = rng.random() < 0.9
+            rows['inventory'].append({
+                'item_id': item_id,
+                'item_quantity': rng.randint(5, 100) if in_stock else 0,
+                'in_stock': in_stock,
+                'location': rng.choice(LOCATIONS),
+                'last_restocked': now() - timedelta(days=rng.randint(1, 60)),
+            })
+            rows['items'].append({
+                'id': item_id,
+                'name': name,
+                'description': description,
+                'price': Decimal(str(price)),
+                'category': category,
+                'vendor_id': user_id,
+                'image': rng.choice(item_images) if item_images else None,
+            })
+
+        # 2-4 discounts; the id suffix keeps codes unique
+        for i in range(rng.randint(2, 4)):
+            discount_id = ids['discount'] + len(rows['discounts'])
+            rows['discounts'].append({
+                'id': discount_id,
+                'code': f"{business_name[:3].upper()}{discount_id}",
+                'name': f"{business_name} Discount {i+1}"[:50],
+                'percentage': Decimal(rng.uniform(5, 30)).quantize(Decimal('0.1')),
+                'expires_at': (now() + timedelta(days=rng.randint(30, 90))).date(),
+                'max_redemptions': rng.randint(50, 200),
+                'vendor_id': user_id,
+            })
+        rows['notifications'].extend(notification_rows(rng, user_id))
+
+    return {
+        'inserts': prepare_inserts(rows, VENDOR_TABLES),
+        'catalog': [(item['id'], item['price']) for item in rows['items']],
+        'discount_ids': [discount['id'] for discount in rows['discounts']],
+    }
+
+
+# (catalog, discount_ids) from the vendor phase, set once per process by share_catalog
+_shared_catalog = ([], [])
+
+
+def share_catalog(catalog, discount_ids):
+    global _shared_catalog
+    _shared_catalog = (catalog, discount_ids)
+
+
+def init_customer_worker(catalog, discount_ids):
+    """Pool initializer: hands each worker the catalog once instead of pickling it into every task."""
+    django.setup()
+    share_catalog(catalog, discount_ids)
+
+
+def generate_customer_chunk(seed, chunk_index, first_index, count, ids, password, orders_per_customer, profile_images, used_item_images, taken_emails):
+    """
+    Rows for customers [first_index, first_index + count) and their activity.
+
+    `ids` holds the first user, order and used item id reserved for this chunk
+    (see customer_id_slots). The catalog, a list of (item_id, price), and the
+    discount ids come from share_catalog; both are written by the vendor
+    phase. Bids only target used items listed by other customers of the same
+    chunk.
+    """
+    catalog, discount_ids = _shared_catalog
+    rng = chunk_rng(seed, 'customers', chunk_index)
+    rows = {key: [] for key in (
+        'users', 'addresses', 'wallets', 'used_items', 'bids', 'orders', 'order_items',
+        'transactions', 'carts', 'notifications', 'ratings',
+    )}
+    used_item_owners = []
+
+    for offset in range(count):
+        index = first_index + offset
+        user_id = ids['user'] + offset
+        if index < len(CUSTOMER_NAMES):
+            first_name, last_name = CUSTOMER_NAMES[index]
+            email = f"{first_name.lower()}.{last_name.lower()}@example.com"
+        else:
+            first_name, last_name = fake.first_name(), fake.last_name()
+            email = None
+        if email is None or email in taken_emails:
+            email = f"{first_name.lower()}.{last_name.lower()}.{user_id}@example.com"
+
+        rows['users'].append({
+            'id': user_id,
+            'username': f"{first_name.lower()}{user_id}",
+            'email': email,
+            'phone': f"+1{rng.randint(2000000000, 9999999999)}",
+            'first_name': first_name,
+            'last_name': last_name,
+            'user_type': 'customer',
+            'password': password,
+            'verification_status': 'verified',
+            'profile_image': rng.choice(profile_images) if profile_images else None,
+        })
+        rows['addresses'].extend(address_rows(rng, user_id))
+
+        # 2-3 used items across different categories, at 40-80% of the original price
+        for category in rng.sample(list(PRODUCTS), rng.randint(2, 3)):
+            name, description, price, _ = rng.choice(PRODUCTS[category])
+            used_item_owners.append(user_id)
+            rows['used_items'].append({
+                'id': ids['used_item'] + len(rows['used_items']),
+                'name': f"Used {name}"[:50],
+                'description': f"Pre-owned {description} in {rng.choice(['excellent', 'good', 'fair'])} condition. {rng.choice(['Light scratches', 'Like new', 'Minor wear', 'Well maintained'])}. {rng.choice(['Original box included', 'All accessories included', 'Comes with case', 'Recently serviced'])}.",
+                'price': Decimal(price * rng.uniform(0.4, 0.8)).quantize(Decimal('0.01')),
+                'category': category,
+                'warranty_period': rng.randint(0, 6),  # 0-6 months warranty
+                'user_id': user_id,
+                'image': rng.choice(used_item_images) if used_item_images else None,
+            })
+
+        # Orders with 1-4 lines each; totals are computed here because
+        # bulk inserts bypass the OrderItem signals
+        spent = Decimal('0.00')
+        num_orders = orders_per_customer if orders_per_customer is not None else rng.randint(2, 4)
+        for _ in range(num_orders):
+            status = rng.choices(
+                ['pending', 'shipped', 'delivered', 'cancelled'],
+                weights=[0.2, 0.3, 0.4, 0.1],
+                k=1
+            )[0]
+            order_id = ids['order'] + len(rows['orders'])
+            total_amount, item_count = Decimal('0'), 0
+            for item_id, price in rng.sample(catalog, min(rng.randint(1, 4), len(catalog))):
+                quantity = rng.randint(1, 3)
+                rows['order_items'].append({
+                    'order_id': order_id,
+                    'item_id': item_id,
+                    'quantity': quantity,
+                    'price_at_purchase': price,
+                })
+                total_amount += price * quantity
+                item_count += quantity
+            rows['orders'].append({
+                'id': order_id,
+                'user_id': user_id,
+                'status': status,
+                'total_amount': total_amount,
+                'item_count': item_count,
+            })
+            if status != 'cancelled':
+                spent += total_amount
+                rows['transactions'].append({
+                    'order_id': order_id,
+                    'transaction_hash': f"tx_{order_id}_{rng.getrandbits(48):012x}",
+                    'status': 'completed',
+                    'user_id': user_id,
+                })
+
+        rows['wallets'].append({
+            'address': f"0x{rng.getrandbits(160):040x}",
+            'balance': money(rng, 100, 2000) - spent,
+            'user_id': user_id,
+        })
+
+        # 1-3 cart lines, 30% of them with a discount applied
+        for item_id, _ in rng.sample(catalog, min(rng.randint(1, 3), len(catalog))):
+            apply_discount = rng.random() < 0.3
+            rows['carts'].append({
+                'user_id': user_id,
+                'item_id': item_id,
+                'item_quantity': rng.randint(1, 3),
+                'discount_id': rng.choice(discount_ids) if apply_discount and discount_ids else None,
+            })
+
+        rows['notifications'].extend(notification_rows(rng, user_id))
+
+        # 1-3 ratings between 3-5 stars, weighted towards higher ratings
+        for item_id, _ in rng.sample(catalog, min(rng.randint(1, 3), len(catalog))):
+            rows['ratings'].append({
+                'user_id': user_id,
+                'item_id': item_id,
+                'rating': rng.choices([3, 4, 5], weights=[0.2, 0.3, 0.5], k=1)[0],
+                'review': rng.choice(REVIEWS),
+            })
+
+    # Bids of 70-120% of the asking price on other customers' used items
+    for offset in range(count):
+        user_id = ids['user'] + offset
+        wanted = rng.randint(1, 3)
+        # Customers list at most 3 items each, so 3 spare draws always leave enough foreign ones
+        candidates = rng.sample(range(len(used_item_owners)), min(wanted + 3, len(used_item_owners)))
+        for used_item_index in [i for i in candidates if used_item_owners[i] != user_id][:wanted]:
+            asking = rows['used_items'][used_item_index]['price']
+            rows['bids'].append({
+                'user_id': user_id,
+                'used_item_id': rows['used_items'][used_item_index]['id'],
+                'amount': (asking * Decimal(rng.uniform(0.7, 1.2))).quantize(Decimal('0.01')),
+                'status': 'bidding',
+            })
+
+    return {'inserts': prepare_inserts(rows, CUSTOMER_TABLES)}
+
+
 class Command(BaseCommand):
     help = 'Populate database with realistic e-commerce data'
 
@@ -125,89 +549,112 @@ class Command(BaseCommand):
             action='store_true',
             help='Reset the database before populating',
         )
+        parser.add_argument('--customers', type=int, default=4, help='Number of customers to create')
+        parser.add_argument('--vendors', type=int, default=4, help='Number of vendors to create')
+        parser.add_argument(
+            '--orders-per-customer',
+            type=int,
+            default=None,
+            help='Orders per customer (default: random 2-4)',
+        )
+        parser.add_argument('--seed', type=int, default=None, help='Seed for reproducible datasets')
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='Users generated and committed per transaction',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=2000,
+            help="Rows per executemany() call when writing a chunk's raw INSERTs",
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Processes generating rows; the main process stays the single writer',
+        )
 
     def handle(self, *args, **kwargs):
+        if kwargs['customers'] < 0 or kwargs['vendors'] < 1:
+            raise CommandError('Need at least one vendor and a non-negative number of customers')
+        if kwargs['chunk_size'] < 1 or kwargs['batch_size'] < 1 or kwargs['workers'] < 1:
+            raise CommandError('--chunk-size, --batch-size and --workers must be positive')
+
         self.stdout.write("Creating realistic e-commerce data...")
-        
+        self.seed = kwargs['seed'] if kwargs['seed'] is not None else random.randrange(2 ** 32)
+        self.chunk_size = kwargs['chunk_size']
+        self.batch_size = kwargs['batch_size']
+        self.workers = kwargs['workers']
+        self.stdout.write(f"Seed: {self.seed}, workers: {self.workers}")
+
         if kwargs['reset']:
             self.reset_database()
-        
+
         # Define placeholder image locations
         self.profile_images = self.get_image_files('profile_images')
         self.item_images = self.get_image_files('items')
         self.used_item_images = self.get_image_files('used-items')
-        
+
+        self.started = time.monotonic()
+        self.rows_written = 0
+        self.next_ids = {
+            model: (model.objects.aggregate(top=Max('id'))['top'] or 0) + 1
+            for model in ID_MODELS.values()
+        }
+        # Hash each password once per run rather than once per user
+        self.passwords = {
+            'customer': make_password('customer123'),
+            'vendor': make_password('vendor123'),
+        }
+
         try:
-            # Create users in separate transactions
-            admin = self.create_admin()
-            delivery_user = self.create_delivery_personnel()
-            customers = self.create_customers(4)
-            vendors = self.create_vendors(4)
-            
-            all_users = customers + vendors + [delivery_user] + [admin]
-            
-            # Create addresses and wallets in batches
-            self.create_addresses_for_users(all_users)
-            self.create_wallets_for_users(all_users)
-            
-            # Create items and used items
-            items = self.create_items_for_vendors(vendors)
-            used_items = self.create_used_items_for_customers(customers)
-            
-            # Create inventory for items
-            self.create_inventory_for_items(items)
-            
-            # Create orders, transactions, and related data
-            orders = self.create_orders_for_customers(customers, items)
-            self.create_transactions_for_orders(orders)
-            
-            # Create additional entities
-            discounts = self.create_discounts_for_vendors(vendors)
-            self.create_carts_for_customers(customers, items, discounts)
-            self.create_bids_for_customers(customers, used_items)
-            self.create_notifications_for_users(all_users)
-            self.create_ratings_for_items(customers, items)
-            
-            self.stdout.write(self.style.SUCCESS('Successfully populated database with realistic e-commerce data!'))
-            
+            self.create_admin()
+            self.create_delivery_personnel()
+            catalog, discount_ids = self.create_vendors(kwargs['vendors'])
+            self.create_customers(kwargs['customers'], kwargs['orders_per_customer'], catalog, discount_ids)
+            self.reset_sequences()
+            # Raw inserts skip the signals that invalidate cached item pages
+            bump_catalog_version()
+
+            elapsed = time.monotonic() - self.started
+            self.stdout.write(self.style.SUCCESS(
+                f'Successfully populated database with realistic e-commerce data! '
+                f'{self.rows_written:,} rows in {elapsed:.1f}s ({self.rows_written / max(elapsed, 1e-9):,.0f} rows/s)'
+            ))
+
         except Exception as e:
             self.stdout.write(self.style.ERROR(f'Unexpected error: {str(e)}'))
             raise
 
     def reset_database(self):
-        """Reset the database by deleting all records"""
+        """Reset the database with one DELETE per table, bypassing per-row signals"""
         self.stdout.write("Resetting database...")
-        
-        models = [
-            Rating, Notification, Bid, Cart, Discount, 
-            Transaction, OrderItem, Order, Inventory, 
-            UsedItem, Item, Wallet, Address, User
-        ]
-        
-        for model in models:
-            try:
-                count = model.objects.all().count()
-                model.objects.all().delete()
-                self.stdout.write(f"Deleted {count} {model.__name__} records")
-            except Exception as e:
-                self.stdout.write(self.style.ERROR(f"Error deleting {model.__name__}: {e}"))
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            for model in RESET_ORDER:
+                table = connection.ops.quote_name(model._meta.db_table)
+                cursor.execute(f'DELETE FROM {table}')
+                self.stdout.write(f"Deleted {cursor.rowcount} {model.__name__} records")
 
     def get_image_files(self, folder_name):
         """Get a list of image files from a folder"""
         media_dir = os.path.join(settings.MEDIA_ROOT, folder_name)
-        
+
         # Create directory if it doesn't exist
         if not os.path.exists(media_dir):
             os.makedirs(media_dir)
             self.stdout.write(f"Created directory: {media_dir}")
             return []
-        
+
         image_extensions = ['.jpg', '.jpeg', '.png', '.gif']
-        return [
-            os.path.join(folder_name, f) for f in os.listdir(media_dir) 
-            if os.path.isfile(os.path.join(media_dir, f)) and 
+        return sorted(
+            os.path.join(folder_name, f) for f in os.listdir(media_dir)
+            if os.path.isfile(os.path.join(media_dir, f)) and
             any(f.lower().endswith(ext) for ext in image_extensions)
-        ]
+        )
 
     def get_random_image(self, category):
         """Get a random image path based on category"""
@@ -235,10 +682,11 @@ class Command(BaseCommand):
                     verification_status='verified',
                     profile_image=self.get_random_image('profile')
                 )
-                return admin
         except IntegrityError:
             self.stdout.write(self.style.WARNING(f'Admin user already exists'))
-            return User.objects.get(username='admin')
+            admin = User.objects.get(username='admin')
+        self.next_ids[User] = max(self.next_ids[User], admin.id + 1)
+        return admin
 
     def create_delivery_personnel(self):
         try:
@@ -247,7 +695,7 @@ class Command(BaseCommand):
                 last_name = "Delivery"
                 username = "delivery_alex"
                 self.stdout.write(f"Creating delivery person: {username}")
-                
+
                 user = User.objects.create_user(
                     username=username,
                     email='delivery.alex@marketplace.com',
@@ -260,523 +708,131 @@ class Command(BaseCommand):
                     business_name="Alex's Swift Delivery",
                     profile_image=self.get_random_image('profile')
                 )
-                return user
         except IntegrityError:
             self.stdout.write(self.style.WARNING(f'Delivery user already exists'))
-            return User.objects.get(username='delivery_alex')
-
-    def create_customers(self, count):
-        customers = []
-        
-        # Use predefined names
-        customer_data = CUSTOMER_NAMES[:count]
-        
-        for i, (first_name, last_name) in enumerate(customer_data):
-            try:
-                with transaction.atomic():
-                    email = f"{first_name.lower()}.{last_name.lower()}@example.com"
-                    username = f"{first_name.lower()}{random.randint(100, 999)}"
-                    
-                    self.stdout.write(f"Creating customer {i+1}/{count}: {first_name} {last_name}")
-                    
-                    user = User.objects.create_user(
-                        username=username,
-                        email=email,
-                        phone=f"+1{random.randint(2000000000, 9999999999)}",
-                        first_name=first_name,
-                        last_name=last_name,
-                        user_type='customer',
-                        password='customer123',
-                        verification_status='verified',
-                        profile_image=self.get_random_image('profile')
-                    )
-                    customers.append(user)
-            except IntegrityError:
-                self.stdout.write(self.style.WARNING(f'Customer {username} already exists'))
-                continue
-        
-        return customers
+            user = User.objects.get(username='delivery_alex')
+        self.next_ids[User] = max(self.next_ids[User], user.id + 1)
+        return user
 
-    def create_vendors(self, count):
-        vendors = []
-        
-        # Use predefined vendor businesses
-        vendor_data = VENDOR_BUSINESSES[:count]
-        
-        for i, (business_name, primary_category) in enumerate(vendor_data):
-            try:
-                with transaction.atomic():
-                    clean_business = clean_email_domain(business_name)
-                    username = f"{clean_business}"
-                    
-                    self.stdout.write(f"Creating vendor {i+1}/{count}: {business_name}")
-                    
-                    user = User.objects.create_user(
-                        username=username,
-                        email=f"contact@{clean_business}.com",
-                        phone=f"+1{random.randint(2000000000, 9999999999)}",
-                        first_name="",  # Business vendors don't need first/last name
-                        last_name="",
-                        user_type='vendor',
-                        business_name=business_name,
-                        password='vendor123',
-                        verification_status='verified',
-                        vendor_type='business',
-                        business_license=f"BL{random.randint(100000, 999999)}",
-                        rating=Decimal(random.uniform(4.0, 5.0)).quantize(Decimal('0.1')),
-                        profile_image=self.get_random_image('profile')
-                    )
-                    # Store primary category for later use when creating items
-                    user.primary_category = primary_category
-                    vendors.append(user)
-            except IntegrityError:
-                self.stdout.write(self.style.WARNING(f'Vendor {username} already exists'))
-                continue
-        
-        return vendors
-
-    def create_wallets_for_users(self, users):
-        """Create a wallet for each user"""
-        self.stdout.write("Creating wallets for users...")
-        
-        for user in users:
-            try:
-                with transaction.atomic():
-                    # Create more realistic blockchain-like address
-                    wallet_address = f"0x{uuid.uuid4().hex[:40]}"
-                    
-                    # Balance depends on user type
-                    if user.user_type == 'customer':
-                        balance = Decimal(random.uniform(100, 2000)).quantize(Decimal('0.01'))
-                    elif user.user_type == 'vendor':
-                        balance = Decimal(random.uniform(5000, 50000)).quantize(Decimal('0.01'))
-                    else:
-                        balance = Decimal(random.uniform(1000, 5000)).quantize(Decimal('0.01'))
-                    
-                    Wallet.objects.create(
-                        address=wallet_address,
-                        balance=balance,
-                        user=user
-                    )
-            except Exception as e:
-                self.stdout.write(self.style.WARNING(f'Error creating wallet for {user.username}: {e}'))
-
-    def create_items_for_vendors(self, vendors):
-        """Create items for each vendor based on their primary category"""
-        all_items = []
-        self.stdout.write("Creating items for vendors...")
-        
-        for vendor in vendors:
-            try:
-                with transaction.atomic():
-                    # Get the vendor's primary category, fallback to a random one if not set
-                    primary_category = getattr(vendor, 'primary_category', random.choice(list(PRODUCTS.keys())))
-                    
-                    # Get products for this category
-                    category_products = PRODUCTS[primary_category]
-                    
-                    # Create 5-8 items for this vendor
-                    num_items = random.randint(5, 8)
-                    selected_products = random.sample(category_products, min(num_items, len(category_products)))
-                    
-                    for name, description, price, image_name in selected_products:
-                        item = Item.objects.create(
-                            name=name,
-                            description=description,
-                            price=Decimal(price),
-                            category=primary_category,
-                            vendor=vendor,
-                            image=self.get_random_image('item')
-                        )
-                        self.stdout.write(f"Created item: {item.name} for {vendor.business_name}")
-                        all_items.append(item)
-                    
-                    # Add 1-2 items from other random categories for variety
-                    other_categories = [k for k in PRODUCTS.keys() if k != primary_category]
-                    if other_categories:
-                        random_category = random.choice(other_categories)
-                        random_products = random.sample(PRODUCTS[random_category], min(2, len(PRODUCTS[random_category])))
-                        
-                        for name, description, price, image_name in random_products:
-                            item = Item.objects.create(
-                                name=name,
-                                description=description,
-                                price=Decimal(price),
-                                category=random_category,
-                                vendor=vendor,
-                                image=self.get_random_image('item')
-                            )
-                            self.stdout.write(f"Created item: {item.name} for {vendor.business_name}")
-                            all_items.append(item)
-            except Exception as e:
-                self.stdout.write(self.style.WARNING(f'Error creating items for {vendor.business_name}: {e}'))
-        
-        return all_items
-
-    def create_inventory_for_items(self, items):
-        """Create inventory records for all items"""
-        self.stdout.write("Creating inventory for items...")
-        
-        for item in items:
-            try:
-                with transaction.atomic():
-                    # Most items are in stock
-                    in_stock = random.random() < 0.9
-                    
-                    # Quantity between 5-100 for in-stock items
-                    quantity = random.randint(5, 100) if in_stock else 0
-                    
-                    # Random warehouse location
-                    location = random.choice([
-                        'East Coast Warehouse', 
-                        'West Coast Distribution Center',
-                        'Central Fulfillment Center',
-                        'Main Retail Store',
-                        'Supplier Direct'
-                    ])
-                    
-                    # Last restocked between 1-60 days ago
-                    restock_date = now() - timedelta(days=random.randint(1, 60))
-                    
-                    Inventory.objects.create(
-                        item=item,
-                        item_quantity=quantity,
-                        in_stock=in_stock,
-                        location=location,
-                        last_restocked=restock_date
-                    )
-            except Exception as e:
-                self.stdout.write(self.style.WARNING(f'Error creating inventory for {item.name}: {e}'))
-
-    def create_used_items_for_customers(self, customers):
-        """Create used items for each customer"""
-        all_used_items = []
-        self.stdout.write("Creating used items for customers...")
-        
-        for customer in customers:
-            try:
-                with transaction.atomic():
-                    # Each customer has 2-3 used items
-                    num_items = random.randint(2, 3)
-                    
-                    # Create used items across different categories
-                    categories = random.sample(list(PRODUCTS.keys()), min(num_items, len(PRODUCTS.keys())))
-                    
-                    for category in categories:
-                        # Select a random product from this category
-                        name, description, price, _ = random.choice(PRODUCTS[category])
-                        
-                        # Used items are 40-80% of original price
-                        used_price = Decimal(price * random.uniform(0.4, 0.8)).quantize(Decimal('0.01'))
-                        
-                        # Create used item
-                        used_item = UsedItem.objects.create(
-                            name=f"Used {name}",
-                            description=f"Pre-owned {description} in {random.choice(['excellent', 'good', 'fair'])} condition. {random.choice(['Light scratches', 'Like new', 'Minor wear', 'Well maintained'])}. {random.choice(['Original box included', 'All accessories included', 'Comes with case', 'Recently serviced'])}.",
-                            price=used_price,
-                            category=category,
-                            warranty_period=random.randint(0, 6),  # 0-6 months warranty
-                            user=customer,
-                            image=self.get_random_image('used_item')
-                        )
-                        
-                        self.stdout.write(f"Created used item: {used_item.name} by {customer.first_name}")
-                        all_used_items.append(used_item)
-            except Exception as e:
-                self.stdout.write(self.style.WARNING(f'Error creating used items for {customer.first_name}: {e}'))
-        
-        return all_used_items
-
-    def create_orders_for_customers(self, customers, items):
-        """Create orders for each customer"""
-        all_orders = []
-        self.stdout.write("Creating orders for customers...")
-        
-        for customer in customers:
-            try:
-                with transaction.atomic():
-                    # Each customer has 2-4 orders
-                    num_orders = random.randint(2, 4)
-                    
-                    for _ in range(num_orders):
-                        # Determine order status with weighted probabilities
-                        status = random.choices(
-                            ['pending', 'shipped', 'delivered', 'cancelled'],
-                            weights=[0.2, 0.3, 0.4, 0.1],
-                            k=1
-                        )[0]
-                        
-                        order_date = now() - timedelta(days=random.randint(1, 60))
-                        
-                        # Create the order
-                        order = Order.objects.create(
-                            user=customer,
-                            status=status,
-                            created_at=order_date,
-                            updated_at=order_date + timedelta(days=random.randint(1, 5)) if status != 'pending' else order_date
-                        )
-                        
-                        # Add 1-4 items to the order
-                        num_items = random.randint(1, 4)
-                        selected_items = random.sample(items, num_items)
-                        
-                        total_amount = Decimal('0.00')
-                        
-                        for item in selected_items:
-                            quantity = random.randint(1, 3)
-                            
-                            OrderItem.objects.create(
-                                order=order,
-                                item=item,
-                                quantity=quantity,
-                                price_at_purchase=item.price  # Changed from 'price' to 'price_at_purchase'
-                            )
-                            
-                            total_amount += item.price * quantity
-                        
-                        # Update order total
-                        order.total_amount = total_amount
-                        order.save()
-                        
-                        self.stdout.write(f"Created order #{order.id} for {customer.first_name} with {num_items} items")
-                        all_orders.append(order)
-            except Exception as e:
-                self.stdout.write(self.style.WARNING(f'Error creating orders for {customer.first_name}: {e}'))
-        
-        return all_orders
-
-    def create_addresses_for_users(self, users):
-        self.stdout.write("Creating addresses for users...")
-        
-        address_types = ["Home", "Work"]
-        
-        for user in users:
-            for address_type in address_types:
-                try:
-                    with transaction.atomic():
-                        state = random.choice([
-                            'CA', 'NY', 'TX', 'FL', 'IL', 'PA', 'OH', 'GA', 'NC', 'MI'
-                        ])
-                        
-                        city = random.choice([
-                            'Los Angeles', 'New York', 'Chicago', 'Houston', 'Phoenix',
-                            'Philadelphia', 'San Antonio', 'San Diego', 'Dallas', 'Austin'
-                        ])
-                        
-                        Address.objects.create(
-                            street_address=f"{random.randint(100, 9999)} {random.choice(['Main', 'Park', 'Oak', 'Pine', 'Maple'])} {random.choice(['St', 'Ave', 'Blvd', 'Rd', 'Ln'])}",
-                            city=city,
-                            state=state,
-                            postal_code=f"{random.randint(10000, 99999)}",
-                            country='USA',
-                            user=user
-                        )
-                except Exception as e:
-                    self.stdout.write(self.style.WARNING(f'Error creating address for {user.username}: {e}'))
-
-    def create_discounts_for_vendors(self, vendors):
-        """Create discounts for each vendor"""
-        all_discounts = []
-        self.stdout.write("Creating discounts for vendors...")
-        
-        for vendor in vendors:
-            try:
-                with transaction.atomic():
-                    # Each vendor has 2-4 discounts
-                    num_discounts = random.randint(2, 4)
-                    
-                    for i in range(num_discounts):
-                        # Create discount code
-                        code = f"{vendor.business_name[:3].upper()}{random.randint(100, 999)}"
-                        
-                        # Create discount
-                        discount = Discount.objects.create(
-                            code=code,
-                            name=f"{vendor.business_name} Discount {i+1}",
-                            percentage=Decimal(random.uniform(5, 30)).quantize(Decimal('0.1')),
-                            expires_at=now() + timedelta(days=random.randint(30, 90)),
-                            max_redemptions=random.randint(50, 200),
-                            vendor=vendor
-                        )
-                        
-                        self.stdout.write(f"Created discount: {code} for {vendor.business_name}")
-                        all_discounts.append(discount)
-            except Exception as e:
-                self.stdout.write(self.style.WARNING(f'Error creating discounts for {vendor.business_name}: {e}'))
-        
-        return all_discounts
-
-    def create_carts_for_customers(self, customers, items, discounts):
-        """Create cart items for each customer"""
-        self.stdout.write("Creating cart items for customers...")
-        
-        for customer in customers:
-            try:
-                with transaction.atomic():
-                    # Each customer has 1-3 items in cart
-                    num_items = random.randint(1, 3)
-                    selected_items = random.sample(items, num_items)
-                    
-                    for item in selected_items:
-                        # 30% chance of having a discount applied
-                        apply_discount = random.random() < 0.3
-                        discount = random.choice(discounts) if apply_discount and discounts else None
-                        
-                        Cart.objects.create(
-                            user=customer,
-                            item=item,
-                            item_quantity=random.randint(1, 3),
-                            discount=discount
-                        )
-                    
-                    self.stdout.write(f"Created cart with {num_items} items for {customer.first_name}")
-            except Exception as e:
-                self.stdout.write(self.style.WARNING(f'Error creating cart for {customer.first_name}: {e}'))
-
-    def create_bids_for_customers(self, customers, used_items):
-        """Create bids on used items (not their own)"""
-        self.stdout.write("Creating bids for customers...")
-        
-        for customer in customers:
-            try:
-                with transaction.atomic():
-                    # Each customer makes 1-3 bids on items not their own
-                    num_bids = random.randint(1, 3)
-                    
-                    # Get used items not belonging to this customer
-                    available_items = [ui for ui in used_items if ui.user != customer]
-                    
-                    if not available_items:
-                        continue
-                    
-                    selected_items = random.sample(available_items, min(num_bids, len(available_items)))
-                    
-                    for item in selected_items:
-                        # Convert item price to Decimal if it isn't already
-                        item_price = Decimal(str(item.price))
-                        
-                        # Bid between 70-120% of asking price
-                        bid_amount = (item_price * Decimal(random.uniform(0.7, 1.2))).quantize(Decimal('0.01'))
-                        
-                        Bid.objects.create(
-                            user=customer,
-                            used_item=item,
-                            amount=bid_amount,
-                            status='bidding'
-                        )
-                    
-                    self.stdout.write(f"Created {num_bids} bids for {customer.first_name}")
-            except Exception as e:
-                self.stdout.write(self.style.WARNING(f'Error creating bids for {customer.first_name}: {e}'))
-
-    def create_notifications_for_users(self, users):
-        """Create notifications for all users"""
-        self.stdout.write("Creating notifications for users...")
-        
-        notification_types = [
-            ('system', 'System maintenance scheduled for tomorrow at 2 AM'),
-            ('general', 'Welcome to our marketplace! Start shopping now'),
-            ('product', 'New items added to your favorite category'),
-            ('general', 'Your order has been shipped'),
-            ('product', 'Special discount on items you viewed'),
-            ('system', 'Your account has been verified')
+    def taken_emails(self, emails):
+        return set(User.objects.filter(email__in=emails).values_list('email', flat=True))
+
+    def chunks(self, count):
+        return [
+            (chunk_index, first_index, min(self.chunk_size, count - first_index))
+            for chunk_index, first_index in enumerate(range(0, count, self.chunk_size))
         ]
-        
-        for user in users:
-            try:
-                with transaction.atomic():
-                    # Each user gets 3-8 notifications
-                    num_notifications = random.randint(3, 8)
-                    
-                    for _ in range(num_notifications):
-                        # Select random notification type and text
-                        notification_type, text = random.choice(notification_types)
-                        
-                        # 70% chance of being read
-                        is_read = random.random() < 0.7
-                        
-                        Notification.objects.create(
-                            user=user,
-                            type=notification_type,
-                            text=text,
-                            read=is_read
-                        )
-                    
-                    self.stdout.write(f"Created {num_notifications} notifications for {user.username}")
-            except Exception as e:
-                self.stdout.write(self.style.WARNING(f'Error creating notifications for {user.username}: {e}'))
-
-    def create_ratings_for_items(self, customers, items):
-        """Create ratings for items"""
-        self.stdout.write("Creating ratings for items...")
-        
-        for item in items:
-            try:
-                with transaction.atomic():
-                    # Each item gets 3-10 ratings
-                    num_ratings = random.randint(3, 10)
-                    selected_customers = random.sample(customers, min(num_ratings, len(customers)))
-                    
-                    for customer in selected_customers:
-                        # Rating between 3-5 stars (weighted towards higher ratings)
-                        rating_value = random.choices(
-                            [3, 4, 5],
-                            weights=[0.2, 0.3, 0.5],
-                            k=1
-                        )[0]
-                        
-                        Rating.objects.create(
-                            user=customer,
-                            item=item,
-                            rating=rating_value,
-                            review=random.choice([
-                                "Great product, would buy again!",
-                                "Exactly as described",
-                                "Fast shipping, good quality",
-                                "Met my expectations",
-                                "Good value for the price",
-                                "Highly recommend",
-                                "Works perfectly",
-                                "Better than expected"
-                            ])
-                        )
-                    
-                    self.stdout.write(f"Created ratings for {item.name}")
-            except Exception as e:
-                self.stdout.write(self.style.WARNING(f'Error creating ratings for {item.name}: {e}'))
-                
-    def create_transactions_for_orders(self, orders):
-        """Create transactions for each order"""
-        self.stdout.write("Creating transactions for orders...")
-        
-        for order in orders:
-            try:
-                with transaction.atomic():
-                    # Skip cancelled orders
-                    if order.status == 'cancelled':
-                        continue
-                    
-                    # Get the customer's wallet
-                    wallet = order.user.user_wallet.first()
-                    if not wallet:
-                        self.stdout.write(self.style.WARNING(f'No wallet found for user {order.user.username}'))
-                        continue
-                    
-                    # Create transaction with unique hash
-                    transaction_hash = f"tx_{uuid.uuid4().hex[:20]}"
-                    transaction_obj = Transaction.objects.create(
-                        transaction_hash=transaction_hash,
-                        status='completed',
-                        order=order,
-                        user=order.user,
-                        created_at=order.created_at,
-                        updated_at=order.created_at
-                    )
-                    
-                    # Update wallet balance
-                    wallet.balance -= order.total_amount
-                    wallet.save()
-                    
-                    self.stdout.write(f"Created transaction {transaction_hash} for order #{order.id}")
-            except Exception as e:
-                self.stdout.write(self.style.WARNING(f'Error creating transaction for order #{order.id}: {e}'))
\ No newline at end of file
+
+    def generate(self, generator, tasks, initializer=django.setup, initargs=()):
+        """
+        Yield generator(*task) for every task, in task order.
+
+        With --workers > 1 the tasks run in a process pool started for the
+        phase, each worker set up by `initializer(*initargs)`. At most two
+        chunks per worker are in flight, which keeps memory flat when the
+        writer is the slower side.
+        """
+        if self.workers == 1:
+            for task in tasks:
+                yield generator(*task)
+            return
+
+        # Children only generate rows; they never open a database connection
+        pool = ProcessPoolExecutor(max_workers=self.workers, initializer=initializer, initargs=initargs)
+        try:
+            pending = deque()
+            for task in tasks:
+                pending.append(pool.submit(generator, *task))
+                if len(pending) >= 2 * self.workers:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            pool.shutdown(cancel_futures=True)
+
+    def create_vendors(self, count):
+        """Create vendors with their items, inventory and discounts; return what customers buy from"""
+        self.stdout.write(f"Creating {count} vendors with items, inventory and discounts...")
+        taken = self.taken_emails([f"contact@{clean_email_domain(name)}.com" for name, _ in VENDOR_BUSINESSES])
+        slots = {'user': 1, **VENDOR_ID_SLOTS}
+        first_ids = self.reserve_ids(count, slots)
+
+        chunks = self.chunks(count)
+        tasks = (
+            (
+                self.seed, chunk_index, first_index, size, self.chunk_ids(first_ids, slots, first_index),
+                self.passwords['vendor'], self.profile_images, self.item_images, taken,
+            )
+            for chunk_index, first_index, size in chunks
+        )
+        catalog, discount_ids = [], []
+        for (_, first_index, size), result in zip(chunks, self.generate(generate_vendor_chunk, tasks)):
+            self.write_chunk(result['inserts'])
+            catalog.extend(result['catalog'])
+            discount_ids.extend(result['discount_ids'])
+            self.report('vendors', first_index + size, count)
+        return catalog, discount_ids
+
+    def create_customers(self, count, orders_per_customer, catalog, discount_ids):
+        """Create customers with their orders, carts, bids, notifications and ratings"""
+        self.stdout.write(f"Creating {count} customers with orders and activity...")
+        taken = self.taken_emails([
+            f"{first.lower()}.{last.lower()}@example.com" for first, last in CUSTOMER_NAMES
+        ])
+        slots = {'user': 1, **customer_id_slots(orders_per_customer)}
+        first_ids = self.reserve_ids(count, slots)
+
+        chunks = self.chunks(count)
+        tasks = (
+            (
+                self.seed, chunk_index, first_index, size, self.chunk_ids(first_ids, slots, first_index),
+                self.passwords['customer'], orders_per_customer,
+                self.profile_images, self.used_item_images, taken,
+            )
+            for chunk_index, first_index, size in chunks
+        )
+        # Serial runs generate in this process; pool workers get the catalog from their initializer
+        share_catalog(catalog, discount_ids)
+        results = self.generate(generate_customer_chunk, tasks, init_customer_worker, (catalog, discount_ids))
+        for (_, first_index, size), result in zip(chunks, results):
+            self.write_chunk(result['inserts'])
+            self.report('customers', first_index + size, count)
+
+    def reserve_ids(self, count, slots):
+        """Reserve `count * slots[name]` ids of every sequence; return the first id of each block"""
+        first_ids = {}
+        for name, per_user in slots.items():
+            model = ID_MODELS[name]
+            first_ids[name] = self.next_ids[model]
+            self.next_ids[model] += count * per_user
+        return first_ids
+
+    @staticmethod
+    def chunk_ids(first_ids, slots, first_index):
+        return {name: first_ids[name] + first_index * slots[name] for name in slots}
+
+    def write_chunk(self, inserts):
+        with transaction.atomic(), connection.cursor() as cursor:
+            for sql, params in inserts:
+                for start in range(0, len(params), self.batch_size):
+                    cursor.executemany(sql, params[start:start + self.batch_size])
+                self.rows_written += len(params)
+
+    def reset_sequences(self):
+        """
+        Move each table's id sequence past the ids written above. The raw
+        INSERTs carry explicit ids, which advance SQLite's max(rowid) but
+        not a PostgreSQL or Oracle sequence.
+        """
+        models = list(dict.fromkeys(model for tables in (VENDOR_TABLES, CUSTOMER_TABLES) for _, model in tables))
+        statements = connection.ops.sequence_reset_sql(no_style(), models)
+        with transaction.atomic(), connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
+
+    def report(self, label, done, total):
+        elapsed = time.monotonic() - self.started
+        self.stdout.write(
+            f"  {label} {done:,}/{total:,} - {self.rows_written:,} rows, "
+            f"{self.rows_written / max(elapsed, 1e-9):,.0f} rows/s"
+        )
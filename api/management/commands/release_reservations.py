@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.reservations import release_expired
+
+
+class Command(BaseCommand):
+    help = "Return the stock of expired cart reservations, in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Reservations released per transaction')
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=None,
+            help='Keep running, sweeping every INTERVAL seconds (default: sweep once and exit)',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            total = 0
+            while True:
+                released = release_expired(batch_size=options['batch_size'])
+                total += released
+                if released < options['batch_size']:
+                    break
+            if total or options['verbosity'] > 1:
+                self.stdout.write(f"Released {total} expired reservations")
+            if options['interval'] is None:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,38 @@
+# api/media.py
+
+from django.conf import settings
+from django.http import HttpResponseNotModified
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags
+from django.views.static import serve
+
+from api.storage import content_etag
+
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+
+def serve_media(request, path):
+    """
+    Serve a file under MEDIA_ROOT; routed with DEBUG on only. In production
+    the front server sends the same headers, see STORAGES in settings.
+
+    Content-addressed files (api.storage.ContentAddressedStorage) get a
+    strong ETag taken from their name and a year of immutable caching, and
+    a revalidation is answered 304 without touching the disk. Other files
+    are revalidated against their modification time on every use.
+    """
+    etag = content_etag(path)
+    if etag is None:
+        response = serve(request, path, document_root=settings.MEDIA_ROOT)
+        patch_cache_control(response, no_cache=True)
+        return response
+
+    if_none_match = parse_etags(request.headers.get('If-None-Match', ''))
+    if etag in if_none_match or '*' in if_none_match:
+        response = HttpResponseNotModified()
+    else:
+        response = serve(request, path, document_root=settings.MEDIA_ROOT)
+    response['ETag'] = etag
+    patch_cache_control(response, public=True, max_age=IMMUTABLE_MAX_AGE, immutable=True)
+    return response
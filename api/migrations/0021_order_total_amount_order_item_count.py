@@ -0,0 +1,45 @@
+# Generated by Django 5.2 on 2026-10-17 17:44
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import DecimalField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_order_totals(apps, schema_editor):
+    Order = apps.get_model('api', 'Order')
+    OrderItem = apps.get_model('api', 'OrderItem')
+    lines = OrderItem.objects.filter(order=OuterRef('pk')).order_by().values('order')
+    amount = lines.annotate(
+        amount=Sum(F('price_at_purchase') * F('quantity'), output_field=DecimalField(max_digits=14, decimal_places=4))
+    ).values('amount')
+    quantity = lines.annotate(quantity=Sum('quantity')).values('quantity')
+    Order.objects.update(
+        total_amount=Coalesce(
+            Subquery(amount), Value(Decimal('0')),
+            output_field=DecimalField(max_digits=14, decimal_places=4),
+        ),
+        item_count=Coalesce(Subquery(quantity), Value(0)),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0020_item_image_useditem_image'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='item_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='total_amount',
+            field=models.DecimalField(db_index=True, decimal_places=4, default=0, max_digits=14),
+        ),
+        migrations.RunPython(backfill_order_totals, migrations.RunPython.noop),
+    ]
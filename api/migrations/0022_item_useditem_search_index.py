@@ -0,0 +1,24 @@
+# Full-text search indexes (SQLite FTS5) over the item catalogs
+
+from django.db import migrations
+
+from api.search import install_search_indexes, uninstall_search_indexes
+
+
+def create_search_indexes(apps, schema_editor):
+    install_search_indexes(schema_editor.connection)
+
+
+def drop_search_indexes(apps, schema_editor):
+    uninstall_search_indexes(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0021_order_total_amount_order_item_count'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
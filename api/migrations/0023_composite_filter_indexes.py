@@ -0,0 +1,45 @@
+# Generated by Django 5.2 on 2026-10-17 17:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0022_item_useditem_search_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cart',
+            index=models.Index(fields=['user', 'added_at'], name='cart_user_added_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='discount',
+            index=models.Index(fields=['vendor', 'expires_at'], name='discount_vendor_expires_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(fields=['vendor', 'category', 'price'], name='item_vendor_category_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(fields=['created_at'], name='item_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['user', 'read', 'type', 'notified_at'], name='notif_user_read_type_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', 'status', 'created_at'], name='order_user_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='rating',
+            index=models.Index(fields=['item', 'rating'], name='rating_item_rating_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='useditem',
+            index=models.Index(fields=['created_at'], name='useditem_created_idx'),
+        ),
+    ]
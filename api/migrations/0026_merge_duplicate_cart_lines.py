@@ -0,0 +1,43 @@
+# Generated by Django 5.2 on 2026-10-17 19:02
+
+from collections import Counter
+
+from django.db import migrations
+from django.db.models import Count, F
+
+
+def merge_duplicate_cart_lines(apps, schema_editor):
+    """Fold repeated (user, item) lines into the oldest one, adding up the quantities."""
+    Cart = apps.get_model('api', 'Cart')
+    Inventory = apps.get_model('api', 'Inventory')
+    StockReservation = apps.get_model('api', 'StockReservation')
+
+    duplicates = (
+        Cart.objects.values('user_id', 'item_id')
+        .annotate(lines=Count('id'))
+        .filter(lines__gt=1)
+        .values_list('user_id', 'item_id')
+    )
+    for user_id, item_id in duplicates:
+        keep, *extra = Cart.objects.filter(user_id=user_id, item_id=item_id).order_by('id')
+        extra_ids = [line.id for line in extra]
+        # Holds of the dropped lines go back to stock; checkout takes the rest unreserved
+        released = Counter()
+        for reservation in StockReservation.objects.filter(cart_id__in=extra_ids):
+            released[reservation.item_id] += reservation.quantity
+        for reserved_item_id, quantity in released.items():
+            Inventory.objects.filter(item_id=reserved_item_id).update(reserved_quantity=F('reserved_quantity') - quantity)
+        StockReservation.objects.filter(cart_id__in=extra_ids).delete()
+        Cart.objects.filter(pk=keep.pk).update(item_quantity=keep.item_quantity + sum(line.item_quantity for line in extra))
+        Cart.objects.filter(pk__in=extra_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0025_stock_reservations'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_cart_lines, migrations.RunPython.noop),
+    ]
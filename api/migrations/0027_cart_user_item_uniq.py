@@ -0,0 +1,17 @@
+# Generated by Django 5.2 on 2026-10-17 19:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0026_merge_duplicate_cart_lines'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='cart',
+            constraint=models.UniqueConstraint(fields=('user', 'item'), name='cart_user_item_uniq'),
+        ),
+    ]
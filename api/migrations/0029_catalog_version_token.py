@@ -0,0 +1,28 @@
+# Generated by Django 5.2 on 2026-10-17 19:09
+
+import uuid
+
+import api.models
+from django.db import migrations, models
+
+
+def create_catalog_version(apps, schema_editor):
+    """The single row api.caching reads on every cached list request, with a fresh token."""
+    CatalogVersion = apps.get_model('api', 'CatalogVersion')
+    CatalogVersion.objects.update_or_create(pk=1, defaults={'version': uuid.uuid4().hex})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0028_catalog_version'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='catalogversion',
+            name='version',
+            field=models.CharField(default=api.models.new_catalog_version, max_length=32),
+        ),
+        migrations.RunPython(create_catalog_version, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,10 @@
+import uuid
+from decimal import Decimal
+
 from django.contrib.auth.context_processors import auth
 from django.db import models
+from django.db.models import DecimalField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import AbstractUser
 
 
@@ -101,6 +106,13 @@ class Item(models.Model):
 
     def __str__(self):
         return f'{self.name} - ${self.price} by Vendor {self.vendor.business_name}'
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['vendor', 'category', 'price'], name='item_vendor_category_price_idx'),
+            # Keyset order of the public catalog; SQLite appends the rowid (id).
+            models.Index(fields=['created_at'], name='item_created_idx'),
+        ]
     
 
 class UsedItem(models.Model):
@@ -129,14 +141,32 @@ class UsedItem(models.Model):
             f'{self.name} - ${self.price} - Warranty: {self.warranty_period} months'
         )
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at'], name='useditem_created_idx'),
+        ]
+
 
 class Inventory(models.Model):
+    # Columns written by conditional UPDATEs in api/reservations.py and checkout, never from an in-memory copy.
+    DERIVED_FIELDS = ('reserved_quantity',)
+
     item_quantity = models.PositiveIntegerField()
     in_stock = models.BooleanField(default=True)
     location = models.CharField(max_length=50)
     item = models.OneToOneField(Item, on_delete=models.CASCADE, related_name='inventory')
     last_restocked = models.DateTimeField(null=True, blank=True)  # Add this field
-
+    # Units held by StockReservation rows; only api/reservations.py and checkout write it
+    reserved_quantity = models.PositiveIntegerField(default=0)
+
+    def save(self, *args, **kwargs):
+        # A vendor's PATCH would otherwise write back the holds it loaded, erasing any taken since
+        if not self._state.adding:
+            update_fields = kwargs.get('update_fields')
+            if update_fields is None:
+                update_fields = [field.name for field in self._meta.concrete_fields if not field.primary_key]
+            kwargs['update_fields'] = [name for name in update_fields if name not in self.DERIVED_FIELDS]
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f'{self.item.name} - {self.item_quantity} available items'
@@ -150,18 +180,55 @@ class Order(models.Model):
         ('delivered', 'Delivered'),
         ('cancelled', 'Cancelled'),
     ]
+    # Columns maintained by refresh_totals(), never written from an in-memory copy.
+    DERIVED_FIELDS = ('total_amount', 'item_count')
+
     status = models.CharField(choices=STATUS_CHOICES, max_length=10, default='pending')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='orders')
+    total_amount = models.DecimalField(max_digits=14, decimal_places=4, default=0, db_index=True)
+    item_count = models.PositiveIntegerField(default=0)  # total quantity across order items
 
     @property
     def total(self):
-        return sum(item.price_at_purchase * item.quantity for item in self.order_items.all())
+        return self.total_amount
+
+    @classmethod
+    def refresh_totals(cls, order_ids):
+        """Recompute the stored totals of the given orders in a single UPDATE."""
+        order_ids = {order_id for order_id in order_ids if order_id is not None}
+        if not order_ids:
+            return
+        lines = OrderItem.objects.filter(order=OuterRef('pk')).order_by().values('order')
+        amount = lines.annotate(
+            amount=Sum(F('price_at_purchase') * F('quantity'), output_field=DecimalField(max_digits=14, decimal_places=4))
+        ).values('amount')
+        quantity = lines.annotate(quantity=Sum('quantity')).values('quantity')
+        cls.objects.filter(pk__in=order_ids).update(
+            total_amount=Coalesce(
+                Subquery(amount), Value(Decimal('0')),
+                output_field=DecimalField(max_digits=14, decimal_places=4),
+            ),
+            item_count=Coalesce(Subquery(quantity), Value(0)),
+        )
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.DERIVED_FIELDS
+            ]
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f"Order #{self.id} - {self.status} by {self.user.email}"      
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'status', 'created_at'], name='order_user_status_created_idx'),
+        ]
+
 
 
 class OrderItem(models.Model):
@@ -169,6 +236,13 @@ class OrderItem(models.Model):
     item = models.ForeignKey(Item, on_delete=models.PROTECT, related_name='order_items')
     quantity = models.IntegerField()
     price_at_purchase = models.DecimalField(max_digits=10, decimal_places=4)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the order this line was loaded with, so moving it refreshes both totals.
+        instance._loaded_order_id = instance.__dict__.get('order_id')
+        return instance
     
     def __str__(self):
         return f"{self.quantity} x {self.item.name} in Order {self.order.id}"
@@ -211,6 +285,11 @@ class Discount(models.Model):
     def __str__(self):
         return f'{self.percentage}% off by {self.vendor.business_name}'
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['vendor', 'expires_at'], name='discount_vendor_expires_idx'),
+        ]
+
 
 
 class Cart(models.Model):
@@ -223,6 +302,27 @@ class Cart(models.Model):
     def __str__(self):
         return f'Cart of {self.user.first_name} - {self.item_quantity} x {self.item.name}'
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'added_at'], name='cart_user_added_idx'),
+        ]
+        constraints = [
+            # One line per item, so bulk cart writes can upsert on it
+            models.UniqueConstraint(fields=['user', 'item'], name='cart_user_item_uniq'),
+        ]
+
+
+
+class StockReservation(models.Model):
+    """Stock held for a cart line until it is checked out or expires (see api/reservations.py)"""
+    cart = models.OneToOneField(Cart, on_delete=models.CASCADE, related_name='reservation')
+    item = models.ForeignKey(Item, on_delete=models.CASCADE, related_name='reservations')
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f'{self.quantity} x item {self.item_id} for cart {self.cart_id} until {self.expires_at}'
+
 
 
 
@@ -263,6 +363,11 @@ class Notification(models.Model):
     def __str__(self):
         return f'{self.type} notification for {self.user.first_name}: {self.text[:30]}...'
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'read', 'type', 'notified_at'], name='notif_user_read_type_at_idx'),
+        ]
+
 
 class Rating(models.Model):
     rating = models.IntegerField()
@@ -278,4 +383,41 @@ class Rating(models.Model):
             f'Review Text: {self.review}'
         )
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['item', 'rating'], name='rating_item_rating_idx'),
+        ]
+
+
+
+
+def new_catalog_version():
+    return uuid.uuid4().hex
+
 
+class CatalogVersion(models.Model):
+    """Token in the keys of the cached catalog pages (see api/caching.py); a single row"""
+    version = models.CharField(max_length=32, default=new_catalog_version)
+
+    def __str__(self):
+        return f'catalog {self.version}'
+
+
+class ResourceVersion(models.Model):
+    """Per-user change counter behind the ETags of polled endpoints (see api/etags.py)"""
+    SCOPE_CHOICES = [
+        ('user', 'User Detail'),
+        ('cart', 'Cart'),
+        ('notification', 'Notifications'),
+    ]
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='resource_versions')
+    scope = models.CharField(choices=SCOPE_CHOICES, max_length=15)
+    version = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.scope} v{self.version} for user {self.user_id}'
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'scope'], name='resource_version_user_scope_uniq'),
+        ]
@@ -0,0 +1,72 @@
+# api/notifications.py
+
+from functools import partial
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+
+from api.etags import bump_resource_versions
+from api.models import Item, Notification, User
+from api.pubsub import get_hub
+from api.serializers import NotificationSerializer
+
+
+FAN_OUT_BATCH_SIZE = 1000
+
+
+def notification_topic(user_id):
+    return f'notifications:{user_id}'
+
+
+def publish(notifications):
+    """Wake the long polls waiting on these notifications' users, handing them the notifications."""
+    hub = get_hub()
+    for data in NotificationSerializer(notifications, many=True).data:
+        hub.publish(notification_topic(data['user']), (data['id'], data))
+
+
+def audience(user_type=None, category=None):
+    """Active users to notify: all of one `user_type`, and/or the vendors selling in `category`."""
+    users = User.objects.filter(is_active=True)
+    if user_type:
+        users = users.filter(user_type=user_type)
+    if category:
+        users = users.filter(Exists(Item.objects.filter(vendor=OuterRef('pk'), category=category)))
+    return users
+
+
+def fan_out(users, text, type='system', batch_size=FAN_OUT_BATCH_SIZE):
+    """
+    Deliver one notification to every user in `users` and return how many
+    were sent.
+
+    Recipients are read by primary key in keyset-paginated batches, and each
+    batch is one multi-row INSERT plus one ETag UPDATE in its own transaction,
+    so a large audience neither holds one long transaction nor loads every
+    id at once. Long polls waiting on the recipients wake as each batch
+    commits.
+    """
+    ids = users.order_by('pk').values_list('pk', flat=True)
+    sent, last_id = 0, None
+    while True:
+        batch = list((ids if last_id is None else ids.filter(pk__gt=last_id))[:batch_size])
+        if not batch:
+            return sent
+        with transaction.atomic():
+            notifications = Notification.objects.bulk_create(
+                [Notification(user_id=user_id, type=type, text=text, read=False) for user_id in batch],
+                batch_size=batch_size,
+            )
+            # bulk_create skips the post_save signals that would bump and publish these one at a time
+            bump_resource_versions(batch, 'notification')
+            transaction.on_commit(partial(publish, notifications))
+        sent += len(batch)
+        last_id = batch[-1]
+
+
+def mark_read(notifications, user_id):
+    """Mark a user's unread notifications in `notifications` as read with one UPDATE."""
+    updated = notifications.filter(user_id=user_id, read=False).update(read=True)
+    if updated:
+        bump_resource_versions([user_id], 'notification')
+    return updated
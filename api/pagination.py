@@ -0,0 +1,262 @@
+# api/pagination.py
+
+import base64
+import binascii
+import datetime
+import decimal
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError as DjangoValidationError
+from django.db.models import Q
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetCursorPagination(BasePagination):
+    """
+    Keyset ("seek") pagination over a composite ordering, (created_at, id) by default.
+
+    The cursor is an opaque token holding the ordering values of the row at the
+    edge of the current page. The next page is fetched with a
+    `WHERE (created_at, id) < (..)` range condition instead of an OFFSET, so a
+    deep page costs the same as the first one.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    page_size = 50
+    max_page_size = 200
+    # The last field must be unique so that every row has a distinct position;
+    # the same holds for any explicit order_by on the incoming queryset.
+    ordering = ('-created_at', '-id')
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+
+        ordering = self._page_ordering = tuple(self.get_ordering(queryset))
+        position, reverse = self.decode_cursor(request, queryset, ordering)
+        if reverse:
+            ordering = tuple(self._flip(field) for field in ordering)
+
+        if position is not None:
+            queryset = queryset.filter(self._seek_condition(ordering, position))
+
+        results = list(queryset.order_by(*ordering)[:self.page_size + 1])
+        has_following = len(results) > self.page_size
+        self.page = results[:self.page_size]
+
+        if reverse:
+            self.page.reverse()
+            self.has_next = True
+            self.has_previous = has_following
+        else:
+            self.has_next = has_following
+            self.has_previous = position is not None
+        return self.page
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def get_ordering(self, queryset):
+        # An explicit order_by (e.g. search relevance) takes precedence over the default keyset.
+        if queryset.query.order_by:
+            return queryset.query.order_by
+        return self.ordering
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self._position(self.page[-1]), reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self._position(self.page[0]), reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def encode_cursor(self, position, reverse):
+        payload = {'v': position}
+        if reverse:
+            payload['r'] = 1
+        raw = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+        token = base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+        url = remove_query_param(self.base_url, self.cursor_query_param)
+        return replace_query_param(url, self.cursor_query_param, token)
+
+    def decode_cursor(self, request, queryset, ordering):
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None, False
+
+        try:
+            raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+            payload = json.loads(raw)
+            values = payload['v']
+            reverse = bool(payload.get('r'))
+        except (TypeError, ValueError, KeyError, binascii.Error):
+            raise self.invalid_cursor()
+
+        if not isinstance(values, list) or len(values) != len(ordering):
+            raise self.invalid_cursor()
+
+        try:
+            position = [
+                self._to_python(queryset, field, value)
+                for field, value in zip(ordering, values)
+            ]
+        except (DjangoValidationError, TypeError, ValueError):
+            raise self.invalid_cursor()
+        return position, reverse
+
+    def invalid_cursor(self):
+        # A client error, not a missing page: answered 400 with the param it concerns
+        return ValidationError({self.cursor_query_param: [self.invalid_cursor_message]})
+
+    def _position(self, instance):
+        position = []
+        for field in self._page_ordering:
+            value = instance
+            for attr in field.lstrip('-').split('__'):
+                value = value[attr] if isinstance(value, dict) else getattr(value, attr)
+            if isinstance(value, (datetime.datetime, datetime.date)):
+                value = value.isoformat()
+            elif isinstance(value, decimal.Decimal):
+                value = str(value)
+            position.append(value)
+        return position
+
+    def _to_python(self, queryset, field, value):
+        name = field.lstrip('-')
+        model = queryset.model
+        try:
+            for part in name.split('__')[:-1]:
+                model = model._meta.get_field(part).related_model
+            model_field = model._meta.get_field(name.split('__')[-1])
+        except (FieldDoesNotExist, AttributeError):
+            # Annotations have no model field to coerce through.
+            return value
+        return model_field.to_python(value)
+
+    def _seek_condition(self, ordering, position):
+        # (a, b, c) > (x, y, z)  <=>  a > x OR (a = x AND b > y) OR (a = x AND b = y AND c > z)
+        condition = Q()
+        for index, field in enumerate(ordering):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            clause = Q(**{f'{name}__{lookup}': position[index]})
+            for previous, value in zip(ordering[:index], position[:index]):
+                clause &= Q(**{previous.lstrip('-'): value})
+            condition |= clause
+        return condition
+
+    @staticmethod
+    def _flip(field):
+        return field[1:] if field.startswith('-') else f'-{field}'
+
+
+class ItemPagination(KeysetCursorPagination):
+    page_size = 50
+    max_page_size = 200
+
+
+class UsedItemPagination(KeysetCursorPagination):
+    page_size = 50
+    max_page_size = 200
+
+
+class OrderPagination(KeysetCursorPagination):
+    page_size = 20
+    max_page_size = 100
+
+
+class OrderItemPagination(KeysetCursorPagination):
+    # Order items carry no timestamp of their own; ids follow insertion order.
+    page_size = 50
+    max_page_size = 200
+    ordering = ('-id',)
+
+
+class NotificationPagination(KeysetCursorPagination):
+    page_size = 30
+    max_page_size = 100
+    ordering = ('-notified_at', '-id')
+
+
+class CartPagination(KeysetCursorPagination):
+    page_size = 50
+    max_page_size = 100
+    ordering = ('-added_at', '-id')
+
+
+class RatingPagination(KeysetCursorPagination):
+    page_size = 30
+    max_page_size = 100
+    ordering = ('-reviewed_at', '-id')
+
+
+class DiscountPagination(KeysetCursorPagination):
+    page_size = 30
+    max_page_size = 100
+    ordering = ('-added_at', '-id')
+
+
+class TransactionPagination(KeysetCursorPagination):
+    page_size = 30
+    max_page_size = 100
+
+
+class BidPagination(KeysetCursorPagination):
+    page_size = 30
+    max_page_size = 100
+
+
+class WalletPagination(KeysetCursorPagination):
+    page_size = 30
+    max_page_size = 100
+    ordering = ('-connected_at', '-id')
+
+
+class InventoryPagination(KeysetCursorPagination):
+    page_size = 50
+    max_page_size = 200
+    ordering = ('-id',)
+
+
+class AddressPagination(KeysetCursorPagination):
+    page_size = 30
+    max_page_size = 100
+    ordering = ('-id',)
+
+
+class UserPagination(KeysetCursorPagination):
+    page_size = 30
+    max_page_size = 100
+    ordering = ('-date_joined', '-id')
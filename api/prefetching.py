@@ -0,0 +1,116 @@
+# api/prefetching.py
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.relations import ManyRelatedField, RelatedField
+from rest_framework.serializers import BaseSerializer, ListSerializer
+
+
+def prefetch_plan(serializer, prefix='', back_relation=None):
+    """
+    Walk a serializer tree and work out which relations it will touch.
+
+    Forward foreign keys and one-to-one relations (in either direction) that
+    are rendered by a nested serializer become `select_related` joins; reverse
+    foreign keys and many-to-many relations become `Prefetch` objects whose
+    querysets carry the nested serializer's own plan.
+
+    Relations reached only from `SerializerMethodField`s cannot be discovered
+    by introspection, so serializers may declare them in
+    `select_related_hints` / `prefetch_related_hints`, either as a tuple or
+    as a dict keyed by the field that needs them, so that hints for a field
+    pruned by `?fields=` are dropped with it.
+
+    Returns `(select_related, prefetch_related, parent_select)`. `parent_select`
+    holds hints that walk back through `back_relation` to the parent object;
+    prefetching already attaches the parent instance to every child, so those
+    joins belong on the parent queryset instead.
+    """
+    model = serializer.Meta.model
+    select, prefetch, parent_select = [], [], []
+
+    for hint in _hints(serializer, 'select_related_hints'):
+        head, _, rest = hint.partition('__')
+        if back_relation and head == back_relation:
+            if rest:
+                parent_select.append(rest)
+            continue
+        select.append(prefix + hint)
+    for hint in _hints(serializer, 'prefetch_related_hints'):
+        prefetch.append(prefix + hint)
+
+    for field in serializer._readable_fields:
+        if isinstance(field, ListSerializer):
+            child = field.child
+        elif isinstance(field, ManyRelatedField):
+            child = None
+        elif isinstance(field, BaseSerializer):
+            child = field
+        elif isinstance(field, RelatedField):
+            # A bare key: only a reverse one-to-one needs a join to read it
+            child = None
+        else:
+            continue
+
+        if field.source == '*' or '.' in field.source:
+            continue
+        try:
+            model_field = model._meta.get_field(field.source)
+        except FieldDoesNotExist:
+            continue
+        if not model_field.is_relation:
+            continue
+
+        if child is None and not (model_field.one_to_many or model_field.many_to_many):
+            if model_field.one_to_one and not model_field.concrete:
+                select.append(prefix + field.source)
+            continue
+
+        if model_field.one_to_many or model_field.many_to_many:
+            queryset = model_field.related_model._default_manager.all()
+            if child is not None:
+                remote = model_field.field.name if model_field.auto_created else None
+                child_select, child_prefetch, child_parent = prefetch_plan(child, back_relation=remote)
+                if child_select:
+                    queryset = queryset.select_related(*child_select)
+                if child_prefetch:
+                    queryset = queryset.prefetch_related(*child_prefetch)
+                select.extend(prefix + hint for hint in child_parent)
+            prefetch.append(Prefetch(prefix + field.source, queryset=queryset))
+        else:
+            select.append(prefix + field.source)
+            child_select, child_prefetch, _ = prefetch_plan(child, prefix=f'{prefix}{field.source}__')
+            select.extend(child_select)
+            prefetch.extend(child_prefetch)
+
+    return list(dict.fromkeys(select)), prefetch, parent_select
+
+
+def _hints(serializer, attr):
+    hints = getattr(serializer, attr, ())
+    if isinstance(hints, dict):
+        return [hint for name, names in hints.items() if name in serializer.fields for hint in names]
+    return hints
+
+
+def apply_prefetch_plan(queryset, serializer):
+    select, prefetch, _ = prefetch_plan(serializer)
+    if select:
+        queryset = queryset.select_related(*select)
+    if prefetch:
+        queryset = queryset.prefetch_related(*prefetch)
+    return queryset
+
+
+class EagerLoadingMixin:
+    """
+    Applies the serializer's prefetch plan to read requests, so list endpoints
+    run a fixed number of queries however many rows they return.
+    """
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.request.method in SAFE_METHODS:
+            queryset = apply_prefetch_plan(queryset, self.get_serializer())
+        return queryset
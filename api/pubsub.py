@@ -0,0 +1,99 @@
+# api/pubsub.py
+
+import asyncio
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+DEFAULT_PUBSUB = {'BACKEND': 'api.pubsub.InProcessHub', 'OPTIONS': {}}
+
+
+class Subscription:
+    """One async consumer's queue of the messages published to `topic`."""
+
+    def __init__(self, hub, topic, queue_size):
+        self.hub = hub
+        self.topic = topic
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(queue_size)
+
+    def deliver(self, message):
+        # Runs on self.loop. A consumer that fell this far behind loses its oldest messages
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(message)
+
+    async def get(self, timeout=None):
+        """The next message; raises asyncio.TimeoutError after `timeout` seconds without one."""
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+    def drain(self):
+        """The messages already queued, without waiting."""
+        messages = []
+        while not self.queue.empty():
+            messages.append(self.queue.get_nowait())
+        return messages
+
+    def close(self):
+        self.hub.unsubscribe(self)
+
+
+class InProcessHub:
+    """
+    Topic pub/sub from any thread to asyncio consumers of the same process.
+
+    Waiting subscribers are queues on the event loop, not threads. Messages
+    only reach subscribers in the publishing process, so deployments with
+    several ASGI workers set PUBSUB['BACKEND'] to a hub shared between them,
+    with the same `subscribe`/`unsubscribe`/`publish` methods.
+    """
+
+    def __init__(self, queue_size=100):
+        self.queue_size = queue_size
+        self._lock = threading.Lock()
+        self._subscriptions = defaultdict(set)
+
+    def subscribe(self, topic):
+        """Subscribe the running event loop to `topic`; close the subscription when done."""
+        subscription = Subscription(self, topic, self.queue_size)
+        with self._lock:
+            self._subscriptions[topic].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.topic)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.topic]
+
+    def publish(self, topic, message):
+        """Hand `message` to every subscriber of `topic` and return how many there were."""
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(topic, ()))
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.deliver, message)
+            except RuntimeError:
+                # Its event loop has closed
+                self.unsubscribe(subscription)
+        return len(subscriptions)
+
+
+_hub = None
+_hub_lock = threading.Lock()
+
+
+def get_hub():
+    """The process-wide hub configured by the PUBSUB setting."""
+    global _hub
+    if _hub is None:
+        with _hub_lock:
+            if _hub is None:
+                config = getattr(settings, 'PUBSUB', DEFAULT_PUBSUB)
+                _hub = import_string(config['BACKEND'])(**config.get('OPTIONS', {}))
+    return _hub
@@ -0,0 +1,154 @@
+# api/renditions.py
+
+import hashlib
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from PIL import Image, ImageOps
+from rest_framework import fields
+
+
+logger = logging.getLogger('api.renditions')
+
+# Image fields that get renditions, by model label
+IMAGE_FIELDS = {'api.Item': 'image', 'api.UsedItem': 'image', 'api.User': 'profile_image'}
+
+# Rendition name -> longest side in pixels; images are only ever scaled down
+DEFAULT_RENDITIONS = {'thumb': 128, 'card': 480}
+# Output key -> (file extension, Pillow format, save options)
+RENDITION_FORMATS = {
+    'webp': ('webp', 'WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('jpg', 'JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+
+def get_renditions():
+    return getattr(settings, 'IMAGE_RENDITIONS', DEFAULT_RENDITIONS)
+
+
+def rendition_name(name, rendition, size, key):
+    """
+    `items/phone.png` -> `items/phone.thumb.fd78665a.webp`, next to the original.
+
+    The middle token hashes the size and encoder settings. Rendition URLs are
+    cached as immutable, so a change to either must write a new name rather
+    than new bytes under an old one.
+    """
+    extension, image_format, options = RENDITION_FORMATS[key]
+    spec = f'{size}:{image_format}:{sorted(options.items())}'
+    token = hashlib.sha256(spec.encode()).hexdigest()[:8]
+    return f'{os.path.splitext(name)[0]}.{rendition}.{token}.{extension}'
+
+
+def rendition_urls(storage, name, request=None):
+    """{rendition: {format: url}} for the image stored as `name`, or None without an image."""
+    if not name:
+        return None
+    urls = {}
+    for rendition, size in get_renditions().items():
+        urls[rendition] = {}
+        for key in RENDITION_FORMATS:
+            url = storage.url(rendition_name(name, rendition, size, key))
+            urls[rendition][key] = request.build_absolute_uri(url) if request is not None else url
+    return urls
+
+
+def render(source, targets):
+    """
+    Write each `(path, size, format key)` rendition of the image at `source`.
+
+    Runs in the pool's worker processes. Files are written under a temporary
+    name and renamed into place, so a URL never serves half an image.
+    """
+    with Image.open(source) as original:
+        image = ImageOps.exif_transpose(original)
+        scaled = {}
+        for path, size, key in targets:
+            if size not in scaled:
+                scaled[size] = image.copy()
+                scaled[size].thumbnail((size, size), Image.Resampling.LANCZOS)
+            _, image_format, options = RENDITION_FORMATS[key]
+            output = scaled[size]
+            if image_format == 'JPEG' and output.mode != 'RGB':
+                # No alpha in JPEG: flatten onto white rather than black
+                background = Image.new('RGB', output.size, 'white')
+                background.paste(output, mask=output.convert('RGBA').getchannel('A'))
+                output = background
+            temporary = f'{path}.{os.getpid()}.tmp'
+            output.save(temporary, image_format, **options)
+            os.replace(temporary, path)
+    return len(targets)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+# Sources queued or rendering, so rows sharing one file queue it once
+_pending = set()
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                # Spawned rather than forked: the server process has threads and open connections
+                _pool = ProcessPoolExecutor(
+                    max_workers=getattr(settings, 'IMAGE_RENDITION_WORKERS', 2),
+                    mp_context=multiprocessing.get_context('spawn'),
+                )
+    return _pool
+
+
+def _finished(source, future):
+    with _pool_lock:
+        _pending.discard(source)
+    if future.exception() is not None:
+        logger.error('Renditions of %s failed', source, exc_info=future.exception())
+
+
+def schedule(storage, name):
+    """
+    Queue the missing renditions of the image stored as `name` in the
+    process pool and return the Future, or None when there is nothing to do.
+    """
+    if not name:
+        return None
+    targets = [
+        (storage.path(rendition_name(name, rendition, size, key)), size, key)
+        for rendition, size in get_renditions().items()
+        for key in RENDITION_FORMATS
+    ]
+    targets = [target for target in targets if not os.path.exists(target[0])]
+    source = storage.path(name)
+    with _pool_lock:
+        if not targets or source in _pending:
+            return None
+        _pending.add(source)
+    future = get_pool().submit(render, source, targets)
+    future.add_done_callback(lambda future: _finished(source, future))
+    return future
+
+
+class RenditionsField(fields.Field):
+    """
+    Read-only URLs of an image field's renditions, e.g.
+    `image_renditions = RenditionsField(source='image')`.
+
+    The URLs follow from the original's name, so they are listed before the
+    pool has written the files; until then clients fall back to the original.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def get_attribute(self, instance):
+        # The FieldFile itself; an empty one still has to render as None
+        return super().get_attribute(instance) or None
+
+    def to_representation(self, image):
+        return rendition_urls(image.storage, image.name, self.context.get('request'))
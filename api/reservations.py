@@ -0,0 +1,190 @@
+# api/reservations.py
+
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.db.models.lookups import GreaterThanOrEqual
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from api.models import Cart, Inventory, StockReservation
+
+
+class InsufficientStock(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'Not enough stock.'
+    default_code = 'insufficient_stock'
+
+
+AVAILABLE = F('item_quantity') - F('reserved_quantity')
+
+_bulk_deletes = ContextVar('bulk_cart_deletes', default=False)
+
+
+@contextmanager
+def bulk_cart_deletes():
+    """
+    Delete cart lines and reservations without their per-row receivers.
+
+    Inside the block the post_delete handlers neither release each
+    reservation nor bump the owner's cart ETag one row at a time; the caller
+    releases the stock in one UPDATE and bumps the ETags once.
+    """
+    token = _bulk_deletes.set(True)
+    try:
+        yield
+    finally:
+        _bulk_deletes.reset(token)
+
+
+def in_bulk_cart_delete():
+    return _bulk_deletes.get()
+
+
+def reservation_ttl():
+    return getattr(settings, 'STOCK_RESERVATION_TTL', timedelta(minutes=15))
+
+
+def quantity_case(quantities):
+    """`CASE WHEN item_id = ... THEN quantity END` for a per-item UPDATE in one statement."""
+    return Case(
+        *[When(item_id=item_id, then=Value(quantity)) for item_id, quantity in quantities.items()],
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+
+
+def update_all_or_none(queryset, expected, **updates):
+    """
+    `queryset.update(**updates)`, undone unless it changed `expected` rows.
+
+    Runs in a savepoint so that, on failure, callers can read the rows as
+    they were to say which ones fell short.
+    """
+    with transaction.atomic():
+        if queryset.update(**updates) == expected:
+            return True
+        transaction.set_rollback(True)
+    return False
+
+
+def release(quantities):
+    """Give `{item_id: quantity}` back to the items' available stock."""
+    if quantities:
+        Inventory.objects.filter(item_id__in=quantities).update(
+            reserved_quantity=F('reserved_quantity') - quantity_case(quantities),
+        )
+
+
+@transaction.atomic
+def reserve(cart):
+    """
+    Hold stock for a cart line, or resize its hold, and restart the TTL.
+
+    The hold is taken by one conditional UPDATE on the item's inventory row
+    that only matches while enough unreserved stock is left, so buyers of a
+    hot item contend for that row alone and never oversell it.
+    """
+    held = StockReservation.objects.select_for_update().filter(cart=cart).first()
+    if held is not None and held.item_id != cart.item_id:
+        release({held.item_id: held.quantity})
+        held.quantity = 0
+    delta = cart.item_quantity - (held.quantity if held is not None else 0)
+
+    if delta > 0:
+        reserved = Inventory.objects.filter(GreaterThanOrEqual(AVAILABLE, delta), item_id=cart.item_id).update(
+            reserved_quantity=F('reserved_quantity') + delta,
+        )
+        if not reserved:
+            raise InsufficientStock({'detail': 'Not enough stock.', 'item': cart.item_id})
+    elif delta < 0:
+        release({cart.item_id: -delta})
+
+    StockReservation.objects.update_or_create(
+        cart=cart,
+        defaults={'item_id': cart.item_id, 'quantity': cart.item_quantity, 'expires_at': timezone.now() + reservation_ttl()},
+    )
+
+
+@transaction.atomic
+def reserve_many(carts):
+    """
+    `reserve()` for many cart lines at once: one UPDATE takes what the lines
+    grew by, one gives back what they shrank by, and one upsert writes the
+    reservation rows, however many lines there are.
+    """
+    held = StockReservation.objects.select_for_update().filter(cart__in=carts).values_list('item_id', 'quantity')
+    deltas = Counter()
+    for item_id, quantity in held:
+        deltas[item_id] -= quantity
+    for cart in carts:
+        deltas[cart.item_id] += cart.item_quantity
+
+    taken = {item_id: delta for item_id, delta in deltas.items() if delta > 0}
+    if taken:
+        needed = quantity_case(taken)
+        reserved = update_all_or_none(
+            Inventory.objects.filter(GreaterThanOrEqual(AVAILABLE, needed), item_id__in=taken),
+            len(taken),
+            reserved_quantity=F('reserved_quantity') + needed,
+        )
+        if not reserved:
+            available = dict(Inventory.objects.filter(item_id__in=taken).values_list('item_id', AVAILABLE))
+            short = sorted(item_id for item_id, delta in taken.items() if available.get(item_id, 0) < delta)
+            raise InsufficientStock({'detail': 'Not enough stock.', 'items': short})
+    release({item_id: -delta for item_id, delta in deltas.items() if delta < 0})
+
+    expires_at = timezone.now() + reservation_ttl()
+    StockReservation.objects.bulk_create(
+        [
+            StockReservation(cart=cart, item_id=cart.item_id, quantity=cart.item_quantity, expires_at=expires_at)
+            for cart in carts
+        ],
+        update_conflicts=True,
+        unique_fields=['cart'],
+        update_fields=['item', 'quantity', 'expires_at'],
+    )
+
+
+def delete_lines(cart_ids):
+    """Delete cart lines and release their reservations with a fixed number of queries."""
+    reservations = StockReservation.objects.filter(cart_id__in=cart_ids)
+    released = Counter()
+    for item_id, quantity in reservations.values_list('item_id', 'quantity'):
+        released[item_id] += quantity
+    with bulk_cart_deletes():
+        # Cascades to the reservations
+        Cart.objects.filter(pk__in=cart_ids).delete()
+    release(released)
+
+
+@transaction.atomic
+def release_expired(now=None, batch_size=1000):
+    """
+    Delete up to `batch_size` expired reservations and return their stock,
+    with one DELETE and one UPDATE per batch. Returns the number released.
+
+    Rows a concurrent checkout has locked are skipped where the database
+    supports SKIP LOCKED; that checkout consumes them instead.
+    """
+    expired = list(
+        StockReservation.objects.select_for_update(skip_locked=True)
+        .filter(expires_at__lte=now or timezone.now())
+        .order_by('expires_at')
+        .values_list('pk', 'item_id', 'quantity')[:batch_size]
+    )
+    if not expired:
+        return 0
+    quantities = Counter()
+    for _, item_id, quantity in expired:
+        quantities[item_id] += quantity
+    with bulk_cart_deletes():
+        StockReservation.objects.filter(pk__in=[pk for pk, _, _ in expired]).delete()
+    release(quantities)
+    return len(expired)
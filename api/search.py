@@ -0,0 +1,137 @@
+# api/search.py
+
+import re
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+
+# table -> (indexed columns, bm25 column weights)
+SEARCH_INDEXES = {
+    'api_item': (('name', 'description', 'category'), (10.0, 1.0, 2.0)),
+    'api_useditem': (('name', 'description', 'category'), (10.0, 1.0, 2.0)),
+}
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def _fts_table(table):
+    return f'{table}_fts'
+
+
+def _trigger_sql(table, columns):
+    fts = _fts_table(table)
+    cols = ', '.join(columns)
+    new_values = ', '.join(f'new.{column}' for column in columns)
+    old_values = ', '.join(f'old.{column}' for column in columns)
+    delete_old = (
+        f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_values});"
+    )
+    insert_new = f'INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_values});'
+    return {
+        f'{fts}_ai': f'CREATE TRIGGER {fts}_ai AFTER INSERT ON {table} BEGIN {insert_new} END',
+        f'{fts}_ad': f'CREATE TRIGGER {fts}_ad AFTER DELETE ON {table} BEGIN {delete_old} END',
+        f'{fts}_au': (
+            f'CREATE TRIGGER {fts}_au AFTER UPDATE OF {cols} ON {table} '
+            f'BEGIN {delete_old} {insert_new} END'
+        ),
+    }
+
+
+def install_search_indexes(using_connection=None):
+    """
+    Create the FTS5 tables and their sync triggers, rebuilding an index whose
+    triggers are missing.
+
+    SQLite drops a table's triggers whenever Django remakes the table during
+    a schema change, so this runs after every migrate as well as from the
+    migration that introduced the indexes.
+    """
+    conn = using_connection or connection
+    if conn.vendor != 'sqlite':
+        return
+
+    with conn.cursor() as cursor:
+        for table, (columns, _) in SEARCH_INDEXES.items():
+            fts = _fts_table(table)
+            cursor.execute(
+                f'CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5('
+                f"{', '.join(columns)}, content='{table}', content_rowid='id', "
+                f"tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+            )
+            cursor.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = %s",
+                [table],
+            )
+            existing = {row[0] for row in cursor.fetchall()}
+            triggers = _trigger_sql(table, columns)
+            missing = [name for name in triggers if name not in existing]
+            if not missing:
+                continue
+            for name in missing:
+                cursor.execute(triggers[name])
+            cursor.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+
+
+def uninstall_search_indexes(using_connection=None):
+    conn = using_connection or connection
+    if conn.vendor != 'sqlite':
+        return
+
+    with conn.cursor() as cursor:
+        for table, (columns, _) in SEARCH_INDEXES.items():
+            for name in _trigger_sql(table, columns):
+                cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+            cursor.execute(f'DROP TABLE IF EXISTS {_fts_table(table)}')
+
+
+def match_expression(text):
+    """Turn free text into an FTS5 query: every word must match, as a prefix."""
+    tokens = TOKEN_RE.findall(text or '')
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+def filter_matching(queryset, text):
+    """Restrict `queryset` to rows whose indexed text matches every word of `text`."""
+    match = match_expression(text)
+    if not match:
+        return queryset.none()
+
+    table = queryset.model._meta.db_table
+    columns, _ = SEARCH_INDEXES[table]
+    if connection.vendor != 'sqlite':
+        condition = Q()
+        for column in columns:
+            condition |= Q(**{f'{column}__icontains': text})
+        return queryset.filter(condition)
+
+    fts = _fts_table(table)
+    return queryset.filter(
+        id__in=RawSQL(f'SELECT rowid FROM {fts} WHERE {fts} MATCH %s', (match,))
+    )
+
+
+def search(queryset, text):
+    """
+    Filter `queryset` to rows matching `text` and order them by relevance.
+
+    Rows are annotated with `search_rank` (bm25, lower is better) and ordered
+    by `(search_rank, id)`, which cursor pagination picks up as its keyset.
+    The FTS table is joined once, so MATCH runs one index lookup and bm25
+    is read from the joined row rather than a subquery per row.
+    """
+    match = match_expression(text)
+    if connection.vendor != 'sqlite' or not match:
+        return filter_matching(queryset, text)
+
+    table = queryset.model._meta.db_table
+    _, weights = SEARCH_INDEXES[table]
+    fts = _fts_table(table)
+    queryset = queryset.extra(
+        tables=[fts],
+        where=[f'{fts}.rowid = {table}.id', f'{fts} MATCH %s'],
+        params=[match],
+    )
+    rank = RawSQL(f"bm25({fts}, {', '.join(str(weight) for weight in weights)})", ())
+    return queryset.annotate(search_rank=rank).order_by('search_rank', 'id')
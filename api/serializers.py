@@ -3,6 +3,7 @@ from rest_framework.serializers import (
 )
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
 from api.models import (
     Address, Transaction, Order, Wallet,
     Inventory, Discount, Item,
@@ -11,19 +12,23 @@ from api.models import (
 from rest_framework import serializers
 from django.core.exceptions import ValidationError
 from rest_framework.validators import UniqueValidator
+from api.fieldsets import SparseFieldsMixin
+from api.renditions import RenditionsField
 
 User = get_user_model()
 
 class UserSerializer(ModelSerializer):
     password = serializers.CharField(write_only=True)
     confirm_password = serializers.CharField(write_only=True, required=False)
+    profile_image_renditions = RenditionsField(source='profile_image')
     
     class Meta:
         model = User
         fields = [
             'id', 'username', 'email', 'password', 'confirm_password',
             'first_name', 'last_name', 'phone', 'user_type', 'vendor_type',
-            'business_name', 'business_license', 'telegram_id', 'profile_image'
+            'business_name', 'business_license', 'telegram_id', 'profile_image',
+            'profile_image_renditions'
         ]
         extra_kwargs = {
             'password': {'write_only': True},
@@ -64,9 +69,11 @@ class VendorSerializer(ModelSerializer):
 
 
 class CustomerSerializer(ModelSerializer):
+    profile_image_renditions = RenditionsField(source='profile_image')
+
     class Meta:
         model = User
-        fields = ['id', 'username', 'email', 'first_name', 'last_name', 'phone', 'profile_image']
+        fields = ['id', 'username', 'email', 'first_name', 'last_name', 'phone', 'profile_image', 'profile_image_renditions']
         # read_only_fields = ('id')        
 
 
@@ -160,17 +167,30 @@ class NotificationSerializer(ModelSerializer):
         fields = '__all__'
 
 
+class NotificationBroadcastSerializer(serializers.Serializer):
+    text = serializers.CharField()
+    type = serializers.ChoiceField(choices=Notification.NOTIFICATION_CHOICES, default='system')
+    # Audience; with neither set, every active user
+    user_type = serializers.ChoiceField(choices=User.USER_CHOICES, required=False)
+    category = serializers.ChoiceField(choices=Item.CATEGORY_CHOICES, required=False)
+
+
+class NotificationIdsSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.IntegerField(), allow_empty=False, max_length=1000)
+
+
 class InventorySerializer(ModelSerializer):
     class Meta:
         model = Inventory
-        fields = '__all__'
+        exclude = ['reserved_quantity']
 
 
-class ItemSerializer(ModelSerializer):
+class ItemSerializer(SparseFieldsMixin, ModelSerializer):
     inventory = InventorySerializer()
+    image_renditions = RenditionsField(source='image')
     class Meta:
         model = Item
-        fields = ['id', 'name', 'description', 'price', 'category', 'inventory', 'created_at', 'vendor', 'image']
+        fields = ['id', 'name', 'description', 'price', 'category', 'inventory', 'created_at', 'vendor', 'image', 'image_renditions']
         
     def get_image(self, obj):
         request = self.context.get('request')
@@ -187,16 +207,35 @@ class CreateItemSerializer(ModelSerializer):
     
 
 class UsedItemSerializer(ModelSerializer):
+    image_renditions = RenditionsField(source='image')
+
     class Meta:
         model = UsedItem
         fields = '__all__'
 
 
 
-class OrderItemSerializer(ModelSerializer):
+class OrderItemSerializer(SparseFieldsMixin, ModelSerializer):
     item = ItemSerializer(read_only=True)
     purchaser = SerializerMethodField()
     order = SerializerMethodField()
+    select_related_hints = {'purchaser': ('order__user',), 'order': ('order',)}
+    # The method fields below as (value paths, builder) for api/fastpath.py
+    fast_method_fields = {
+        'purchaser': (
+            ('order__user__id', 'order__user__first_name', 'order__user__last_name',
+             'order__user__email', 'order__user__phone'),
+            lambda id, first_name, last_name, email, phone: {
+                'id': id, 'first_name': first_name, 'last_name': last_name, 'email': email, 'phone': phone,
+            },
+        ),
+        'order': (
+            ('order__id', 'order__status', 'order__created_at', 'order__updated_at'),
+            lambda id, status, created_at, updated_at: {
+                'id': id, 'status': status, 'created_at': created_at, 'updated_at': updated_at,
+            },
+        ),
+    }
     
     def get_purchaser(self, obj):
         purchaser = obj.order.user
@@ -228,7 +267,7 @@ class OrderItemSerializer(ModelSerializer):
 class CreateOrderItemSerializer(ModelSerializer):
     class Meta:
         model = OrderItem
-        fields = ['id', 'price_at_purchase', 'quantity', 'order', 'item', 'image']
+        fields = ['id', 'price_at_purchase', 'quantity', 'order', 'item']
         
     def validate_item(self, value):
         # Ensure the item exists
@@ -237,16 +276,17 @@ class CreateOrderItemSerializer(ModelSerializer):
         return value
 
 
-class OrderSerializer(ModelSerializer):
+class OrderSerializer(SparseFieldsMixin, ModelSerializer):
     order_items = OrderItemSerializer(many=True, read_only=True)
     total = SerializerMethodField()
+    fast_method_fields = {'total': (('total_amount',), lambda total_amount: total_amount)}
     
     def get_total(self, obj):
         return obj.total
 
     class Meta:
         model = Order
-        fields = ['id', 'status', 'user', 'created_at', 'order_items', 'total']
+        fields = ['id', 'status', 'user', 'created_at', 'order_items', 'total', 'item_count']
 
 
 
@@ -264,7 +304,7 @@ class DiscountSerializer(ModelSerializer):
 
 
 
-class RatingSerializer(ModelSerializer):
+class RatingSerializer(SparseFieldsMixin, ModelSerializer):
     item = ItemSerializer()
     user = CustomerSerializer()
     class Meta:
@@ -275,7 +315,7 @@ class RatingSerializer(ModelSerializer):
 
 
 
-class CartSerializer(ModelSerializer):
+class CartSerializer(SparseFieldsMixin, ModelSerializer):
     item = ItemSerializer()
     class Meta:
         model = Cart
@@ -286,14 +326,53 @@ class CartCreateSerializer(ModelSerializer):
     class Meta:
         model = Cart
         fields = ['id', 'item', 'item_quantity', 'discount']
-        
-    def validate_item(self, value):
-        # Ensure the item exists
-        if not Item.objects.filter(id=value.id).exists():
-            raise serializers.ValidationError("Item does not exist")
-        return value
 
-class BidSerializer(ModelSerializer):
+    # One line per item is left to cart_user_item_uniq rather than checked with a query first
+    def create(self, validated_data):
+        try:
+            with transaction.atomic():
+                return super().create(validated_data)
+        except IntegrityError:
+            raise serializers.ValidationError({'item': ['This item is already in the cart.']})
+
+    def update(self, instance, validated_data):
+        try:
+            with transaction.atomic():
+                return super().update(instance, validated_data)
+        except IntegrityError:
+            raise serializers.ValidationError({'item': ['This item is already in the cart.']})
+
+
+class CartBulkLineSerializer(serializers.Serializer):
+    item = serializers.IntegerField()
+    item_quantity = serializers.IntegerField(min_value=0)
+    discount = serializers.IntegerField(required=False, allow_null=True)
+
+
+class CartBulkSerializer(serializers.Serializer):
+    """
+    Lines to set in the cart: new items are added, items already in the
+    cart get the given quantity and discount, and `item_quantity: 0` removes
+    the item. Items and discounts are checked with one `IN` query each.
+    """
+    lines = CartBulkLineSerializer(many=True, allow_empty=False, max_length=200)
+
+    def validate_lines(self, lines):
+        item_ids = [line['item'] for line in lines]
+        if len(set(item_ids)) != len(item_ids):
+            raise serializers.ValidationError('Each item may appear only once.')
+        missing = set(item_ids) - set(Item.objects.filter(id__in=item_ids).values_list('id', flat=True))
+        if missing:
+            raise serializers.ValidationError(f'Unknown items: {sorted(missing)}')
+
+        discount_ids = {line['discount'] for line in lines if line.get('discount') is not None}
+        if discount_ids:
+            missing = discount_ids - set(Discount.objects.filter(id__in=discount_ids).values_list('id', flat=True))
+            if missing:
+                raise serializers.ValidationError(f'Unknown discounts: {sorted(missing)}')
+        return lines
+
+class BidSerializer(SparseFieldsMixin, ModelSerializer):
     user = CustomerSerializer(read_only=True)
     
     class Meta:
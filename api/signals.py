@@ -0,0 +1,106 @@
+# api/signals.py
+
+from django.db import connections, transaction
+from django.db.models.signals import post_delete, post_migrate, post_save
+from django.dispatch import receiver
+
+from api.caching import bump_catalog_version
+from api.discounts import forget_discount
+from api.etags import bump_resource_versions
+from api.models import Address, Bid, Cart, Discount, Inventory, Item, Notification, Order, OrderItem, StockReservation, UsedItem, User
+from api.notifications import publish as publish_notifications
+from api.renditions import IMAGE_FIELDS, schedule as schedule_renditions
+from api.reservations import in_bulk_cart_delete, release
+from api.search import install_search_indexes
+from api.streams import publish_bid
+
+
+@receiver(post_save, sender=OrderItem)
+def refresh_order_totals_on_save(sender, instance, **kwargs):
+    Order.refresh_totals({instance.order_id, getattr(instance, '_loaded_order_id', None)})
+    instance._loaded_order_id = instance.order_id
+
+
+@receiver(post_delete, sender=OrderItem)
+def refresh_order_totals_on_delete(sender, instance, **kwargs):
+    Order.refresh_totals({instance.order_id})
+
+
+@receiver(post_save, sender=Item)
+@receiver(post_delete, sender=Item)
+@receiver(post_save, sender=Inventory)
+@receiver(post_delete, sender=Inventory)
+def invalidate_catalog_cache(sender, instance, **kwargs):
+    bump_catalog_version()
+    # Cart responses embed the item and its inventory
+    item_id = instance.id if sender is Item else instance.item_id
+    bump_resource_versions(Cart.objects.filter(item_id=item_id).values('user_id'), 'cart')
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_etag(sender, instance, **kwargs):
+    bump_resource_versions([instance.id], 'user')
+
+
+@receiver(post_save, sender=Address)
+@receiver(post_delete, sender=Address)
+def invalidate_address_etag(sender, instance, **kwargs):
+    bump_resource_versions([instance.user_id], 'user')
+
+
+@receiver(post_save, sender=Cart)
+@receiver(post_delete, sender=Cart)
+def invalidate_cart_etag(sender, instance, **kwargs):
+    # Bulk deletes bump each owner once themselves
+    if not in_bulk_cart_delete():
+        bump_resource_versions([instance.user_id], 'cart')
+
+
+@receiver(post_save, sender=Notification)
+@receiver(post_delete, sender=Notification)
+def invalidate_notification_etag(sender, instance, **kwargs):
+    bump_resource_versions([instance.user_id], 'notification')
+
+
+@receiver(post_save, sender=Notification)
+def push_new_notification(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: publish_notifications([instance]))
+
+
+@receiver(post_save, sender=Discount)
+@receiver(post_delete, sender=Discount)
+def invalidate_discount_cache(sender, instance, **kwargs):
+    forget_discount(instance.code)
+
+
+@receiver(post_delete, sender=StockReservation)
+def release_reservation(sender, instance, **kwargs):
+    # Cart lines removed one by one; bulk paths release in a single UPDATE
+    if not in_bulk_cart_delete():
+        release({instance.item_id: instance.quantity})
+
+
+@receiver(post_save, sender=Item)
+@receiver(post_save, sender=UsedItem)
+@receiver(post_save, sender=User)
+def render_image_renditions(sender, instance, update_fields=None, **kwargs):
+    field = IMAGE_FIELDS[sender._meta.label]
+    if update_fields is None or field in update_fields:
+        image = getattr(instance, field)
+        # After commit: the pool reads the file the row points at
+        transaction.on_commit(lambda: schedule_renditions(image.storage, image.name))
+
+
+@receiver(post_save, sender=Bid)
+def push_new_bid(sender, instance, created, **kwargs):
+    if created:
+        # Watchers only see committed bids
+        transaction.on_commit(lambda: publish_bid(instance))
+
+
+@receiver(post_migrate)
+def restore_search_indexes(sender, using, **kwargs):
+    # Table remakes during migrate drop the FTS sync triggers; put them back.
+    if sender.name == 'api':
+        install_search_indexes(connections[using])
@@ -0,0 +1,51 @@
+# api/storage.py
+
+import hashlib
+import posixpath
+import re
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+
+
+# `items/3f/3fa4...e1.png`, or a rendition of it such as `items/3f/3fa4...e1.thumb.fd78665a.webp`
+CONTENT_ADDRESSED_NAME = re.compile(r'(?:^|/)(?P<prefix>[0-9a-f]{2})/(?P<digest>(?P=prefix)[0-9a-f]{62})(?P<suffix>\.[^/]*)?$')
+
+
+def content_digest(content):
+    sha256 = hashlib.sha256()
+    for chunk in content.chunks():
+        sha256.update(chunk)
+    content.seek(0)
+    return sha256.hexdigest()
+
+
+def content_etag(name):
+    """Strong ETag of a content-addressed file, from its name alone; None for any other name."""
+    match = CONTENT_ADDRESSED_NAME.search(name)
+    if match is None:
+        return None
+    return f'"{match["digest"]}{match["suffix"] or ""}"'
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    File storage that names each upload after the SHA-256 of its content,
+    under the directory it was uploaded to:
+    `items/photo.PNG` -> `items/3f/3fa4...e1.png`.
+
+    Identical uploads share one file, written once. A name never changes
+    content, so it can be cached as immutable (see `api.media.serve_media`).
+    """
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        directory, extension = posixpath.dirname(name), posixpath.splitext(name)[1].lower()
+        digest = content_digest(content)
+        name = posixpath.join(directory, digest[:2], digest + extension)
+        if self.exists(name):
+            return name
+        return super().save(name, content, max_length=max_length)
@@ -0,0 +1,177 @@
+# api/streams.py
+
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+
+from api.authentication import StatelessJWTAuthentication
+from api.models import Bid, Notification, UsedItem
+from api.notifications import notification_topic
+from api.pubsub import get_hub
+from api.renderers import FastJSONRenderer
+from api.serializers import BidSerializer, NotificationSerializer
+
+
+SSE_KEEPALIVE_SECONDS = 15
+SSE_RETRY_MS = 3000
+# Bids replayed to a client reconnecting with Last-Event-ID
+SSE_REPLAY_LIMIT = 100
+BID_STREAM_ROLES = ('customer', 'admin')
+
+# Seconds a notification long poll waits by default, and at most; keep under the proxies' read timeout
+NOTIFICATION_WAIT_TIMEOUT = 25
+NOTIFICATION_WAIT_MAX_TIMEOUT = 55
+NOTIFICATION_WAIT_LIMIT = 100
+
+
+def bid_topic(used_item_id):
+    return f'bids:{used_item_id}'
+
+
+def sse_frame(event_id, event, data):
+    return b'id: %d\nevent: %s\ndata: %s\n\n' % (event_id, event.encode(), data)
+
+
+def bid_frames(bids):
+    """
+    (bid id, SSE frame) per bid, with the fields of `GET /api/bid/`. Bids are
+    published without a request to build URLs from, so image URLs are
+    relative to the API's host, replayed bids included.
+    """
+    renderer = FastJSONRenderer()
+    return [(bid['id'], sse_frame(bid['id'], 'bid', renderer.render(bid))) for bid in BidSerializer(bids, many=True).data]
+
+
+def publish_bid(bid):
+    """Push a new bid to the streams watching its used item; serialized once for all of them."""
+    (message,) = bid_frames([bid])
+    get_hub().publish(bid_topic(bid.used_item_id), message)
+
+
+def authenticate(request):
+    """
+    The request's JWT user, or None. EventSource cannot set headers, so the
+    access token may also come as `?token=`.
+    """
+    authenticator = StatelessJWTAuthentication()
+    header = authenticator.get_header(request)
+    raw_token = authenticator.get_raw_token(header) if header is not None else request.GET.get('token', '').encode()
+    if not raw_token:
+        return None
+    return authenticator.get_user(authenticator.get_validated_token(raw_token))
+
+
+async def authenticate_or_401(request):
+    """(user, None) for an authenticated request, (None, 401 response) otherwise."""
+    try:
+        user = await sync_to_async(authenticate)(request)
+    except (AuthenticationFailed, InvalidToken, TokenError) as exc:
+        return None, JsonResponse({'detail': str(exc)}, status=401)
+    if user is None:
+        return None, JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+    return user, None
+
+
+async def bid_events(used_item_id, last_event_id=None):
+    # Subscribed before the missed bids are read, so none falls in between
+    subscription = get_hub().subscribe(bid_topic(used_item_id))
+    try:
+        yield b'retry: %d\n\n' % SSE_RETRY_MS
+        last_id = last_event_id or 0
+        if last_event_id is not None:
+            missed = Bid.objects.filter(used_item_id=used_item_id, pk__gt=last_event_id).select_related('user').order_by('id')
+            for event_id, frame in await sync_to_async(bid_frames)(missed[:SSE_REPLAY_LIMIT]):
+                yield frame
+                last_id = event_id
+        while True:
+            try:
+                event_id, frame = await subscription.get(timeout=SSE_KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                # Keeps proxies from closing an idle connection
+                yield b': keepalive\n\n'
+                continue
+            # Bids published while the missed ones were read come through twice
+            if event_id > last_id:
+                yield frame
+                last_id = event_id
+    finally:
+        subscription.close()
+
+
+def event_stream_response(stream):
+    response = StreamingHttpResponse(stream, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Tells nginx not to buffer the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+async def bid_stream(request, used_item_id):
+    """
+    `GET /api/used-items/<id>/bids/stream/`: server-sent events, one `bid`
+    event per bid placed on the used item from now on.
+
+    An async view: under ASGI (Backend/asgi.py) an idle watcher is a queue
+    on the event loop, not a worker thread. A client reconnecting with
+    Last-Event-ID first gets the bids it missed.
+    """
+    user, error = await authenticate_or_401(request)
+    if error is not None:
+        return error
+    # Frames carry the bidders' details: the roles that may list bids only
+    if user.user_type not in BID_STREAM_ROLES:
+        return JsonResponse({'detail': 'Only customers and admins may watch bids.'}, status=403)
+    if not await UsedItem.objects.filter(pk=used_item_id).aexists():
+        return JsonResponse({'detail': 'No UsedItem matches the given query.'}, status=404)
+
+    last_event_id = request.headers.get('Last-Event-ID', '')
+    last_event_id = int(last_event_id) if last_event_id.isdigit() else None
+    return event_stream_response(bid_events(used_item_id, last_event_id))
+
+
+def notifications_after(user_id, cursor):
+    notifications = Notification.objects.filter(user_id=user_id, pk__gt=cursor).order_by('id')[:NOTIFICATION_WAIT_LIMIT]
+    return NotificationSerializer(notifications, many=True).data
+
+
+async def wait_for_notifications(request):
+    """
+    `GET /api/notification/wait/?after=<id>&timeout=<seconds>`: the caller's
+    notifications newer than `after`, waiting up to `timeout` seconds for
+    one to be created. Responds `{"results": [...], "cursor": <id>}`; the
+    next poll passes `cursor` as `after`.
+
+    The database is read once, before waiting. The wait is a hub
+    subscription on the event loop, woken by `api.notifications.publish`
+    with the new notifications already serialized.
+    """
+    user, error = await authenticate_or_401(request)
+    if error is not None:
+        return error
+    try:
+        after = int(request.GET['after'])
+        timeout = max(0, min(int(request.GET.get('timeout', NOTIFICATION_WAIT_TIMEOUT)), NOTIFICATION_WAIT_MAX_TIMEOUT))
+    except (KeyError, ValueError):
+        return JsonResponse({'detail': '`after` must be a notification id and `timeout` whole seconds.'}, status=400)
+
+    # Subscribed before the database is read, so a notification created in between still wakes the poll
+    subscription = get_hub().subscribe(notification_topic(user.id))
+    try:
+        results = await sync_to_async(notifications_after)(user.id, after)
+        if not results and timeout:
+            messages = []
+            try:
+                messages.append(await subscription.get(timeout=timeout))
+            except asyncio.TimeoutError:
+                pass
+            # Everything a fan-out batch queued alongside it
+            messages += subscription.drain()
+            results = [data for notification_id, data in messages if notification_id > after]
+    finally:
+        subscription.close()
+
+    cursor = max((data['id'] for data in results), default=after)
+    return HttpResponse(FastJSONRenderer().render({'results': results, 'cursor': cursor}), content_type='application/json')
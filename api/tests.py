@@ -1,3 +1,1087 @@
-from django.test import TestCase
+import asyncio
+import base64
+import csv
+import gc
+import json
+import math
+import os
+import tempfile
+import time
+import warnings
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from pathlib import Path
+from unittest.mock import patch
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.files.base import ContentFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import AsyncClient, RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.urls import Resolver404, resolve, reverse
+from PIL import Image
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from api.authentication import tokens_for_user
+from api.caching import get_catalog_cache
+from api.discounts import get_discount_cache
+from api.media import serve_media
+from api.models import (
+    Bid, CatalogVersion, Cart, Discount, Inventory, Item, Notification, Order, OrderItem, StockReservation, UsedItem, User,
+    new_catalog_version,
+)
+from api.prefetching import prefetch_plan
+from api.pubsub import get_hub
+from api.renderers import FastJSONParser, FastJSONRenderer
+from api.serializers import OrderSerializer
+from api.renditions import rendition_name
+from api.urls import router
+
+
+# Dataset size and sampling, e.g. BENCH_CUSTOMERS=2000 BENCH_VENDORS=40 python manage.py test api
+BENCH_CUSTOMERS = int(os.environ.get('BENCH_CUSTOMERS', 60))
+BENCH_VENDORS = int(os.environ.get('BENCH_VENDORS', 6))
+BENCH_SEED = int(os.environ.get('BENCH_SEED', 1234))
+BENCH_REPEAT = int(os.environ.get('BENCH_REPEAT', 9))
+# A p50 may grow by this factor (plus BENCH_LATENCY_SLACK_MS) before it counts as a regression
+BENCH_LATENCY_TOLERANCE = float(os.environ.get('BENCH_LATENCY_TOLERANCE', 2.0))
+BENCH_LATENCY_SLACK_MS = float(os.environ.get('BENCH_LATENCY_SLACK_MS', 5.0))
+# Timings depend on the machine, so only a dedicated benchmark run gates on them
+BENCH_GATE_LATENCY = os.environ.get('BENCH_GATE_LATENCY') == '1'
+BENCH_UPDATE_BASELINE = os.environ.get('BENCH_UPDATE_BASELINE') == '1'
+BENCH_VERBOSE = os.environ.get('BENCH_VERBOSE') == '1'
+
+BASELINE_PATH = Path(__file__).resolve().parent / 'benchmark_baseline.json'
+
+ROLES = ('customer', 'vendor', 'admin')
+
+# Most queries any role may spend on an endpoint. These must not depend on
+# the dataset size; a budget that needs raising is usually an N+1.
+QUERY_BUDGETS = {
+    'address-list': 2,
+    'address-detail': 2,
+    'transaction-list': 2,
+    'transaction-detail': 2,
+    'wallet-list': 2,
+    'wallet-detail': 2,
+    'inventory-list': 2,
+    'inventory-detail': 2,
+    'discount-list': 2,
+    'discount-detail': 2,
+    'item-list': 2,
+    'item-detail': 2,
+    # +1 for the ETag version lookup, +1 more on a user's first ETag
+    'notification-list': 3,
+    'notification-detail': 3,
+    'user-list': 2,
+    'user-detail': 2,
+    'bid-list': 2,
+    'bid-detail': 2,
+    'rating-list': 2,
+    'rating-detail': 2,
+    'cart-list': 3,
+    'cart-detail': 3,
+    'order-list': 3,
+    'order-detail': 3,
+    'order-item-list': 2,
+    'order-item-detail': 2,
+    'used-item-list': 2,
+    'used-item-detail': 2,
+    'single_user': 3,
+    'vendor_customer': 2,
+}
+
+# Named routes outside the router that the frontend reads
+EXTRA_ENDPOINTS = ('single_user', 'vendor_customer')
+
+
+def percentile(samples, percent):
+    ordered = sorted(samples)
+    rank = max(math.ceil(percent / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+@override_settings(REQUEST_METRICS={'SAMPLE_RATE': 0, 'SLOW_REQUEST_MS': float('inf')})
+class SeededAPITestCase(TestCase):
+    """Test case with the populate dataset and one user per role."""
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command(
+            'populate',
+            customers=BENCH_CUSTOMERS,
+            vendors=BENCH_VENDORS,
+            seed=BENCH_SEED,
+            stdout=StringIO(),
+        )
+        cls.users = {
+            role: User.objects.filter(user_type=role).order_by('id').first()
+            for role in ROLES
+        }
+
+    def setUp(self):
+        self.client = APIClient()
+        # Each test's catalog bumps roll back with it; the pages it cached do not
+        get_catalog_cache().clear()
+
+
+class EndpointBenchmarkTests(SeededAPITestCase):
+    """
+    Calls every router endpoint as a customer, a vendor and an admin against a
+    seeded dataset, recording p50/p95 latency and query counts.
+
+    Fails when an endpoint goes over its QUERY_BUDGETS entry or runs more
+    queries than the stored baseline. With BENCH_GATE_LATENCY=1 it also fails
+    when a p50 regresses past the baseline by more than the tolerance; left
+    off by default, since shared CI machines make timings flaky. p95 is
+    recorded for reading but too noisy to gate on. Run with
+    BENCH_UPDATE_BASELINE=1 to rewrite the baseline.
+    """
+
+    def endpoints(self):
+        """(name, list url, detail route name or None) for every endpoint to call"""
+        for prefix, viewset, basename in router.registry:
+            yield f'{basename}-list', reverse(f'{basename}-list'), f'{basename}-detail'
+        for name in EXTRA_ENDPOINTS:
+            yield name, reverse(name), None
+
+    def measure(self, url):
+        # The first call warms caches and is the one whose queries are counted
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        # Read now: every request_started signal clears the connection's query log
+        query_count = len(queries)
+        timings = []
+        gc.disable()
+        try:
+            for _ in range(BENCH_REPEAT):
+                start = time.perf_counter()
+                self.client.get(url)
+                timings.append((time.perf_counter() - start) * 1000)
+        finally:
+            gc.enable()
+        return response, {
+            'status': response.status_code,
+            'queries': query_count,
+            'p50_ms': round(percentile(timings, 50), 2),
+            'p95_ms': round(percentile(timings, 95), 2),
+        }
+
+    def run_benchmark(self):
+        results = {}
+        for role in ROLES:
+            self.client.force_authenticate(self.users[role])
+            for name, url, detail_route in self.endpoints():
+                response, results[f'{role} {name}'] = self.measure(url)
+                if detail_route is None or response.status_code != 200:
+                    continue
+                rows = response.json()
+                rows = rows.get('results', rows) if isinstance(rows, dict) else rows
+                if rows and 'id' in rows[0]:
+                    detail_url = reverse(detail_route, args=[rows[0]['id']])
+                    _, results[f'{role} {detail_route}'] = self.measure(detail_url)
+        return results
+
+    def test_endpoints_within_budget_and_baseline(self):
+        results = self.run_benchmark()
+        dataset = {'customers': BENCH_CUSTOMERS, 'vendors': BENCH_VENDORS, 'seed': BENCH_SEED}
+
+        if BENCH_VERBOSE:
+            print(f'\n{"endpoint":<36} {"status":>6} {"queries":>7} {"p50 ms":>8} {"p95 ms":>8}')
+            for key, result in sorted(results.items()):
+                print(f'{key:<36} {result["status"]:>6} {result["queries"]:>7} '
+                      f'{result["p50_ms"]:>8.2f} {result["p95_ms"]:>8.2f}')
+
+        for key, result in results.items():
+            endpoint = key.split(' ', 1)[1]
+            with self.subTest(endpoint=key):
+                self.assertIn(endpoint, QUERY_BUDGETS, f'{endpoint} has no declared query budget')
+                self.assertLessEqual(
+                    result['queries'], QUERY_BUDGETS[endpoint],
+                    f'{key} ran {result["queries"]} queries, budget is {QUERY_BUDGETS[endpoint]}',
+                )
+
+        if BENCH_UPDATE_BASELINE:
+            BASELINE_PATH.write_text(json.dumps(
+                {'dataset': dataset, 'results': results}, indent=2, sort_keys=True,
+            ) + '\n')
+            return
+
+        if not BASELINE_PATH.exists():
+            self.skipTest(f'No baseline at {BASELINE_PATH.name}; run with BENCH_UPDATE_BASELINE=1')
+        baseline = json.loads(BASELINE_PATH.read_text())
+        # Latency only compares like with like; query counts do not depend on the dataset size
+        gate_latency = BENCH_GATE_LATENCY and baseline['dataset'] == dataset
+
+        for key, result in results.items():
+            expected = baseline['results'].get(key)
+            if expected is None:
+                continue
+            with self.subTest(endpoint=key):
+                self.assertEqual(result['status'], expected['status'], f'{key} status changed')
+                self.assertLessEqual(
+                    result['queries'], expected['queries'],
+                    f'{key} ran {result["queries"]} queries, baseline is {expected["queries"]}',
+                )
+                if gate_latency:
+                    allowed = expected['p50_ms'] * BENCH_LATENCY_TOLERANCE + BENCH_LATENCY_SLACK_MS
+                    self.assertLessEqual(
+                        result['p50_ms'], allowed,
+                        f'{key} p50 {result["p50_ms"]}ms, baseline {expected["p50_ms"]}ms',
+                    )
+
+
+class KeysetPaginationTests(SeededAPITestCase):
+    """Cursors walk every row once in keyset order, both ways, and tampered ones are refused."""
+
+    url = '/api/item/?page_size=7'
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.users['customer'])
+
+    def page(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, response.data)
+        return [item['id'] for item in response.data['results']], response.data['next'], response.data['previous']
+
+    def walk(self):
+        ids, next_url, previous_url = self.page(self.url)
+        self.assertIsNone(previous_url)
+        while next_url:
+            page, next_url, _ = self.page(next_url)
+            ids += page
+        return ids
+
+    def test_round_trip_in_keyset_order(self):
+        expected = list(Item.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+        self.assertEqual(self.walk(), expected)
+
+    def test_ties_on_the_ordering_key(self):
+        Item.objects.update(created_at=timezone.now())
+        expected = list(Item.objects.order_by('-id').values_list('id', flat=True))
+        self.assertEqual(self.walk(), expected)
+
+    def test_previous_returns_the_page_before(self):
+        first, next_url, _ = self.page(self.url)
+        second, next_url, previous_url = self.page(next_url)
+        self.assertEqual(self.page(previous_url)[0], first)
+        third, _, previous_url = self.page(next_url)
+        # Backwards from the third page lands on the second, with links both ways
+        back, next_again, previous_again = self.page(previous_url)
+        self.assertEqual(back, second)
+        self.assertEqual(self.page(next_again)[0], third)
+        self.assertEqual(self.page(previous_again)[0], first)
+
+    def test_tampered_cursors_are_refused(self):
+        def token(payload):
+            return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip('=')
+
+        for cursor in ['not base64!', token(['no', 'payload']), token({'v': [1]}), token({'v': ['yesterday', 1]})]:
+            with self.subTest(cursor=cursor):
+                response = self.client.get(self.url, {'cursor': cursor})
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.data, {'cursor': ['Invalid cursor']})
+
+
+@override_settings(REQUEST_METRICS={'SAMPLE_RATE': 1.0, 'SLOW_REQUEST_MS': float('inf')})
+class RequestMetricsTests(SeededAPITestCase):
+    """Sampled requests get a Server-Timing breakdown, sync or async; slow ones are logged either way."""
+
+    def setUp(self):
+        super().setUp()
+        self.customer = self.users['customer']
+        self.client.force_authenticate(self.customer)
+
+    def timing(self, response):
+        return dict(entry.split(';', 1) for entry in response['Server-Timing'].split(', '))
+
+    def test_server_timing_breaks_down_sampled_requests(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/notification/')
+        timing = self.timing(response)
+        self.assertEqual(set(timing), {'db', 'serialize', 'view', 'total'})
+        self.assertIn(f'desc="{len(queries)} queries"', timing['db'])
+
+    @override_settings(REQUEST_METRICS={'SAMPLE_RATE': 0, 'SLOW_REQUEST_MS': float('inf')})
+    def test_zero_sample_rate_records_nothing(self):
+        with self.assertNoLogs('api.requests', 'INFO'):
+            response = self.client.get('/api/notification/')
+        self.assertFalse(response.has_header('Server-Timing'))
+        self.assertFalse(hasattr(response.wsgi_request, 'metrics'))
+
+    def test_slow_requests_are_logged(self):
+        for sample_rate in (1.0, 0):
+            with self.subTest(sample_rate=sample_rate), \
+                    override_settings(REQUEST_METRICS={'SAMPLE_RATE': sample_rate, 'SLOW_REQUEST_MS': 0}):
+                client = APIClient()
+                client.force_authenticate(self.customer)
+                with self.assertLogs('api.requests', 'WARNING') as logs:
+                    client.get('/api/notification/')
+                (record,) = logs.records
+                self.assertEqual(record.request_metrics['path'], '/api/notification/')
+                self.assertIs(record.request_metrics['slow'], True)
+                self.assertEqual('queries' in record.request_metrics, bool(sample_rate))
+
+    async def test_async_requests_get_the_header(self):
+        client = AsyncClient()
+        headers = {'Authorization': f"Bearer {tokens_for_user(self.customer)['access']}"}
+        # A sync view behind the async middleware counts its queries in its own thread
+        timing = self.timing(await client.get('/api/notification/', headers=headers))
+        self.assertNotIn('desc="0 queries"', timing['db'])
+        # An async view is timed as a whole
+        response = await client.get('/api/notification/wait/', {'after': 0, 'timeout': 0}, headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('total', self.timing(response))
+
+
+class ConditionalGetTests(SeededAPITestCase):
+    """Per-user ETags answer repeat GETs with 304 until a write bumps the user's counter."""
+
+    def setUp(self):
+        super().setUp()
+        self.customer = self.users['customer']
+        self.client.force_authenticate(self.customer)
+
+    def assert_revalidates(self, url, write):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['ETag'], etag)
+
+        self.assertLess(write().status_code, 300)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_cart_write_changes_etag(self):
+        line = Cart.objects.filter(user=self.customer).first()
+        if line is None:
+            line = Cart.objects.create(user=self.customer, item=Item.objects.first(), item_quantity=1)
+        self.assert_revalidates('/api/cart/', lambda: self.client.delete(f'/api/cart/{line.pk}/'))
+
+    def test_notification_patch_changes_etag(self):
+        notification = Notification.objects.create(user=self.customer, text='Shipped', read=False)
+        self.assert_revalidates(
+            '/api/notification/', lambda: self.client.patch(f'/api/notification/{notification.pk}/', {'read': True}),
+        )
+
+    def test_user_update_changes_etag(self):
+        self.assert_revalidates(
+            '/api/user/detail/', lambda: self.client.patch(f'/api/user/{self.customer.pk}/', {'first_name': 'Renamed'}),
+        )
+
+    def test_admins_get_no_etag(self):
+        self.client.force_authenticate(self.users['admin'])
+        for url in ('/api/notification/', '/api/user/detail/'):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertFalse(response.has_header('ETag'), url)
+
+
+class FastListPathTests(SeededAPITestCase):
+    """The compiled list path must render byte for byte what the serializers render."""
+
+    urls = (
+        '/api/item/',
+        '/api/item/?q=classic',
+        '/api/item/?category=electronics&page_size=7',
+        '/api/order/',
+        '/api/order/?status=pending&page_size=5',
+        '/api/cart/',
+        '/api/notification/',
+        '/api/notification/?read=false',
+    )
+
+    def get(self, url, fast):
+        caches[settings.CATALOG_CACHE_ALIAS].clear()
+        with self.settings(FAST_LIST_ENDPOINTS=fast):
+            return self.client.get(url)
+
+    def test_fast_path_matches_serializers(self):
+        for role in ROLES:
+            self.client.force_authenticate(self.users[role])
+            for url in self.urls:
+                # Walk a few pages so cursors built from .values() rows are covered too
+                for _ in range(3):
+                    fast, slow = self.get(url, True), self.get(url, False)
+                    with self.subTest(role=role, url=url):
+                        self.assertEqual(fast.status_code, slow.status_code)
+                        self.assertEqual(fast.content, slow.content)
+                    if fast.status_code != 200 or not fast.json().get('next'):
+                        break
+                    url = fast.json()['next']
+
+
+class FastJSONTests(SeededAPITestCase):
+    """FastJSONRenderer must produce what DRF's JSONRenderer produces, and FastJSONParser read it back."""
+
+    urls = ('/api/item/?page_size=50', '/api/order/?page_size=50', '/api/notification/')
+
+    def test_renderer_matches_drf(self):
+        for role in ROLES:
+            self.client.force_authenticate(self.users[role])
+            for url in self.urls:
+                data = self.client.get(url).data
+                with self.subTest(role=role, url=url):
+                    rendered = FastJSONRenderer().render(data)
+                    self.assertEqual(rendered, JSONRenderer().render(data))
+                    self.assertEqual(FastJSONParser().parse(BytesIO(rendered)), json.loads(rendered))
+
+
+class OrderTotalsTests(SeededAPITestCase):
+    """Order.total_amount and item_count follow every OrderItem write and are never saved from a stale copy."""
+
+    def setUp(self):
+        super().setUp()
+        customer = self.users['customer']
+        self.first = Order.objects.create(user=customer)
+        self.second = Order.objects.create(user=customer)
+        self.item = Item.objects.order_by('id').first()
+
+    def totals(self, order):
+        return tuple(Order.objects.filter(pk=order.pk).values_list('total_amount', 'item_count').get())
+
+    def test_totals_follow_line_writes(self):
+        line = OrderItem.objects.create(order=self.first, item=self.item, quantity=2, price_at_purchase=Decimal('10.50'))
+        self.assertEqual(self.totals(self.first), (Decimal('21.00'), 2))
+
+        line = OrderItem.objects.get(pk=line.pk)
+        line.quantity = 3
+        line.save()
+        self.assertEqual(self.totals(self.first), (Decimal('31.50'), 3))
+
+        line.order = self.second
+        line.save()
+        self.assertEqual(self.totals(self.first), (Decimal('0'), 0))
+        self.assertEqual(self.totals(self.second), (Decimal('31.50'), 3))
+
+        line.delete()
+        self.assertEqual(self.totals(self.second), (Decimal('0'), 0))
+
+    def test_order_save_keeps_totals(self):
+        stale = Order.objects.get(pk=self.first.pk)
+        OrderItem.objects.create(order=self.first, item=self.item, quantity=4, price_at_purchase=Decimal('5'))
+        stale.status = 'shipped'
+        stale.save()
+        self.assertEqual(self.totals(self.first), (Decimal('20'), 4))
+        self.assertEqual(Order.objects.get(pk=self.first.pk).status, 'shipped')
+
+
+class SparseFieldsTests(SeededAPITestCase):
+    """?fields= prunes the response, ?expand= collapses unnamed relations to keys, and the queries shrink with them."""
+
+    def setUp(self):
+        super().setUp()
+        self.customer = User.objects.filter(user_type='customer', orders__order_items__isnull=False).first()
+        self.client.force_authenticate(self.customer)
+
+    def results(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['results'])
+        return response.data['results']
+
+    def test_fields_keep_named_fields_only(self):
+        for order in self.results('/api/order/?fields=id,order_items.item.name'):
+            self.assertEqual(set(order), {'id', 'order_items'})
+            for line in order['order_items']:
+                self.assertEqual(line, {'item': {'name': line['item']['name']}})
+
+    def test_expand_collapses_unnamed_relations(self):
+        order = Order.objects.filter(user=self.customer, order_items__isnull=False).first()
+        line = order.order_items.select_related('item__inventory').first()
+
+        (result,) = [data for data in self.results('/api/order/?expand=') if data['id'] == order.id]
+        self.assertIn(line.pk, result['order_items'])
+
+        url = '/api/order/?expand=order_items,order_items.item'
+        (result,) = [data for data in self.results(url) if data['id'] == order.id]
+        (nested,) = [data for data in result['order_items'] if data['id'] == line.pk]
+        self.assertEqual(nested['item']['id'], line.item_id)
+        self.assertEqual(nested['item']['inventory'], line.item.inventory.pk)
+
+    def test_prefetch_plan_follows_pruned_fields(self):
+        def shape(query):
+            request = Request(APIRequestFactory().get('/api/order/', query))
+            select, prefetch, _ = prefetch_plan(OrderSerializer(context={'request': request}))
+            return select, {p.prefetch_to: p.queryset.query.select_related for p in prefetch}
+
+        self.assertEqual(shape({}), (['user'], {'order_items': {'item': {'inventory': {}}}}))
+        # The purchaser's join and the inventory's go with the fields that needed them
+        self.assertEqual(shape({'fields': 'id,order_items.item.name'}), ([], {'order_items': {'item': {}}}))
+        # Collapsed lines are still keys read from the prefetch, without joins
+        self.assertEqual(shape({'expand': ''}), ([], {'order_items': False}))
+        self.assertEqual(shape({'fields': 'id,total'}), ([], {}))
+
+        with CaptureQueriesContext(connection) as full:
+            self.results('/api/order/')
+        with CaptureQueriesContext(connection) as pruned:
+            self.results('/api/order/?fields=id,total')
+        self.assertLess(len(pruned), len(full))
+
+
+class ExplainFiltersTests(SeededAPITestCase):
+    """explain_filters keeps the composite indexes on the filter paths they were added for."""
+
+    # Index -> (filter path, whether the plan must stay free of scans and sorts)
+    INDEX_PATHS = {
+        'order_user_status_created_idx': ('order ?status', True),
+        'cart_user_added_idx': ('cart ?date', True),
+        'item_created_idx': ('item (customer) ?(no filter)', True),
+        'useditem_created_idx': ('used-item ?(no filter)', True),
+        # These narrow the rows, but the page ordering still sorts them
+        'discount_vendor_expires_idx': ('discount ?status', False),
+        'rating_item_rating_idx': ('rating ?min_rating', False),
+        'item_vendor_category_price_idx': ('item (vendor) ?category', False),
+    }
+
+    def test_strict_run_keeps_indexed_paths(self):
+        out = StringIO()
+        with self.assertRaises(CommandError) as raised:
+            call_command('explain_filters', '--strict', '--verbose-plan', stdout=out)
+
+        plans, current = {}, None
+        for line in out.getvalue().splitlines():
+            if line.startswith(('ok ', 'FLAGGED ')):
+                current = line.split(None, 1)[1].split(': ', 1)[0]
+                plans[current] = []
+            elif line.startswith(' ') and current is not None:
+                plans[current].append(line.strip())
+
+        flagged = set(str(raised.exception).split(': ', 1)[1].split(', '))
+        for index, (path, clean) in self.INDEX_PATHS.items():
+            with self.subTest(index=index):
+                self.assertTrue(any(index in step for step in plans[path]), plans[path])
+                self.assertEqual(path not in flagged, clean)
+
+
+class SearchTests(SeededAPITestCase):
+    """?q= matches every word as a prefix and ranks name hits above description hits."""
+
+    def setUp(self):
+        super().setUp()
+        vendor = self.users['vendor']
+        self.in_name = self.create_item(vendor, 'Zorblax kettle', 'Boils water.')
+        self.in_description = self.create_item(vendor, 'Plain kettle', 'Not a zorblax at all.')
+        self.create_item(vendor, 'Plain teapot', 'Steeps tea.')
+        self.client.force_authenticate(self.users['customer'])
+
+    def create_item(self, vendor, name, description):
+        item = Item.objects.create(vendor=vendor, name=name, description=description, price=10)
+        Inventory.objects.create(item=item, item_quantity=1, location='Lagos')
+        return item
+
+    def ids(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return [item['id'] for item in response.data['results']], response.data['next']
+
+    def test_match_and_rank(self):
+        ids, _ = self.ids('/api/item/?q=zorbl')
+        self.assertEqual(ids, [self.in_name.id, self.in_description.id])
+        ids, _ = self.ids('/api/item/?q=zorblax+boils')
+        self.assertEqual(ids, [self.in_name.id])
+        ids, _ = self.ids('/api/item/?q=teapot+zorblax')
+        self.assertEqual(ids, [])
+
+    def test_pages_follow_rank(self):
+        ids, next_url = self.ids('/api/item/?q=zorblax&page_size=1')
+        self.assertEqual(ids, [self.in_name.id])
+        ids, next_url = self.ids(next_url)
+        self.assertEqual((ids, next_url), ([self.in_description.id], None))
+
+
+class CatalogCacheTests(SeededAPITestCase):
+    """Cached item pages are keyed by the database's catalog version, so every worker sees a change."""
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.users['customer'])
+
+    def first_item(self):
+        response = self.client.get('/api/item/')
+        self.assertEqual(response.status_code, 200)
+        return response.data['results'][0]
+
+    def test_item_and_stock_changes_reach_the_next_page(self):
+        item = self.first_item()
+        with self.assertNumQueries(1):
+            # Served from the cache; only the version is read
+            self.assertEqual(self.first_item(), item)
+
+        vendor = Item.objects.get(pk=item['id']).vendor
+        self.client.force_authenticate(vendor)
+        self.assertEqual(self.client.patch(f"/api/item/{item['id']}/", {'name': 'Renamed'}).status_code, 200)
+        inventory_id = Inventory.objects.get(item_id=item['id']).pk
+        self.assertEqual(self.client.patch(f'/api/inventory/{inventory_id}/', {'item_quantity': 77}).status_code, 200)
+
+        self.client.force_authenticate(self.users['customer'])
+        item = self.first_item()
+        self.assertEqual(item['name'], 'Renamed')
+        self.assertEqual(item['inventory']['item_quantity'], 77)
+
+    def test_bump_from_another_worker_is_seen(self):
+        item = self.first_item()
+        # Another process changes the row and bumps the version; this process's cache is untouched
+        Item.objects.filter(pk=item['id']).update(name='Changed elsewhere')
+        CatalogVersion.objects.update(version=new_catalog_version())
+        self.assertEqual(self.first_item()['name'], 'Changed elsewhere')
+
+
+class TokenClaimsTests(SeededAPITestCase):
+    """Refreshing reloads the user: claims follow role changes and inactive users are refused."""
+
+    def refresh(self, token):
+        return self.client.post('/api/token/refresh/', {'refresh': token})
+
+    def test_refresh_restamps_claims(self):
+        user = self.users['customer']
+        refresh = tokens_for_user(user)['refresh']
+        User.objects.filter(pk=user.pk).update(user_type='vendor')
+
+        response = self.refresh(refresh)
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(AccessToken(response.data['access'])['user_type'], 'vendor')
+        # The rotated refresh token carries the new claims too
+        self.assertEqual(RefreshToken(response.data['refresh'])['user_type'], 'vendor')
+
+    def test_refresh_refuses_deactivated_user(self):
+        user = self.users['customer']
+        refresh = tokens_for_user(user)['refresh']
+        User.objects.filter(pk=user.pk).update(is_active=False)
+
+        response = self.refresh(refresh)
+        self.assertEqual(response.status_code, 401)
+        self.assertNotIn('access', response.data)
+
+
+class CheckoutTests(SeededAPITestCase):
+    """POST /api/cart/checkout/ turns the cart into one order, or changes nothing."""
+
+    def setUp(self):
+        super().setUp()
+        self.customer = self.users['customer']
+        self.client.force_authenticate(self.customer)
+        self.cart = Cart.objects.filter(user=self.customer)
+        self.cart.update(discount=None)
+        Inventory.objects.filter(item__cart_items__user=self.customer).update(item_quantity=50, in_stock=True)
+
+    def stock(self, item_ids):
+        return dict(Inventory.objects.filter(item_id__in=item_ids).values_list('item_id', 'item_quantity'))
+
+    def test_checkout_creates_order_and_empties_cart(self):
+        lines = list(self.cart.values_list('item_id', 'item_quantity'))
+        self.assertTrue(lines)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/cart/checkout/')
+        self.assertEqual(response.status_code, 201, response.content)
+        # Independent of the number of lines; deleting the cart reads its lines and reservations first
+        self.assertLessEqual(len(queries), 17)
+
+        order = Order.objects.get(pk=response.json()['id'])
+        self.assertEqual(order.order_items.count(), len(lines))
+        self.assertEqual(order.item_count, sum(quantity for _, quantity in lines))
+        self.assertFalse(self.cart.exists())
+        for item_id, quantity in self.stock([item_id for item_id, _ in lines]).items():
+            self.assertEqual(quantity, 50 - sum(q for i, q in lines if i == item_id))
+
+    def test_shortfall_rolls_back(self):
+        line = self.cart.first()
+        Inventory.objects.filter(item_id=line.item_id).update(item_quantity=line.item_quantity - 1)
+        before = self.stock(self.cart.values('item_id'))
+        orders = Order.objects.count()
+
+        response = self.client.post('/api/cart/checkout/')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(self.stock(self.cart.values('item_id')), before)
+        self.assertEqual(Order.objects.count(), orders)
+
+    def test_query_count_ignores_cart_size(self):
+        self.cart.delete()
+        item_ids = list(Inventory.objects.order_by('item_id').values_list('item_id', flat=True)[:40])
+        Inventory.objects.filter(item_id__in=item_ids).update(item_quantity=50, reserved_quantity=0, in_stock=True)
+        counts = {}
+        for size in (2, 40):
+            lines = [{'item': item_id, 'item_quantity': 1} for item_id in item_ids[:size]]
+            self.assertEqual(self.client.post('/api/cart/bulk/', {'lines': lines}, format='json').status_code, 200)
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post('/api/cart/checkout/')
+            self.assertEqual(response.status_code, 201, response.content)
+            self.assertEqual(Order.objects.get(pk=response.json()['id']).order_items.count(), size)
+            counts[size] = len(queries)
+        self.assertEqual(counts[2], counts[40])
+
+
+class StockReservationTests(SeededAPITestCase):
+    """Cart lines hold stock until checkout, removal or expiry."""
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.users['customer'])
+        self.inventory = Inventory.objects.order_by('id').first()
+        Inventory.objects.filter(pk=self.inventory.pk).update(item_quantity=5, reserved_quantity=0)
+
+    def reserved(self):
+        return Inventory.objects.values_list('reserved_quantity', flat=True).get(pk=self.inventory.pk)
+
+    def add(self, quantity):
+        return self.client.post('/api/cart/', {'item': self.inventory.item_id, 'item_quantity': quantity})
+
+    def test_lines_reserve_until_released(self):
+        line = self.add(3)
+        self.assertEqual(line.status_code, 201)
+        self.assertEqual(self.reserved(), 3)
+        url = f"/api/cart/{line.json()['id']}/"
+        self.assertEqual(self.client.patch(url, {'item_quantity': 6}).status_code, 409)
+        self.assertEqual(self.client.patch(url, {'item_quantity': 5}).status_code, 200)
+        self.assertEqual(self.reserved(), 5)
+
+        self.client.delete(url)
+        self.assertEqual(self.reserved(), 0)
+        self.assertEqual(self.add(2).status_code, 201)
+
+        StockReservation.objects.update(expires_at=timezone.now())
+        call_command('release_reservations', stdout=StringIO())
+        self.assertEqual(self.reserved(), 0)
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_inventory_saves_keep_holds(self):
+        # Loaded by a vendor's request before the customer's hold is taken
+        stale = Inventory.objects.get(pk=self.inventory.pk)
+        self.assertEqual(self.add(5).status_code, 201)
+        stale.item_quantity = 8
+        stale.save()
+        self.assertEqual(self.reserved(), 5)
+
+        self.client.force_authenticate(self.inventory.item.vendor)
+        response = self.client.patch(f'/api/inventory/{self.inventory.pk}/', {'item_quantity': 9})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.reserved(), 5)
+
+    def test_second_line_for_an_item_is_refused(self):
+        self.assertEqual(self.add(1).status_code, 201)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.add(1)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'item': ['This item is already in the cart.']})
+        self.assertEqual(self.reserved(), 1)
+        # The unique constraint decides; no lookup of the caller's lines first
+        self.assertFalse([query for query in queries if query['sql'].startswith('SELECT') and '"api_cart"' in query['sql']])
+
+
+class DiscountRedemptionTests(SeededAPITestCase):
+    """Codes go on the caller's cart, are redeemed once at checkout and never past max_redemptions."""
+
+    def setUp(self):
+        super().setUp()
+        self.discount = Discount.objects.order_by('id').first()
+        Discount.objects.filter(pk=self.discount.pk).update(
+            redemptions=self.discount.max_redemptions - 1,
+            expires_at=timezone.now().date() + timedelta(days=1),
+        )
+        get_discount_cache().clear()
+        self.customer = self.users['customer']
+        Cart.objects.filter(user=self.customer).delete()
+        inventory = Inventory.objects.filter(item__vendor_id=self.discount.vendor_id).select_related('item').first()
+        Inventory.objects.filter(pk=inventory.pk).update(item_quantity=10, reserved_quantity=0)
+        self.client.force_authenticate(self.customer)
+        self.assertEqual(self.client.post('/api/cart/', {'item': inventory.item_id, 'item_quantity': 1}).status_code, 201)
+
+    def apply(self):
+        return self.client.post('/api/cart/discount/', {'code': self.discount.code})
+
+    def test_code_goes_on_cart_and_checkout_redeems_it_once(self):
+        response = self.apply()
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data['lines'], 1)
+        self.assertEqual(Cart.objects.get(user=self.customer).discount_id, self.discount.pk)
+        # Applying twice costs nothing either
+        self.assertEqual(self.apply().status_code, 200)
+        self.discount.refresh_from_db()
+        self.assertEqual(self.discount.redemptions, self.discount.max_redemptions - 1)
+
+        self.assertEqual(self.client.post('/api/cart/checkout/').status_code, 201)
+        self.discount.refresh_from_db()
+        self.assertEqual(self.discount.redemptions, self.discount.max_redemptions)
+
+    def test_sold_out_code_is_refused(self):
+        Discount.objects.filter(pk=self.discount.pk).update(redemptions=self.discount.max_redemptions)
+        self.assertEqual(self.apply().status_code, 409)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.apply().status_code, 409)
+        # Sold out and cached as such: no lookups
+        self.assertEqual(len(queries), 0)
+        self.assertIsNone(Cart.objects.get(user=self.customer).discount_id)
+
+    def test_only_customers_apply_codes(self):
+        self.client.force_authenticate(self.users['vendor'])
+        self.assertEqual(self.apply().status_code, 403)
+        self.assertEqual(self.client.post('/api/discount/redeem/', {'code': self.discount.code}).status_code, 405)
+        self.discount.refresh_from_db()
+        self.assertEqual(self.discount.redemptions, self.discount.max_redemptions - 1)
+
+
+class BulkCartTests(SeededAPITestCase):
+    """POST /api/cart/bulk/ writes many lines with a query count independent of their number."""
+
+    def test_restore_forty_lines(self):
+        customer = self.users['customer']
+        self.client.force_authenticate(customer)
+        item_ids = list(Inventory.objects.order_by('item_id').values_list('item_id', flat=True)[:40])
+        self.assertEqual(len(item_ids), 40)
+        Inventory.objects.filter(item_id__in=item_ids).update(item_quantity=10, reserved_quantity=0)
+        lines = [{'item': item_id, 'item_quantity': 2} for item_id in item_ids]
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/cart/bulk/', {'lines': lines}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertLessEqual(len(queries), 15)
+        self.assertEqual(
+            dict(Cart.objects.filter(user=customer, item_id__in=item_ids).values_list('item_id', 'item_quantity')),
+            dict.fromkeys(item_ids, 2),
+        )
+        self.assertEqual(set(Inventory.objects.filter(item_id__in=item_ids).values_list('reserved_quantity', flat=True)), {2})
+
+        # Zero removes the line and gives its stock back
+        response = self.client.post('/api/cart/bulk/', {'lines': [{'item': item_ids[0], 'item_quantity': 0}]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Cart.objects.filter(user=customer, item_id=item_ids[0]).exists())
+        self.assertEqual(Inventory.objects.get(item_id=item_ids[0]).reserved_quantity, 0)
+
+
+class NotificationBulkTests(SeededAPITestCase):
+    """Broadcasts are batched inserts; marking as read is one UPDATE."""
+
+    def test_broadcast_and_mark_read(self):
+        customers = User.objects.filter(user_type='customer', is_active=True).count()
+        self.client.force_authenticate(self.users['admin'])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/notification/broadcast/', {'text': 'Sale', 'user_type': 'customer'})
+        self.assertEqual(response.json(), {'sent': customers})
+        # One batch: read the ids, insert, bump the ETags, plus the closing empty read
+        self.assertLessEqual(len(queries), 6)
+
+        customer = self.users['customer']
+        self.client.force_authenticate(customer)
+        unread = Notification.objects.filter(user=customer, read=False)
+        first, *rest = unread.values_list('id', flat=True)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/notification/mark-read/', {'ids': [first]}, format='json')
+        self.assertEqual(response.json(), {'updated': 1})
+        self.assertEqual(len(queries), 2)
+
+        response = self.client.post('/api/notification/mark-all-read/')
+        self.assertEqual(response.json(), {'updated': len(rest)})
+        self.assertFalse(unread.exists())
+
+
+class OrderItemExportTests(SeededAPITestCase):
+    """The export streams the same rows the list filters select, as CSV or NDJSON."""
+
+    def test_csv_and_ndjson(self):
+        vendor = self.users['vendor']
+        self.client.force_authenticate(vendor)
+        expected = list(
+            OrderItem.objects.filter(item__vendor=vendor, order__status='pending').order_by('id').values_list('id', flat=True)
+        )
+
+        response = self.client.get('/api/order-items/export/?status=pending', HTTP_ACCEPT='text/csv')
+        self.assertTrue(response.streaming)
+        rows = list(csv.DictReader(StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual([int(row['id']) for row in rows], expected)
+
+        response = self.client.get('/api/order-items/export/?status=pending&file_format=ndjson')
+        lines = b''.join(response.streaming_content).splitlines()
+        self.assertEqual([json.loads(line)['id'] for line in lines], expected)
+
+    def test_csv_cells_cannot_be_formulas(self):
+        vendor = self.users['vendor']
+        self.client.force_authenticate(vendor)
+        line = OrderItem.objects.filter(item__vendor=vendor).select_related('item').first()
+        Item.objects.filter(pk=line.item_id).update(name='=HYPERLINK("http://evil")')
+
+        response = self.client.get('/api/order-items/export/', HTTP_ACCEPT='text/csv')
+        rows = list(csv.DictReader(StringIO(b''.join(response.streaming_content).decode())))
+        (row,) = [row for row in rows if int(row['id']) == line.pk]
+        self.assertEqual(row['item_name'], '\'=HYPERLINK("http://evil")')
+        # Numbers stay numbers
+        self.assertEqual(row['quantity'], str(line.quantity))
+
+        response = self.client.get('/api/order-items/export/?file_format=ndjson')
+        (data,) = [data for data in map(json.loads, b''.join(response.streaming_content).splitlines()) if data['id'] == line.pk]
+        self.assertEqual(data['item_name'], '=HYPERLINK("http://evil")')
+
+    async def test_asgi_streams_without_buffering(self):
+        vendor = self.users['vendor']
+        expected = await OrderItem.objects.filter(item__vendor=vendor).acount()
+        headers = {'Authorization': f"Bearer {tokens_for_user(vendor)['access']}"}
+        with patch('api.exports.EXPORT_CHUNK_SIZE', 5), warnings.catch_warnings():
+            warnings.simplefilter('error')
+            response = await AsyncClient().get('/api/order-items/export/', headers=headers)
+            self.assertTrue(response.is_async)
+            parts = [part async for part in response]
+        # Header and one part per row, sent as read rather than collected first
+        self.assertEqual(len(parts), expected + 1)
+        self.assertGreater(expected, 5)
+        rows = list(csv.DictReader(StringIO(b''.join(parts).decode())))
+        self.assertEqual(len(rows), expected)
+
+
+class BidStreamTests(SeededAPITestCase):
+    """New bids reach open event streams for their used item, and missed ones are replayed."""
+
+    def place_bid(self, used_item, amount):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Bid.objects.create(used_item=used_item, user=self.users['customer'], amount=amount)
+
+    async def test_stream_pushes_new_bids(self):
+        used_item = await UsedItem.objects.afirst()
+        url = f'/api/used-items/{used_item.id}/bids/stream/'
+        client = AsyncClient()
+        self.assertEqual((await client.get(url)).status_code, 401)
+        vendor_token = tokens_for_user(self.users['vendor'])['access']
+        self.assertEqual((await client.get(url, headers={'Authorization': f'Bearer {vendor_token}'})).status_code, 403)
+
+        token = tokens_for_user(self.users['customer'])['access']
+        response = await client.get(url, headers={'Authorization': f'Bearer {token}'})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        events = aiter(response.streaming_content)
+        self.assertTrue((await anext(events)).startswith(b'retry:'))
+
+        bid = await sync_to_async(self.place_bid)(used_item, 125)
+        frame = await anext(events)
+        self.assertTrue(frame.startswith(b'id: %d\nevent: bid\n' % bid.id))
+        data = json.loads(frame.split(b'data: ', 1)[1])
+        self.assertEqual((data['id'], data['amount'], data['user']['id']), (bid.id, '125.00', self.users['customer'].id))
+        # A client going away cancels the wait, as the ASGI handler does on disconnect
+        waiting = asyncio.ensure_future(anext(events))
+        await asyncio.sleep(0)
+        waiting.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await waiting
+        self.assertFalse(get_hub()._subscriptions)
+
+        later = await sync_to_async(self.place_bid)(used_item, 130)
+        response = await client.get(url, {'token': token}, headers={'Last-Event-ID': str(bid.id)})
+        events = aiter(response.streaming_content)
+        await anext(events)
+        self.assertTrue((await anext(events)).startswith(b'id: %d\n' % later.id))
+
+
+class NotificationWaitTests(SeededAPITestCase):
+    """The long poll answers from the database, or waits for the next notification without reading it again."""
+
+    def notify(self, user, text):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Notification.objects.create(user=user, text=text, read=False)
+
+    async def test_wait_wakes_on_new_notification(self):
+        customer = self.users['customer']
+        client = AsyncClient()
+        headers = {'Authorization': f"Bearer {tokens_for_user(customer)['access']}"}
+        latest = await Notification.objects.filter(user=customer).order_by('id').alast()
+        cursor = latest.id if latest else 0
+
+        response = await client.get('/api/notification/wait/', {'after': cursor, 'timeout': 0}, headers=headers)
+        self.assertEqual(response.json(), {'results': [], 'cursor': cursor})
+
+        waiting = asyncio.ensure_future(client.get('/api/notification/wait/', {'after': cursor, 'timeout': 10}, headers=headers))
+        while not get_hub()._subscriptions:
+            await asyncio.sleep(0.01)
+        notification = await sync_to_async(self.notify)(customer, 'Outbid')
+        response = await asyncio.wait_for(waiting, 5)
+        self.assertEqual(response.json()['cursor'], notification.id)
+        self.assertEqual([data['text'] for data in response.json()['results']], ['Outbid'])
+        self.assertFalse(get_hub()._subscriptions)
+
+        # Already there: answered straight from the database
+        response = await client.get('/api/notification/wait/', {'after': cursor}, headers=headers)
+        self.assertEqual(response.json()['cursor'], notification.id)
+
+
+class ImageRenditionTests(SeededAPITestCase):
+    """Uploads get WebP/JPEG renditions from the process pool, listed by the serializers."""
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root.name))
+
+    def test_upload_renders_renditions(self):
+        upload = BytesIO()
+        Image.new('RGBA', (1000, 600), (200, 30, 30, 128)).save(upload, 'PNG')
+        item = Item.objects.first()
+        with self.captureOnCommitCallbacks() as callbacks:
+            item.image.save('big.png', ContentFile(upload.getvalue()))
+        for future in [callback() for callback in callbacks]:
+            if future is not None:
+                future.result(timeout=60)
+
+        for name, size in settings.IMAGE_RENDITIONS.items():
+            with Image.open(item.image.storage.path(rendition_name(item.image.name, name, size, 'webp'))) as webp:
+                self.assertEqual(max(webp.size), size)
+            with Image.open(item.image.storage.path(rendition_name(item.image.name, name, size, 'jpeg'))) as jpeg:
+                self.assertEqual((jpeg.format, jpeg.mode), ('JPEG', 'RGB'))
+
+        self.client.force_authenticate(self.users['vendor'])
+        data = self.client.get(f'/api/item/{item.id}/').json()
+        thumb = rendition_name(item.image.name, 'thumb', settings.IMAGE_RENDITIONS['thumb'], 'webp')
+        self.assertTrue(data['image_renditions']['thumb']['webp'].endswith(settings.MEDIA_URL + thumb))
+
+    def test_new_spec_gets_new_name(self):
+        # Rendition URLs are cached as immutable: other bytes need another URL
+        names = {
+            rendition_name('items/3f/3fa4.png', 'thumb', size, key)
+            for size in (128, 256)
+            for key in ('webp', 'jpeg')
+        }
+        self.assertEqual(len(names), 4)
+        with patch.dict('api.renditions.RENDITION_FORMATS', webp=('webp', 'WEBP', {'quality': 60, 'method': 4})):
+            self.assertNotIn(rendition_name('items/3f/3fa4.png', 'thumb', 128, 'webp'), names)
+
+
+class ContentAddressedMediaTests(SeededAPITestCase):
+    """Identical uploads share one file, served as immutable with a strong ETag."""
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root.name))
+
+    def test_duplicates_stored_once_and_cached_as_immutable(self):
+        first, second = User.objects.filter(user_type='customer')[:2]
+        first.profile_image.save('me.PNG', ContentFile(b'same bytes'))
+        second.profile_image.save('avatar.png', ContentFile(b'same bytes'))
+        self.assertEqual(first.profile_image.name, second.profile_image.name)
+        self.assertRegex(first.profile_image.name, r'^profile_images/[0-9a-f]{2}/[0-9a-f]{64}\.png$')
+        self.assertEqual(len(list(Path(settings.MEDIA_ROOT).rglob('*.png'))), 1)
+
+        # Routed with DEBUG on only; the front server sends the same headers in production
+        request = RequestFactory().get(first.profile_image.url)
+        response = serve_media(request, first.profile_image.name)
+        self.assertEqual(b''.join(response.streaming_content), b'same bytes')
+        self.assertIn('immutable', response['Cache-Control'])
+        etag = response['ETag']
+        request = RequestFactory().get(first.profile_image.url, HTTP_IF_NONE_MATCH=etag)
+        response = serve_media(request, first.profile_image.name)
+        self.assertEqual((response.status_code, response['ETag']), (304, etag))
+
+    def test_media_not_routed_without_debug(self):
+        self.assertFalse(settings.DEBUG)
+        with self.assertRaises(Resolver404):
+            resolve(settings.MEDIA_URL + 'profile_images/me.png')
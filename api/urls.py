@@ -12,6 +12,7 @@ from api.views import (
     VendorCustomerViewSet, OrderItemViewSet, NotificationViewSet, RatingViewSet,
     TelegramLoginView, RegistrationView, TelegramRegisterView
 )
+from api.streams import bid_stream, wait_for_notifications
 
 router = DefaultRouter()
 
@@ -44,6 +45,10 @@ urlpatterns = [
     path('user/detail/', get_user_details, name='single_user'),
     path('vendor/customer/', VendorCustomerViewSet.as_view({'get': 'list'}), name='vendor_customer'),
     path('register/', RegistrationView.as_view(), name='register'),
+
+    # Server-sent events and long polls, async views served through Backend/asgi.py
+    path('used-items/<int:used_item_id>/bids/stream/', bid_stream, name='used-item-bid-stream'),
+    path('notification/wait/', wait_for_notifications, name='notification-wait'),
     
     path('', include(router.urls)),  # Remove the leading slash here
     
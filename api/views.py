@@ -4,12 +4,14 @@ from django.shortcuts import render
 from rest_framework.viewsets import ModelViewSet
 from rest_framework.views import APIView
 from rest_framework.response import Response
+from rest_framework.exceptions import PermissionDenied
 from rest_framework.permissions import IsAuthenticated
-from rest_framework_simplejwt.authentication import JWTAuthentication
-from rest_framework.decorators import api_view, permission_classes
+from api.authentication import StatelessJWTAuthentication, get_user_instance, tokens_for_user
+from rest_framework.decorators import action, api_view, permission_classes
 from api.permissions import IsCustomer, IsVendor, IsAdminUser
 from rest_framework import status
 from django.contrib.auth import get_user_model
+from django.db import transaction
 from api.serializers import UserSerializer
 
 
@@ -32,20 +34,39 @@ from api.filters import (
 )
 from django_filters.rest_framework import DjangoFilterBackend
 
+from api.caching import CatalogCacheMixin
+from api.carts import apply_discount_code, set_cart_lines
+from api.checkout import checkout
+from api.reservations import reserve
+from api.etags import ConditionalGetMixin, conditional_get
+from api.exports import EXPORT_FORMAT_PARAM, EXPORT_FORMATS, ORDER_ITEM_COLUMNS, streaming_export
+from api.fastpath import FastListMixin
+from api.instrumentation import InstrumentedViewMixin
+from api.notifications import audience, fan_out, mark_read
+from api.prefetching import EagerLoadingMixin, apply_prefetch_plan
+from api.renderers import FastJSONRenderer, PassthroughRenderer
+from api.pagination import (
+    AddressPagination, BidPagination, CartPagination, DiscountPagination,
+    InventoryPagination, ItemPagination, NotificationPagination, OrderItemPagination,
+    OrderPagination, RatingPagination, TransactionPagination, UsedItemPagination,
+    UserPagination, WalletPagination
+)
+
 from api.serializers import (
     AddressSerializer, OrderSerializer, TransactionSerializer, WalletSerializer,
     InventorySerializer, DiscountSerializer, ItemSerializer,
     UserSerializer, CartSerializer, BidSerializer, OrderItemSerializer, 
-    CustomerSerializer, NotificationSerializer, RatingSerializer, UsedItemSerializer, 
-    CartCreateSerializer, CreateOrderItemSerializer, UserUpdateSerializer, AddressUpdateSerializer, CreateItemSerializer
+    CustomerSerializer, NotificationBroadcastSerializer, NotificationIdsSerializer, NotificationSerializer, RatingSerializer, UsedItemSerializer, 
+    CartBulkSerializer, CartCreateSerializer, CreateOrderItemSerializer, UserUpdateSerializer, AddressUpdateSerializer, CreateItemSerializer
 )
 
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@conditional_get('user')
 def get_user_details(request):
     # get the user and its address
-    user = request.user
+    user = get_user_instance(request.user)
     user_serializer = UserSerializer(user)
     addresses = user.user_address.all()
     # print(addresses) # user_address = related_name from Address model
@@ -56,10 +77,11 @@ def get_user_details(request):
         'addresses': address_serializer.data
     })
 
-class UserViewSet(ModelViewSet):
+class UserViewSet(InstrumentedViewMixin, EagerLoadingMixin, ModelViewSet):
     queryset = User.objects.all()
     permission_classes = [IsAuthenticated]
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [StatelessJWTAuthentication]
+    pagination_class = UserPagination
     
     def get_serializer_class(self):
         if self.action in ['update', 'partial_update']:
@@ -77,10 +99,11 @@ class UserViewSet(ModelViewSet):
         serializer.save()
 
 
-class AddressViewSet(ModelViewSet):
+class AddressViewSet(InstrumentedViewMixin, EagerLoadingMixin, ModelViewSet):
     queryset = Address.objects.all()
     permission_classes = [IsAuthenticated]
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [StatelessJWTAuthentication]
+    pagination_class = AddressPagination
     
     def get_serializer_class(self):
         if self.action in ['update', 'partial_update']:
@@ -91,24 +114,27 @@ class AddressViewSet(ModelViewSet):
         user = self.request.user
         if user.user_type == 'admin':
             return Address.objects.all()
-        return Address.objects.filter(user=user)  # Users can only see their own addresses
+        return Address.objects.filter(user_id=user.id)  # Users can only see their own addresses
 
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+        serializer.save(user_id=self.request.user.id)
         
 
-class WalletViewSet(ModelViewSet):
+class WalletViewSet(InstrumentedViewMixin, EagerLoadingMixin, ModelViewSet):
     queryset = Wallet.objects.all()
     serializer_class = WalletSerializer
     permission_classes = [IsAuthenticated]
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [StatelessJWTAuthentication]
+    pagination_class = WalletPagination
 
 
-class NotificationViewSet(ModelViewSet):
+class NotificationViewSet(InstrumentedViewMixin, ConditionalGetMixin, FastListMixin, EagerLoadingMixin, ModelViewSet):
     queryset = Notification.objects.all()
     serializer_class = NotificationSerializer
     permission_classes = [IsAuthenticated]
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [StatelessJWTAuthentication]
+    pagination_class = NotificationPagination
+    etag_scope = 'notification'
     filter_backends = [DjangoFilterBackend]
     filterset_class = NotificationFilter
     
@@ -117,22 +143,47 @@ class NotificationViewSet(ModelViewSet):
         if user.user_type == 'admin':
             return Notification.objects.all()
         else:
-            return Notification.objects.filter(user=user)
-
-
-class InventoryViewSet(ModelViewSet):
+            return Notification.objects.filter(user_id=user.id)
+
+    @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated, IsAdminUser])
+    def broadcast(self, request):
+        serializer = NotificationBroadcastSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        users = audience(user_type=data.get('user_type'), category=data.get('category'))
+        sent = fan_out(users, data['text'], type=data['type'])
+        return Response({'sent': sent}, status=status.HTTP_201_CREATED)
+
+    # Both mark the caller's own notifications, admins included
+    @action(detail=False, methods=['post'], url_path='mark-all-read')
+    def mark_all_read(self, request):
+        # Honours the list filters, e.g. ?type=system
+        updated = mark_read(self.filter_queryset(Notification.objects.all()), request.user.id)
+        return Response({'updated': updated})
+
+    @action(detail=False, methods=['post'], url_path='mark-read')
+    def mark_ids_read(self, request):
+        serializer = NotificationIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        updated = mark_read(Notification.objects.filter(pk__in=serializer.validated_data['ids']), request.user.id)
+        return Response({'updated': updated})
+
+
+class InventoryViewSet(InstrumentedViewMixin, EagerLoadingMixin, ModelViewSet):
     queryset = Inventory.objects.all()
     serializer_class = InventorySerializer
     permission_classes = [IsAuthenticated, IsVendor]
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [StatelessJWTAuthentication]
+    pagination_class = InventoryPagination
 
 
 
-class ItemViewSet(ModelViewSet):
+class ItemViewSet(InstrumentedViewMixin, CatalogCacheMixin, FastListMixin, EagerLoadingMixin, ModelViewSet):
     queryset = Item.objects.all()
     serializer_class = ItemSerializer
     permission_classes = [IsAuthenticated]
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [StatelessJWTAuthentication]
+    pagination_class = ItemPagination
     filter_backends = [DjangoFilterBackend]
     filterset_class = ItemFilters
     
@@ -149,36 +200,38 @@ class ItemViewSet(ModelViewSet):
             return Item.objects.all()
         elif user.user_type == 'customer':
             return Item.objects.all()
-        return Item.objects.filter(vendor=user)
+        return Item.objects.filter(vendor_id=user.id)
 
 
-class UsedItemViewSet(ModelViewSet):
+class UsedItemViewSet(InstrumentedViewMixin, EagerLoadingMixin, ModelViewSet):
     queryset = UsedItem.objects.all()
     serializer_class = UsedItemSerializer
     permission_classes = [IsAuthenticated, IsVendor]
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [StatelessJWTAuthentication]
+    pagination_class = UsedItemPagination
     filter_backends = [DjangoFilterBackend]
     filterset_class = UsedItemFilters
     
 
     def perform_create(self, serializer):
         # Automatically set the user to the current user
-        serializer.save(user=self.request.user)
+        serializer.save(user_id=self.request.user.id)
 
     def perform_update(self, serializer):
         # Automatically set the user to the current user
-        serializer.save(user=self.request.user)
+        serializer.save(user_id=self.request.user.id)
         
     def perform_destroy(self, instance):
         # Automatically set the user to the current user
         instance.delete()
    
 
-class OrderViewSet(ModelViewSet):
+class OrderViewSet(InstrumentedViewMixin, FastListMixin, EagerLoadingMixin, ModelViewSet):
     queryset = Order.objects.all()
     serializer_class = OrderSerializer
     permission_classes = [IsAuthenticated]
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [StatelessJWTAuthentication]
+    pagination_class = OrderPagination
     filter_backends = [DjangoFilterBackend]
     filterset_class = OrderFilters
     
@@ -187,14 +240,15 @@ class OrderViewSet(ModelViewSet):
         
         if user.user_type == 'admin':
             return Order.objects.all()
-        return Order.objects.filter(user=user)
+        return Order.objects.filter(user_id=user.id)
 
 
-class OrderItemViewSet(ModelViewSet):
+class OrderItemViewSet(InstrumentedViewMixin, EagerLoadingMixin, ModelViewSet):
     queryset = OrderItem.objects.all()
     serializer_class = OrderItemSerializer
     permission_classes = [IsAuthenticated]
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [StatelessJWTAuthentication]
+    pagination_class = OrderItemPagination
     filter_backends = [DjangoFilterBackend]
     filterset_class = OrderItemFilter
     
@@ -204,28 +258,43 @@ class OrderItemViewSet(ModelViewSet):
             return OrderItem.objects.all()
         elif user.user_type == 'vendor':
             # Vendors can see order items for their own items
-            return OrderItem.objects.filter(item__vendor=user).select_related('order', 'item', 'order__user')
+            return OrderItem.objects.filter(item__vendor_id=user.id).select_related('order', 'item', 'order__user')
         else:
             # Customers can only see their own order items
-            return OrderItem.objects.filter(order__user=user)
+            return OrderItem.objects.filter(order__user_id=user.id)
         
     def get_serializer_class(self):
         if self.action in ['create', 'update', 'partial_update']:
             return CreateOrderItemSerializer
         return OrderItemSerializer
+
+    @action(detail=False, methods=['get'], renderer_classes=[FastJSONRenderer, PassthroughRenderer])
+    def export(self, request):
+        # Not `format`: DRF reserves it for picking a renderer
+        export_format = request.query_params.get(EXPORT_FORMAT_PARAM, 'csv')
+        if export_format not in EXPORT_FORMATS:
+            return Response(
+                {EXPORT_FORMAT_PARAM: [f"Choose one of: {', '.join(EXPORT_FORMATS)}."]},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        # Same scoping and OrderItemFilter filters as the list
+        queryset = self.filter_queryset(self.get_queryset()).prefetch_related(None).order_by('id')
+        return streaming_export(request, queryset, ORDER_ITEM_COLUMNS, export_format, 'order-items')
     
-class TransactionViewSet(ModelViewSet):
+class TransactionViewSet(InstrumentedViewMixin, EagerLoadingMixin, ModelViewSet):
     queryset = Transaction.objects.all()
     serializer_class = TransactionSerializer
     permission_classes = [IsAuthenticated, IsVendor]
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [StatelessJWTAuthentication]
+    pagination_class = TransactionPagination
 
 
-class DiscountViewSet(ModelViewSet):
+class DiscountViewSet(InstrumentedViewMixin, EagerLoadingMixin, ModelViewSet):
     queryset = Discount.objects.all()
     serializer_class = DiscountSerializer
     permission_classes = [IsAuthenticated]
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [StatelessJWTAuthentication]
+    pagination_class = DiscountPagination
     filter_backends = [DjangoFilterBackend]
     filterset_class = DiscountFilter
     
@@ -235,14 +304,15 @@ class DiscountViewSet(ModelViewSet):
         
         if user.user_type == 'admin':
             return Discount.objects.all()
-        return Discount.objects.filter(vendor=user)
+        return Discount.objects.filter(vendor_id=user.id)
 
 
-class RatingViewSet(ModelViewSet):
+class RatingViewSet(InstrumentedViewMixin, EagerLoadingMixin, ModelViewSet):
     queryset = Rating.objects.all()
     serializer_class = RatingSerializer
     permission_classes = [IsAuthenticated, IsVendor]
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [StatelessJWTAuthentication]
+    pagination_class = RatingPagination
     filter_backends = [DjangoFilterBackend]
     filterset_class = RatingFilter
     
@@ -251,14 +321,16 @@ class RatingViewSet(ModelViewSet):
         
         if user.user_type == 'admin':
             return Rating.objects.all()
-        return Rating.objects.filter(item__vendor=user)
+        return Rating.objects.filter(item__vendor_id=user.id)
 
 
-class CartViewSet(ModelViewSet):
+class CartViewSet(InstrumentedViewMixin, ConditionalGetMixin, FastListMixin, EagerLoadingMixin, ModelViewSet):
     queryset = Cart.objects.all()
     serializer_class = CartSerializer
     permission_classes = [IsAuthenticated, IsCustomer]
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [StatelessJWTAuthentication]
+    pagination_class = CartPagination
+    etag_scope = 'cart'
     filter_backends = [DjangoFilterBackend]
     filterset_class = CartFilters
     
@@ -273,18 +345,61 @@ class CartViewSet(ModelViewSet):
         
         if user.user_type == 'admin':
             return Cart.objects.all()
-        return Cart.objects.filter(user=user)  
+        return Cart.objects.filter(user_id=user.id)  
     
+    @transaction.atomic
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+        # Rolled back with the line if the stock cannot be reserved
+        reserve(serializer.save(user_id=self.request.user.id))
+
+    @transaction.atomic
+    def perform_update(self, serializer):
+        reserve(serializer.save())
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        context = self.get_serializer_context()
+        serializer = CartBulkSerializer(data=request.data, context=context)
+        serializer.is_valid(raise_exception=True)
+        lines = set_cart_lines(request.user.id, serializer.validated_data['lines'])
+        queryset = Cart.objects.filter(pk__in=[line.pk for line in lines]).order_by('id')
+        queryset = apply_prefetch_plan(queryset, CartSerializer(context=context))
+        return Response(CartSerializer(queryset, many=True, context=context).data)
+
+    @action(detail=False, methods=['post'])
+    def discount(self, request):
+        # IsCustomer lets vendors through; only a customer's own cart takes a code
+        if request.user.user_type != 'customer':
+            raise PermissionDenied('Only customers can apply discount codes.')
+        code = request.data.get('code')
+        if not code:
+            return Response({'code': ['This field is required.']}, status=status.HTTP_400_BAD_REQUEST)
+        discount, lines = apply_discount_code(request.user.id, code)
+        return Response({
+            'id': discount.id,
+            'code': discount.code,
+            'name': discount.name,
+            'percentage': str(discount.percentage),
+            'vendor': discount.vendor_id,
+            'lines': lines,
+        })
+
+    @action(detail=False, methods=['post'])
+    def checkout(self, request):
+        # One transaction: stock, discounts, order lines and the emptied cart
+        order = checkout(request.user.id)
+        context = self.get_serializer_context()
+        order = apply_prefetch_plan(Order.objects.filter(pk=order.pk), OrderSerializer(context=context)).get()
+        return Response(OrderSerializer(order, context=context).data, status=status.HTTP_201_CREATED)
 
 
 
-class BidViewSet(ModelViewSet):
+class BidViewSet(InstrumentedViewMixin, EagerLoadingMixin, ModelViewSet):
     queryset = Bid.objects.all()
     serializer_class = BidSerializer
     permission_classes = [IsAuthenticated, IsCustomer]
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [StatelessJWTAuthentication]
+    pagination_class = BidPagination
     
     def get_queryset(self, *args, **kwargs):
         user = self.request.user
@@ -303,11 +418,12 @@ class BidViewSet(ModelViewSet):
 
         
 
-class VendorCustomerViewSet(ModelViewSet):
+class VendorCustomerViewSet(InstrumentedViewMixin, EagerLoadingMixin, ModelViewSet):
     queryset = User.objects.all()
     serializer_class = CustomerSerializer
     permission_classes = [IsAuthenticated, IsVendor]
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [StatelessJWTAuthentication]
+    pagination_class = UserPagination
     
     def get_queryset(self):
         user = self.request.user
@@ -315,7 +431,7 @@ class VendorCustomerViewSet(ModelViewSet):
         if user.user_type == 'vendor':
             
             order_customers = User.objects.filter(
-                orders__order_items__item__vendor=user
+                orders__order_items__item__vendor_id=user.id
             ).distinct()
             
             return order_customers.filter(user_type='customer').distinct()
@@ -463,12 +579,12 @@ class TelegramRegisterView(APIView):
             user = serializer.save()
             
             # Generate token
-            refresh = RefreshToken.for_user(user)
+            tokens = tokens_for_user(user)
             
             return Response({
                 "user": UserSerializer(user).data,
-                "access": str(refresh.access_token),
-                "refresh": str(refresh)
+                "access": tokens['access'],
+                "refresh": tokens['refresh']
             }, status=status.HTTP_201_CREATED)
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
\ No newline at end of file